@@ -0,0 +1,239 @@
+"""
+ResearchCompactor Stage
+
+Sits between DeepResearchAgent and PsychProfiler. Shrinks the raw research
+dump before it is sent to the LLM:
+1. Boilerplate stripping (navigation, cookie banners, login walls).
+2. Near-duplicate paragraph removal across sources (word shingling).
+3. Per-provider token budget, shared fairly across sources.
+"""
+
+import os
+import re
+from typing import Dict, Any, List, Optional
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from ..llm_provider import LLMProvider
+
+
+# Rough prompt budget for research text, in tokens (~4 characters each)
+TOKEN_BUDGETS = {
+    LLMProvider.DEEPSEEK: int(os.getenv("KYOKA_RESEARCH_TOKEN_BUDGET_DEEPSEEK", "24000")),
+    LLMProvider.GOOGLE: int(os.getenv("KYOKA_RESEARCH_TOKEN_BUDGET_GOOGLE", "60000")),
+}
+CHARS_PER_TOKEN = 4
+
+SHINGLE_SIZE = 5
+DUPLICATE_THRESHOLD = 0.8
+
+# Click/campaign trackers, dropped on every host
+TRACKING_PARAMS = {"fbclid", "gclid", "dclid", "msclkid", "mc_cid", "mc_eid", "igshid"}
+TRACKING_PREFIXES = ("utm_", "_hs")
+
+# Hosts whose country/mobile subdomains serve the same page (uk.linkedin.com, mobile.twitter.com)
+MIRRORED_HOSTS = {"linkedin.com", "twitter.com", "x.com", "facebook.com", "youtube.com", "medium.com"}
+HOST_ALIASES = {"twitter.com": "x.com"}
+# Share/referrer/locale params that only change presentation on MIRRORED_HOSTS;
+# elsewhere they can select a different page (WordPress ?s= search, ?lang= variants)
+MIRRORED_PARAMS = {
+    "si", "ref", "ref_src", "ref_url", "refid", "trk", "trkinfo", "originalsubdomain",
+    "lipi", "original_referer", "src", "s", "t", "hl", "lang", "locale",
+}
+MIRRORED_PREFIXES = ("trk_",)
+
+_MOBILE_LABELS = {"m", "mobile"}
+_LOCALE_SUBDOMAIN = re.compile(r"^[a-z]{2}(?:-[a-z]{2})?$")
+_WORD = re.compile(r"\w+")
+_WHITESPACE = re.compile(r"[ \t\u00a0]+")
+_BLANK_LINES = re.compile(r"\n\s*\n+")
+
+_BOILERPLATE = re.compile(
+    r"(?i)^(?:"
+    r"skip to (?:main )?content|sign in|sign up|log ?in|join now|register|"
+    r"accept(?: all)?(?: cookies)?|reject all|cookie (?:policy|settings|preferences)|"
+    r"we use cookies.*|this (?:site|website) uses cookies.*|"
+    r"privacy policy|terms(?: of (?:service|use))?|user agreement|"
+    # Footer notices only ("© 2024 Acme", "Copyright 2024 ..."), not prose that mentions copyright
+    r"(?:copyright ?)?(?:©|\(c\)).{0,80}|copyright (?:\d{4}|by ).{0,80}|all rights reserved.{0,80}|"
+    r"follow|share|like|reply|repost|report (?:this|post)|show more|see more|load more|"
+    r"home|menu|search|navigation|close|back to top|"
+    r"download the app|get the app|open in app|"
+    r"agree & join.*|new to linkedin\??.*|sign in to view.*|"
+    r"don.t miss what.s happening.*|people on x are the first to know.*"
+    r")[.!?]?$"
+)
+
+
+def _netloc(host: str, port: Optional[int]) -> str:
+    if ":" in host:
+        host = f"[{host}]"
+    return f"{host}:{port}" if port else host
+
+
+def display_url(url: Optional[str]) -> Optional[str]:
+    """The URL as shown to users: unchanged except for any user:password@ credentials."""
+    if not url:
+        return url
+    try:
+        parts = urlsplit(url.strip())
+        port = parts.port
+    except ValueError:
+        return url
+    if not parts.hostname or "@" not in parts.netloc:
+        return url.strip()
+    return urlunsplit(parts._replace(netloc=_netloc(parts.hostname, port)))
+
+
+def canonicalize_url(url: Optional[str]) -> Optional[str]:
+    """
+    Dedupe key for a URL, so variants of the same page collapse together:
+    https, lowercase host without www (port kept), tracking params dropped,
+    no fragment or trailing slash. On MIRRORED_HOSTS, mobile/locale
+    subdomains and share/locale params are dropped too. Not meant for
+    display; see display_url.
+    """
+    if not url:
+        return url
+    try:
+        parts = urlsplit(url.strip())
+        port = parts.port
+    except ValueError:
+        return url
+    if not parts.netloc:
+        return url
+
+    host = parts.hostname or ""
+    labels = host.split(".")
+    # A leading www never changes the page
+    if labels[0] == "www" and len(labels) > 2:
+        labels = labels[1:]
+    mirrored = ".".join(labels[-2:]) in MIRRORED_HOSTS
+    if mirrored:
+        labels = [label for label in labels[:-2] if label not in _MOBILE_LABELS] + labels[-2:]
+        if len(labels) > 2 and _LOCALE_SUBDOMAIN.match(labels[0]):
+            labels = labels[1:]
+    host = ".".join(labels)
+    host = HOST_ALIASES.get(host, host)
+
+    def dropped(key: str) -> bool:
+        key = key.lower()
+        if key in TRACKING_PARAMS or key.startswith(TRACKING_PREFIXES):
+            return True
+        return mirrored and (key in MIRRORED_PARAMS or key.startswith(MIRRORED_PREFIXES))
+
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if not dropped(k)]
+    path = parts.path.rstrip("/") or ""
+
+    return urlunsplit(("https", _netloc(host, port), path, urlencode(query), ""))
+
+
+def estimate_tokens(chars: int) -> int:
+    """Approximate token count for a number of characters."""
+    return (chars + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+class ResearchCompactor:
+    def __init__(self, provider: LLMProvider = LLMProvider.DEEPSEEK, token_budget: Optional[int] = None):
+        """
+        Initialize the ResearchCompactor for the provider that will read its output.
+        """
+        self.provider = provider
+        self.token_budget = token_budget or TOKEN_BUDGETS.get(provider, TOKEN_BUDGETS[LLMProvider.DEEPSEEK])
+
+    def _clean_paragraphs(self, content: str, stats: Dict[str, int]) -> List[str]:
+        """Splits a document into paragraphs with boilerplate lines and repeats removed."""
+        paragraphs = []
+        seen_lines = set()
+        for block in _BLANK_LINES.split(content):
+            lines = []
+            for line in block.splitlines():
+                line = _WHITESPACE.sub(" ", line).strip()
+                if not line:
+                    continue
+                if _BOILERPLATE.match(line) or line in seen_lines:
+                    stats["boilerplate_lines_removed"] += 1
+                    continue
+                seen_lines.add(line)
+                lines.append(line)
+            if lines:
+                paragraphs.append("\n".join(lines))
+        return paragraphs
+
+    @staticmethod
+    def _shingles(paragraph: str) -> set:
+        words = _WORD.findall(paragraph.lower())
+        if len(words) < SHINGLE_SIZE:
+            return {" ".join(words)} if words else set()
+        return {hash(" ".join(words[i:i + SHINGLE_SIZE])) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+    def compact(self, documents: List[Dict[str, str]]) -> Dict[str, Any]:
+        """
+        Compacts [{"url", "content"}] research documents into profiler-ready text.
+        Returns {"text", "sources", "stats"}.
+        """
+        stats = {
+            "sources": len(documents),
+            "before_chars": sum(len(doc.get("content") or "") for doc in documents),
+            "boilerplate_lines_removed": 0,
+            "duplicate_paragraphs_removed": 0,
+            "truncated_sources": 0,
+        }
+
+        # 1 + 2. Clean each source, dropping paragraphs that near-duplicate earlier ones
+        shingle_index: Dict[Any, List[int]] = {}
+        kept_shingles: List[set] = []
+        cleaned = []
+        for doc in documents:
+            kept = []
+            for paragraph in self._clean_paragraphs(doc.get("content") or "", stats):
+                shingles = self._shingles(paragraph)
+                if shingles and self._is_duplicate(shingles, shingle_index, kept_shingles):
+                    stats["duplicate_paragraphs_removed"] += 1
+                    continue
+                paragraph_id = len(kept_shingles)
+                kept_shingles.append(shingles)
+                for shingle in shingles:
+                    shingle_index.setdefault(shingle, []).append(paragraph_id)
+                kept.append(paragraph)
+            cleaned.append((doc.get("url"), kept))
+
+        # 3. Token budget: each remaining source gets a fair share, unused share carries over
+        sources = [url for url, _ in cleaned]
+        header = "POTENTIAL SOCIAL FOOTPRINTS / SOURCES FOUND:\n" + "\n".join(sources) + "\n\n"
+        remaining_chars = max(0, self.token_budget * CHARS_PER_TOKEN - len(header))
+        sections = []
+        for position, (url, paragraphs) in enumerate(cleaned):
+            share = remaining_chars // (len(cleaned) - position)
+            body = []
+            used = 0
+            for paragraph in paragraphs:
+                if used + len(paragraph) > share:
+                    if share - used > 200:
+                        body.append(paragraph[:share - used] + "...(truncated)")
+                        used = share
+                    stats["truncated_sources"] += 1
+                    break
+                body.append(paragraph)
+                used += len(paragraph) + 2
+            remaining_chars -= used
+            if body:
+                sections.append(f"\n--- Source: {url} ---\n" + "\n\n".join(body))
+
+        text = header + "\n".join(sections)
+        stats["after_chars"] = len(text)
+        stats["before_tokens"] = estimate_tokens(stats["before_chars"])
+        stats["after_tokens"] = estimate_tokens(len(text))
+        stats["token_budget"] = self.token_budget
+        return {"text": text, "sources": sources, "stats": stats}
+
+    @staticmethod
+    def _is_duplicate(shingles: set, index: Dict[Any, List[int]], kept: List[set]) -> bool:
+        candidates = {}
+        for shingle in shingles:
+            for paragraph_id in index.get(shingle, ()):
+                candidates[paragraph_id] = candidates.get(paragraph_id, 0) + 1
+        for paragraph_id, overlap in candidates.items():
+            union = len(shingles) + len(kept[paragraph_id]) - overlap
+            if union and overlap / union >= DUPLICATE_THRESHOLD:
+                return True
+        return False
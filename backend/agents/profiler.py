@@ -9,15 +9,26 @@ import os
 import re
 import json
 import time
-from typing import Dict, Any, Optional
-from pydantic import BaseModel, Field
+import asyncio
+import logging
+from typing import Dict, Any, Optional, AsyncIterator
+from pydantic import BaseModel, Field, ValidationError
 
 from ..llm_provider import (
     get_llm_response,
-    extract_json,
-    extract_think_block,
+    get_llm_response_async,
+    stream_llm_response,
+    IncrementalJSONParser,
+    find_json_object,
+    json_schema,
+    parse_llm_response,
+    retry_policy,
     LLMProvider
 )
+from ..metrics import span
+from ..cache import make_cache_key
+
+logger = logging.getLogger(__name__)
 
 
 # --- Pydantic Models for Structured Output ---
@@ -34,6 +45,11 @@ class NegotiationStrategy(BaseModel):
     leverage_point: str
 
 
+class SocialLink(BaseModel):
+    platform: str
+    url: str
+
+
 class PersonalityProfile(BaseModel):
     thought_process: str = Field(description="Internal behavioral analysis and reasoning")
     profile_summary: str
@@ -41,7 +57,7 @@ class PersonalityProfile(BaseModel):
     archetype: str
     psychological_triggers: list[str]
     negotiation_strategy: NegotiationStrategy
-    social_links: list[dict[str, str]] = []
+    social_links: list[SocialLink] = Field(default_factory=list)
     simulation_prompt: str
 
 
@@ -94,16 +110,23 @@ class PsychProfiler:
         """
         self.primary_provider = LLMProvider.DEEPSEEK
         self.fallback_provider = LLMProvider.GOOGLE
+        self.retry_policy = retry_policy
 
-    def analyze_psychology(self, text_data: str, name: str = "Unknown", context: str = "No Context Provided") -> Dict[str, Any]:
+    @staticmethod
+    def has_research(text_data: str) -> bool:
+        return bool(text_data) and len(text_data.strip()) >= 100
+
+    def stage_key(self, text_data: str, name: str = "Unknown", context: str = "No Context Provided") -> str:
         """
-        Analyzes the provided text data to build a psychological profile.
+        Memoization key over exactly what the profile prompt consumes: the
+        research text, or name and context when role-based inference applies.
         """
-        is_inference = False
-        if not text_data or len(text_data.strip()) < 100:
-            print(f"WARN: Insufficient research data for {name}. Switching to Role-Based Inference Engine.")
-            is_inference = True
-            prompt = f"""
+        inputs = [text_data] if self.has_research(text_data) else [name, context]
+        return make_cache_key("profile", self.primary_provider.value, KYOKA_SYSTEM_PROMPT, json_schema(PersonalityProfile), *inputs)
+
+    def build_role_prompt(self, name: str = "Unknown", context: str = "No Context Provided") -> str:
+        """Role-Based Inference prompt: profiles the typical person in `context`, no research needed."""
+        return f"""
 ### ROLE-BASED INFERENCE ACTIVE
 You have NO direct OSINT data for the target: "{name}"
 Context provided: "{context}"
@@ -115,72 +138,202 @@ Construct a high-probability behavioral profile based on the typical personality
 ### INPUT DATA
 [SYSTEM INFERENCE REQUEST]: Base analysis on common traits of persons in "{context}".
 """
-        else:
-            print(f"DEBUG: Analyzing psychology... Research data length: {len(text_data)} characters")
-            prompt = KYOKA_SYSTEM_PROMPT + "\n\n--- RESEARCH SUMMARY START ---\n" + text_data + "\n--- RESEARCH SUMMARY END ---"
+
+    def build_prompt(self, text_data: str, name: str = "Unknown", context: str = "No Context Provided") -> str:
+        """
+        Builds the profiling prompt. Falls back to the Role-Based Inference prompt
+        when research produced too little text to analyze.
+        """
+        if not self.has_research(text_data):
+            logger.warning(f"Insufficient research data for {name}. Switching to Role-Based Inference Engine.")
+            return self.build_role_prompt(name, context)
+        logger.debug(f"Analyzing psychology... Research data length: {len(text_data)} characters")
+        return KYOKA_SYSTEM_PROMPT + "\n\n--- RESEARCH SUMMARY START ---\n" + text_data + "\n--- RESEARCH SUMMARY END ---"
+
+    @staticmethod
+    def validate_profile(profile_json: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Validates parsed JSON into PersonalityProfile; None if it does not fit the schema."""
+        if not profile_json:
+            return None
+        try:
+            return PersonalityProfile.model_validate(profile_json).model_dump()
+        except ValidationError as e:
+            logger.warning(f"Profile JSON does not match schema: {e.error_count()} error(s)")
+            return None
+
+    def is_valid_response(self, text: str) -> bool:
+        """Hedged races only accept a response that validates against the profile schema."""
+        return self.validate_profile(find_json_object(text)[0]) is not None
+
+    def parse_response(self, full_response: str) -> Dict[str, Any]:
+        """
+        Turns the raw LLM output into the {profile, thought_process} result.
+        Only a schema-valid profile leaves here; anything else becomes an error result.
+        """
+        with span("profile.parse", chars=len(full_response)) as attrs:
+            # Extract <think> block and JSON profile in a single pass
+            think_block, profile_json = parse_llm_response(full_response)
+            validated = self.validate_profile(profile_json)
+            attrs["valid"] = validated is not None
+
+        if validated is None:
+            logger.error(f"LLM response is not a valid profile. Raw response snippet: {full_response[:200]}...")
+            reason = "does not match the profile schema" if profile_json else "contains no JSON object"
+            return self.error_result(ValueError(f"LLM response {reason}"), raw_response=full_response)
+
+        return {
+            "profile": validated,
+            # The model's own reasoning field, or its <think> block
+            "thought_process": validated.get("thought_process") or think_block or "Thinking deep... Matrix construction in progress.",
+            "validated": True
+        }
+
+    def error_result(self, e: Exception, raw_response: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Error result returned when no schema-valid profile was produced. The
+        profile is marked as an error (never memoized); the raw output, if
+        any, is attached to thought_process so the user can see what went wrong.
+        """
+        thought_process = f"Error: {str(e)}"
+        if raw_response:
+            thought_process += f"\n\n[SYSTEM ERROR] Raw Output:\n{raw_response}"
+        return {
+            "profile": {
+                "profile_summary": f"Fatal System Error: {str(e)}",
+                "disc_scores": {"dominance": 0, "influence": 0, "steadiness": 0, "conscientiousness": 0},
+                "archetype": "Error",
+                "psychological_triggers": ["System malfunction"],
+                "negotiation_strategy": {"do": [], "dont": [], "leverage_point": "None"},
+                "social_links": [],
+                "simulation_prompt": "You are a broken AI. Glitch in the matrix."
+            },
+            "thought_process": thought_process,
+            "validated": False
+        }
+
+    def analyze_psychology(self, text_data: str, name: str = "Unknown", context: str = "No Context Provided") -> Dict[str, Any]:
+        """
+        Analyzes the provided text data to build a psychological profile.
+        """
+        prompt = self.build_prompt(text_data, name, context)
 
         try:
-            # Try DeepSeek first (superior reasoning)
-            max_retries = 3
+            # DeepSeek first (superior reasoning), retried; then Gemini once
             full_response = ""
-            
-            for attempt in range(max_retries):
+            tiers = self.retry_policy.tiers(self.primary_provider, self.fallback_provider)
+
+            for provider, race in tiers:
                 try:
                     full_response = get_llm_response(
                         prompt=prompt,
-                        provider=self.primary_provider,
+                        provider=provider,
+                        temperature=0.0,
+                        fallback=race,
+                        json_mode=True,
+                        schema=PersonalityProfile
+                    )
+                    break
+                except Exception as e:
+                    delay = tiers.failed(e)
+                    if delay:
+                        logger.warning(f"Attempt {tiers.calls} failed ({e}), retrying in {delay:.1f}s...")
+                        time.sleep(delay)
+
+            return self.parse_response(full_response)
+
+        except Exception as e:
+            return self.error_result(e)
+
+    async def analyze_role_async(self, name: str = "Unknown", context: str = "No Context Provided", refresh: bool = False) -> Dict[str, Any]:
+        """
+        Role-based profile from name and context alone, so it can run while
+        research is still in progress. Same result shape as analyze_psychology.
+        `refresh` skips the LLM response cache.
+        """
+        return await self._analyze_prompt_async(self.build_role_prompt(name, context), refresh)
+
+    async def _analyze_prompt_async(self, prompt: str, refresh: bool = False) -> Dict[str, Any]:
+        """Non-streaming profile call on the event loop (no worker thread), with retries."""
+        try:
+            full_response = ""
+            tiers = self.retry_policy.tiers(self.primary_provider, self.fallback_provider)
+
+            for provider, race in tiers:
+                try:
+                    full_response = await get_llm_response_async(
+                        prompt=prompt,
+                        provider=provider,
                         temperature=0.0,
-                        fallback=True,
-                        json_mode=True
+                        fallback=race,
+                        json_mode=True,
+                        schema=PersonalityProfile,
+                        validate=self.is_valid_response,
+                        refresh=refresh
                     )
                     break
                 except Exception as e:
-                    if attempt == max_retries - 1:
-                        raise
-                    print(f"WARN: Attempt {attempt + 1} failed, retrying...")
-                    time.sleep(2)
-
-            # Extract JSON profile
-            profile_json = extract_json(full_response)
-            
-            if not profile_json:
-                print(f"ERROR: Failed to extract JSON from LLM response. Raw response snippet: {full_response[:200]}...")
-                # Fallback to a plain default if parsing failed
-                profile_json = {
-                    "thought_process": "Analysis corrupted. Insufficient data points for a stable matrix.",
-                    "profile_summary": "Analysis corrupted. Insufficient data points for a stable matrix.",
-                    "disc_scores": {"dominance": 50, "influence": 50, "steadiness": 50, "conscientiousness": 50},
-                    "archetype": "The Unknown",
-                    "psychological_triggers": ["Limited data exposure", "Encryption detected"],
-                    "negotiation_strategy": {
-                        "do": ["Proceed with extreme caution", "Gather more intel"],
-                        "dont": ["Make aggressive assumptions"],
-                        "leverage_point": "Information asymmetry"
-                    },
-                    "social_links": [],
-                    "simulation_prompt": "Speak in vague, defensive tones. Avoid specifics. You feel being watched."
-                }
-                # Attach the raw response to thought_process so the user can see what went wrong
-                thought_process = profile_json["thought_process"] + f"\n\n[SYSTEM ERROR] Failed to parse JSON. Raw Output:\n{full_response}"
-            else:
-                # Extract thought_process from the valid JSON
-                thought_process = profile_json.get("thought_process", "Thinking deep... Matrix construction in progress.")
-
-            return {
-                "profile": profile_json,
-                "thought_process": thought_process
-            }
+                    delay = tiers.failed(e)
+                    if delay:
+                        logger.warning(f"Attempt {tiers.calls} failed ({e}), retrying in {delay:.1f}s...")
+                        await asyncio.sleep(delay)
+
+            return self.parse_response(full_response)
+
+        except Exception as e:
+            return self.error_result(e)
+
+    async def analyze_psychology_stream(
+        self,
+        text_data: str,
+        name: str = "Unknown",
+        context: str = "No Context Provided",
+        refresh: bool = False
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streaming variant of analyze_psychology.
+
+        Yields SSE-ready events while the model generates:
+        - profile_delta: raw text delta
+        - profile_field: {"key", "value"} once a top-level profile field is complete
+        - profile_reset: a retry started, previously streamed output is void
+        The last event is profile_result carrying the same dict analyze_psychology returns.
+        `refresh` skips the LLM response cache.
+        """
+        prompt = self.build_prompt(text_data, name, context)
+
+        try:
+            chunks = []
+            tiers = self.retry_policy.tiers(self.primary_provider, self.fallback_provider)
+
+            for provider, race in tiers:
+                chunks = []
+                parser = IncrementalJSONParser()
+                try:
+                    async for delta in stream_llm_response(
+                        prompt=prompt,
+                        provider=provider,
+                        temperature=0.0,
+                        fallback=race,
+                        json_mode=True,
+                        schema=PersonalityProfile,
+                        validate=self.is_valid_response,
+                        refresh=refresh
+                    ):
+                        chunks.append(delta)
+                        yield {"type": "profile_delta", "data": delta}
+                        for key, value in parser.feed(delta):
+                            yield {"type": "profile_field", "data": {"key": key, "value": value}}
+                    break
+                except Exception as e:
+                    delay = tiers.failed(e)
+                    if delay:
+                        logger.warning(f"Attempt {tiers.calls} failed ({e}), retrying in {delay:.1f}s...")
+                    yield {"type": "profile_reset", "data": {"attempt": tiers.calls + 1}}
+                    await asyncio.sleep(delay)
+
+            result = self.parse_response("".join(chunks))
 
         except Exception as e:
-            return {
-                "profile": {
-                    "profile_summary": f"Fatal System Error: {str(e)}",
-                    "disc_scores": {"dominance": 0, "influence": 0, "steadiness": 0, "conscientiousness": 0},
-                    "archetype": "Error",
-                    "psychological_triggers": ["System malfunction"],
-                    "negotiation_strategy": {"do": [], "dont": [], "leverage_point": "None"},
-                    "social_links": [],
-                    "simulation_prompt": "You are a broken AI. Glitch in the matrix."
-                },
-                "thought_process": f"Error: {str(e)}"
-            }
+            result = self.error_result(e)
+
+        yield {"type": "profile_result", "data": result}
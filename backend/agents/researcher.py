@@ -1,94 +1,374 @@
 import os
-from typing import Dict, Any, Optional
-from tavily import TavilyClient
+import time
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, CancelledError, wait
+from typing import Dict, Any, List, Optional
+
+from ..cache import LRUCache, SQLiteStore, TieredCache, make_cache_key, normalize_text
+from ..scheduler import scheduler
+from ..metrics import span, event, in_context
+from ..llm_provider import latency_tracker
+from .compactor import canonicalize_url, display_url
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on simultaneous Tavily round trips for a single analysis
+DEFAULT_MAX_CONCURRENCY = 4
+# How often a running fan-out checks whether its analysis was cancelled
+CANCEL_POLL_SECONDS = 0.2
+
+DEVELOPER_KEYWORDS = ["developer", "engineer", "coder", "programmer", "software", "tech", "ai", "data"]
+
+# Tavily request tiers: every query starts basic (fast snippets) and only weak
+# results are re-fetched advanced with raw page content
+BASIC_SEARCH = {"search_depth": "basic", "include_raw_content": False, "max_results": 3}
+ADVANCED_SEARCH = {"search_depth": "advanced", "include_raw_content": True, "max_results": 3}
+SEARCH_TIERS = {"basic": BASIC_SEARCH, "advanced": ADVANCED_SEARCH}
+
+# KYOKA_SEARCH_TIERING=0 goes straight to advanced for every query (the old behaviour)
+SEARCH_TIERING = os.getenv("KYOKA_SEARCH_TIERING", "1") != "0"
+# Basic results scoring below this (0-1) are escalated
+SEARCH_ESCALATION_THRESHOLD = float(os.getenv("KYOKA_SEARCH_ESCALATION_THRESHOLD", "0.6"))
+# Snippets this long count as fully informative
+SEARCH_SNIPPET_TARGET_CHARS = 400
+
+# Search result cache (set KYOKA_SEARCH_CACHE_PATH=off to keep it in memory only)
+SEARCH_CACHE_TTL = float(os.getenv("KYOKA_SEARCH_CACHE_TTL", str(24 * 3600)))
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("KYOKA_SEARCH_CACHE_MAX_ENTRIES", "512"))
+SEARCH_CACHE_MAX_BYTES = int(os.getenv("KYOKA_SEARCH_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+SEARCH_CACHE_PATH = os.getenv(
+    "KYOKA_SEARCH_CACHE_PATH",
+    os.path.join(os.path.dirname(__file__), "..", "..", ".cache", "search_cache.sqlite3")
+)
+
+_search_cache: Optional[TieredCache] = None
+_search_cache_lock = threading.Lock()
+
+
+def get_search_cache() -> TieredCache:
+    """Process-wide Tavily result cache shared by every DeepResearchAgent."""
+    global _search_cache
+    if _search_cache is None:
+        with _search_cache_lock:
+            if _search_cache is None:
+                disk = None
+                if SEARCH_CACHE_PATH and SEARCH_CACHE_PATH.lower() != "off":
+                    try:
+                        disk = SQLiteStore(SEARCH_CACHE_PATH, ttl=SEARCH_CACHE_TTL, max_bytes=SEARCH_CACHE_MAX_BYTES)
+                    except Exception as e:
+                        logger.warning(f"Search disk cache unavailable ({e}). Using memory only.")
+                _search_cache = TieredCache(
+                    LRUCache(max_entries=SEARCH_CACHE_MAX_ENTRIES, ttl=SEARCH_CACHE_TTL),
+                    disk
+                )
+    return _search_cache
+
 
 class DeepResearchAgent:
-    def __init__(self, tavily_api_key: Optional[str] = None, **kwargs):
+    def __init__(
+        self,
+        tavily_api_key: Optional[str] = None,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        cache: Optional[TieredCache] = None,
+        use_cache: bool = True,
+        refresh: bool = False,
+        **kwargs
+    ):
         """
         Initialize the DeepResearchAgent with Tavily API key.
-        The **kwargs argument allows for passing other keys (like groq_api_key) 
+        With `refresh`, cached search results are ignored (fresh ones still replace them).
+        The **kwargs argument allows for passing other keys (like groq_api_key)
         without breaking compatibility, even if they aren't used here.
         """
         self.tavily_key = tavily_api_key or os.getenv("TAVILY_API_KEY")
-        
+        self.max_concurrency = max(1, max_concurrency)
+        self.cache = (cache or get_search_cache()) if use_cache else None
+        self.refresh = refresh
+
         if self.tavily_key:
+            # Deferred so importing the backend does not pay for the SDK (and requests)
+            from tavily import TavilyClient
+            # One client per agent, shared by every worker thread of a search fan-out
             self.tavily_client = TavilyClient(api_key=self.tavily_key)
         else:
             self.tavily_client = None
 
-    def run_deep_search(self, name: str, context: str = "", max_iterations: int = 3, status_callback=None) -> Dict[str, Any]:
+    def _search(
+        self,
+        query: str,
+        cached_queries: Optional[List[str]] = None,
+        failed_queries: Optional[List[str]] = None,
+        depth: str = "advanced",
+        latencies: Optional[Dict[str, float]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Runs a single Tavily query at `depth` ("basic" | "advanced") and returns its
+        raw results (cached, no shared state). The query is appended to
+        `cached_queries` / `failed_queries` when served from cache / failed, and the
+        round-trip time of a real request is stored in `latencies[depth]`.
+        """
+        params = SEARCH_TIERS[depth]
+        cache_key = make_cache_key("tavily", normalize_text(query), params)
+
+        with span("search", query=query, depth=depth) as attrs:
+            if self.cache is not None and not self.refresh:
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    logger.debug(f"Tavily cache hit for '{query}' ({len(cached)} results).")
+                    attrs["cache"] = "hit"
+                    if cached_queries is not None:
+                        cached_queries.append(query)
+                    return cached
+
+            try:
+                # Shared Tavily budget across every concurrent analysis
+                with scheduler.slot("tavily"):
+                    started = time.perf_counter()
+                    response = self.tavily_client.search(query=query, **params)
+                    elapsed = time.perf_counter() - started
+            except Exception as e:
+                logger.error(f"Search Error for '{query}': {e}")
+                attrs["cache"] = "miss"
+                attrs["outcome"] = "error"
+                if failed_queries is not None:
+                    failed_queries.append(query)
+                return []
+
+            latency_tracker.observe(f"tavily:{depth}", elapsed)
+            if latencies is not None:
+                latencies[depth] = elapsed
+            results = response.get('results', []) if response else []
+            logger.debug(f"Tavily search for '{query}' returned {len(results)} results.")
+            attrs["cache"] = "miss"
+            attrs["results"] = len(results)
+            # Only successful searches are cached; failures are retried next time
+            if self.cache is not None:
+                self.cache.set(cache_key, results)
+            return results
+
+    @staticmethod
+    def score_results(results: List[Dict[str, Any]], name: str, platforms: Optional[List[str]] = None) -> float:
+        """
+        How well a result set answers its query (0-1): share of results naming
+        the target, snippet length, and whether the expected platform
+        (`platforms` domains, None = any) turned up.
+        """
+        if not results:
+            return 0.0
+        tokens = [token for token in normalize_text(name).split() if len(token) > 1]
+        name_hits = 0
+        snippet_score = 0.0
+        for result in results:
+            text = " ".join(str(result.get(field) or "") for field in ("title", "content", "url")).lower()
+            if all(token in text for token in tokens):
+                name_hits += 1
+            snippet_score += min(1.0, len(result.get('content') or '') / SEARCH_SNIPPET_TARGET_CHARS)
+        urls = [(result.get('url') or '').lower() for result in results]
+        coverage = 1.0 if not platforms or any(domain in url for url in urls for domain in platforms) else 0.0
+        return round(0.4 * name_hits / len(results) + 0.3 * snippet_score / len(results) + 0.3 * coverage, 3)
+
+    def _tiered_search(
+        self,
+        query: str,
+        name: str,
+        platforms: Optional[List[str]],
+        escalations: List[Dict[str, Any]],
+        cancel_event: Optional[threading.Event] = None,
+        cached_queries: Optional[List[str]] = None,
+        failed_queries: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Basic search first; escalates to an advanced/raw-content search only if the
+        basic results score below SEARCH_ESCALATION_THRESHOLD. Appends the decision
+        (query, score, escalated, per-tier latencies) to `escalations`.
+        The query counts as cached only if no tier made a fresh request, and as
+        failed only if its final tier failed.
+        """
+        latencies: Dict[str, float] = {}
+        tier_cached: List[str] = []
+        tier_failed: List[str] = []
+        results = self._search(query, tier_cached, tier_failed, depth="basic", latencies=latencies)
+        score = self.score_results(results, name, platforms)
+        escalated = score < SEARCH_ESCALATION_THRESHOLD and not (cancel_event and cancel_event.is_set())
+        if escalated:
+            event("search.escalated", query=query, score=score)
+            tier_failed.clear()
+            # A failed advanced fetch still leaves the basic results to work with
+            results = self._search(query, tier_cached, tier_failed, depth="advanced", latencies=latencies) or results
+        escalations.append({"query": query, "score": score, "escalated": escalated, "latency": latencies})
+
+        if cached_queries is not None and len(tier_cached) == (2 if escalated else 1):
+            cached_queries.append(query)
+        if failed_queries is not None and tier_failed:
+            failed_queries.append(query)
+        return results
+
+    @staticmethod
+    def latency_saved(escalations: List[Dict[str, Any]]) -> Optional[float]:
+        """
+        Estimated seconds saved versus searching everything advanced: the typical
+        (p50) advanced latency minus what each query actually spent on Tavily.
+        Cached searches count as neither; None until an advanced latency is known.
+        """
+        advanced_p50 = latency_tracker.percentile("tavily:advanced", 0.5)
+        if advanced_p50 is None:
+            return None
+        saved = 0.0
+        for decision in escalations:
+            spent = decision["latency"]
+            if "basic" not in spent:
+                continue  # basic tier served from cache
+            # An escalated query would have paid for its advanced search anyway
+            baseline = spent.get("advanced", 0.0) if decision["escalated"] else advanced_p50
+            saved += baseline - sum(spent.values())
+        return round(saved, 3)
+
+    def plan_queries(self, name: str, context: str = "") -> Dict[str, Any]:
+        """
+        The searches run_deep_search issues for (name, context): the initial
+        queries plus the gap query, which only applies in a developer context
+        (and only fires if no GitHub result turns up). Research depends on
+        nothing else, so this doubles as its memoization key.
+        """
+        is_developer_context = any(kw in context.lower() for kw in DEVELOPER_KEYWORDS)
+        return {
+            "queries": [
+                f"{name} {context} linkedin",
+                f"{name} github",
+                f"{name} twitter"
+            ],
+            # Domains each initial query is expected to surface (escalation scoring)
+            "platforms": [["linkedin.com"], ["github.com"], ["twitter.com", "x.com"]],
+            "gap_query": f"{name} personal website portfolio" if is_developer_context else None,
+            "escalation_threshold": SEARCH_ESCALATION_THRESHOLD if SEARCH_TIERING else None,
+        }
+
+    def run_deep_search(
+        self,
+        name: str,
+        context: str = "",
+        max_iterations: int = 3,
+        status_callback=None,
+        cancel_event: Optional[threading.Event] = None
+    ) -> Dict[str, Any]:
         """
         Executes the 'Deep Diver' research logic:
-        1. Initial Search: LinkedIn, GitHub, Twitter.
+        1. Initial Search: LinkedIn, GitHub, Twitter (issued concurrently).
         2. Gap Analysis: Check for Developer context & missing GitHub.
         3. Content Aggregation.
+
+        With tiering on, each query runs as a basic search and only weak
+        results are escalated to advanced/raw-content fetches; the result
+        reports every escalation decision and the estimated latency saved.
+        Results are merged in query order (LinkedIn, GitHub, Twitter, Gap),
+        regardless of which request finished first, so the output is stable.
+        The result also lists which queries were issued, served from the
+        search cache, or failed.
+
+        Setting `cancel_event` stops the fan-out: queued searches are dropped,
+        no escalation or gap query is started, and CancelledError is raised
+        once the searches already on the wire return.
         """
         if not self.tavily_client:
             raise ValueError("Tavily API key is required for Deep Research.")
 
+        # 1. Initial Searches
+        plan = self.plan_queries(name, context)
+        queries = plan["queries"]
+        platforms = plan["platforms"]
+        github_query_index = 1
+        gap_query = plan["gap_query"]
+
+        # Check if context implies developer (known before any search returns)
+        is_developer_context = gap_query is not None
+
+        results_by_index: Dict[int, List[Dict[str, Any]]] = {}
+        issued_queries = list(queries)
+        cached_queries: List[str] = []
+        failed_queries: List[str] = []
+        escalations: List[Dict[str, Any]] = []
+        tiered = plan["escalation_threshold"] is not None
+
+        def search(query: str, query_platforms: Optional[List[str]]) -> List[Dict[str, Any]]:
+            if cancel_event is not None and cancel_event.is_set():
+                return []
+            if tiered:
+                return self._tiered_search(
+                    query, name, query_platforms, escalations, cancel_event,
+                    cached_queries=cached_queries, failed_queries=failed_queries
+                )
+            return self._search(query, cached_queries=cached_queries, failed_queries=failed_queries)
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="tavily") as pool:
+            pending = {}
+            for i, q in enumerate(queries):
+                if status_callback:
+                    status_callback(f"Searching: '{q}'")
+                pending[pool.submit(in_context(search), q, platforms[i])] = i
+
+            # 2. Gap Analysis
+            # Decided as soon as the GitHub query has returned: if neither it nor any
+            # search finished so far surfaced a github URL, the fallback query is fired
+            # while the remaining initial searches are still in flight.
+            gap_decided = not is_developer_context
+            while pending:
+                done, _ = wait(pending, timeout=CANCEL_POLL_SECONDS if cancel_event else None, return_when=FIRST_COMPLETED)
+                if cancel_event is not None and cancel_event.is_set():
+                    # In-flight HTTP requests cannot be interrupted; everything else is dropped
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    raise CancelledError(f"Research for {name!r} cancelled")
+                for future in done:
+                    results_by_index[pending.pop(future)] = future.result()
+
+                if not gap_decided and github_query_index in results_by_index:
+                    gap_decided = True
+                    found_github = any(
+                        "github.com" in (result.get('url') or '')
+                        for results in results_by_index.values()
+                        for result in results
+                    )
+                    if not found_github:
+                        if status_callback:
+                            status_callback(f"Gap Analysis Triggered (Developer): '{gap_query}'")
+                        issued_queries.append(gap_query)
+                        pending[pool.submit(in_context(search), gap_query, None)] = len(queries)
+
+        # 3. Content Aggregation (deterministic: query order, then result order)
+        # Canonical URLs are the dedupe key, so tracking/mobile/locale variants collapse
+        # together; the first variant seen is the one shown
         all_text = []
         all_sources = []
+        documents = []
         seen_urls = set()
 
-        # Helper to perform a search and accumulate results
-        def perform_search(query, step_desc):
-            if status_callback:
-                status_callback(f"{step_desc}: '{query}'")
-            
-            try:
-                response = self.tavily_client.search(
-                    query=query, 
-                    search_depth="advanced", 
-                    include_raw_content=True,
-                    max_results=3
-                )
-                
-                res_count = 0
-                if response and 'results' in response:
-                    res_count = len(response['results'])
-                    for result in response['results']:
-                        url = result.get('url')
-                        if url not in seen_urls:
-                            seen_urls.add(url)
-                            all_sources.append(url)
-                            content = result.get('raw_content') or result.get('content', '')
-                            # Limiting content per source to avoid exploding context too much
-                            if len(content) > 10000: 
-                                content = content[:10000] + "...(truncated)"
-                            all_text.append(f"\n--- Source: {url} ---\n{content}")
-                
-                print(f"DEBUG: Tavily search for '{query}' returned {res_count} results.")
-            except Exception as e:
-                print(f"ERROR: Search Error for '{query}': {e}")
+        for i in sorted(results_by_index):
+            for result in results_by_index[i]:
+                key = canonicalize_url(result.get('url'))
+                if key not in seen_urls:
+                    seen_urls.add(key)
+                    url = display_url(result.get('url'))
+                    all_sources.append(url)
+                    content = result.get('raw_content') or result.get('content', '')
+                    # Limiting content per source to avoid exploding context too much
+                    if len(content) > 10000:
+                        content = content[:10000] + "...(truncated)"
+                    documents.append({"url": url, "content": content})
+                    all_text.append(f"\n--- Source: {url} ---\n{content}")
 
-        # 1. Initial Searches
-        queries = [
-            f"{name} {context} linkedin",
-            f"{name} github",
-            f"{name} twitter"
-        ]
-        
-        for q in queries:
-            perform_search(q, "Searching")
-
-        # 2. Gap Analysis
-        # Check if we found a github url
-        found_github = any("github.com" in url for url in seen_urls)
-        
-        # Check if context implies developer
-        is_developer_context = any(kw in context.lower() for kw in ["developer", "engineer", "coder", "programmer", "software", "tech", "ai", "data"])
-        
-        if is_developer_context and not found_github:
-            perform_search(f"{name} personal website portfolio", "Gap Analysis Triggered (Developer)")
-
-        # 3. Content Aggregation
         massive_text = "\n".join(all_text)
-        
+
         # Prepend a summary of sources to help the Profiler identify social links easily
         sources_summary = "POTENTIAL SOCIAL FOOTPRINTS / SOURCES FOUND:\n" + "\n".join(all_sources) + "\n\n"
         final_text = sources_summary + massive_text
-        
+
         return {
             "text": final_text,
-            "sources": all_sources
+            "sources": all_sources,
+            "documents": documents,
+            "queries": issued_queries,
+            "cached_queries": [q for q in issued_queries if q in cached_queries],
+            "failed_queries": [q for q in issued_queries if q in failed_queries],
+            "escalations": sorted(escalations, key=lambda decision: issued_queries.index(decision["query"])),
+            "latency_saved": self.latency_saved(escalations) if escalations else None
         }
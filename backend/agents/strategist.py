@@ -7,9 +7,14 @@ Leverages the reliable free tier and 1M token context window.
 
 import os
 import time
-from typing import Dict, Any, Optional
+import asyncio
+import logging
+from typing import Dict, Any, Optional, AsyncIterator
 
-from ..llm_provider import get_llm_response, LLMProvider
+from ..llm_provider import get_llm_response, stream_llm_response, retry_policy, response_cache, LLMProvider
+from ..cache import make_cache_key
+
+logger = logging.getLogger(__name__)
 
 
 class MeetingStrategist:
@@ -20,12 +25,21 @@ class MeetingStrategist:
         """
         # API keys are loaded from environment by llm_provider
         self.provider = LLMProvider.GOOGLE
+        self.temperature = 0.7
+        self.retry_policy = retry_policy
 
-    def generate_strategy(self, profile_data: Dict[str, Any], meeting_purpose: str) -> str:
-        """
-        Generates a strategic 'Battle Card' using Gemini 1.5 Flash.
-        """
-        prompt = f"""
+    @property
+    def memoizable(self) -> bool:
+        """Sampled output is not meant to repeat, so it is memoized under the LLM cache's temperature rule."""
+        return self.temperature == 0 or response_cache.any_temperature
+
+    def stage_key(self, profile_data: Dict[str, Any], meeting_purpose: str) -> str:
+        """Memoization key: the Battle Card depends only on its prompt (profile + meeting purpose)."""
+        return make_cache_key("strategy", self.provider.value, self.build_prompt(profile_data, meeting_purpose))
+
+    def build_prompt(self, profile_data: Dict[str, Any], meeting_purpose: str) -> str:
+        """Builds the Battle Card prompt from the profile and meeting purpose."""
+        return f"""
 You are a Headhunter. Write a 'Battle Card'.
 
 TONE: Ruthless, Direct, Anti-Fluff.
@@ -59,26 +73,80 @@ Structure your response exactly as follows:
 "(Write a distinct opening line)"
 """
 
+    def generate_strategy(self, profile_data: Dict[str, Any], meeting_purpose: str) -> str:
+        """
+        Generates a strategic 'Battle Card' using Gemini 1.5 Flash.
+        """
+        prompt = self.build_prompt(profile_data, meeting_purpose)
+
         try:
-            max_retries = 3
             strategy = ""
-            
-            for attempt in range(max_retries):
+            # No fallback tier needed, Gemini is already the reliable option
+            tiers = self.retry_policy.tiers(self.provider)
+
+            for provider, race in tiers:
                 try:
                     strategy = get_llm_response(
                         prompt=prompt,
-                        provider=self.provider,
-                        temperature=0.7,
-                        fallback=False  # No fallback needed, Gemini is already the reliable option
+                        provider=provider,
+                        temperature=self.temperature,
+                        fallback=race
                     )
                     break
                 except Exception as e:
-                    if attempt == max_retries - 1:
-                        raise
-                    print(f"⚠️ Strategy attempt {attempt + 1} failed, retrying...")
-                    time.sleep(5 * (attempt + 1))
+                    delay = tiers.failed(e)
+                    logger.warning(f"Strategy attempt {tiers.calls} failed ({e}), retrying in {delay:.1f}s...")
+                    time.sleep(delay)
             
             return strategy
             
         except Exception as e:
             return f"Error generating strategy: {e}"
+
+    async def generate_strategy_stream(
+        self,
+        profile_data: Dict[str, Any],
+        meeting_purpose: str,
+        refresh: bool = False
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streaming variant of generate_strategy.
+
+        Yields strategy_delta events as the Battle Card is written (and
+        strategy_reset if a retry discards them), then a final
+        strategy_result carrying the complete document. `refresh` skips the
+        LLM response cache.
+        """
+        prompt = self.build_prompt(profile_data, meeting_purpose)
+
+        try:
+            chunks = []
+            tiers = self.retry_policy.tiers(self.provider)
+
+            for provider, race in tiers:
+                chunks = []
+                try:
+                    async for delta in stream_llm_response(
+                        prompt=prompt,
+                        provider=provider,
+                        temperature=self.temperature,
+                        fallback=race,
+                        refresh=refresh
+                    ):
+                        chunks.append(delta)
+                        yield {"type": "strategy_delta", "data": delta}
+                    break
+                except Exception as e:
+                    delay = tiers.failed(e)
+                    logger.warning(f"Strategy attempt {tiers.calls} failed ({e}), retrying in {delay:.1f}s...")
+                    yield {"type": "strategy_reset", "data": {"attempt": tiers.calls + 1}}
+                    await asyncio.sleep(delay)
+
+            strategy = "".join(chunks)
+            complete = True
+
+        except Exception as e:
+            strategy = f"Error generating strategy: {e}"
+            complete = False
+
+        yield {"type": "strategy_result", "data": strategy, "complete": complete}
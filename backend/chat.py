@@ -0,0 +1,89 @@
+"""
+Chat Simulator Helpers
+
+Persona prompt and message assembly for the /chat practice simulator.
+"""
+
+from typing import Any, Dict, List, Optional
+
+from .schemas import ChatMessage
+
+
+def build_persona_prompt(profile: Dict[str, Any], context: str) -> str:
+    """Builds the system prompt that makes the model act as the profiled target."""
+    # Determine simulation prompt and persona
+    simulation_prompt = profile.get('simulation_prompt', "Act as the persona described in the psychology profile.")
+
+    return f"""
+        --- SYSTEM INSTRUCTION ---
+        You are simulating the persona below. Your goal is to have a natural, realistic conversation.
+
+        {simulation_prompt}
+
+        --- PSYCHOLOGICAL BASELINE ---
+        {profile.get('profile_summary', '')}
+
+        --- CONTEXT ---
+        Message Topic: {context}
+
+        --- INTERACTION GUIDELINES ---
+        1. ACT NATURAL. If the user says "hi", say hi back. Do not be weirdly aggressive unless the persona demands it.
+        2. MATCH ENERGY AND LENGTH. If the user sends a short message/greeting, keep your response short (1-2 sentences). Do not launch into complex topics or "info-dump" unless the user asks.
+        3. Adopt the speech patterns, tone, and vocabulary of the target.
+        4. Do not reveal you are an AI.
+        5. Keep responses valid to the context, but start casually if the user is casual.
+        """
+
+
+def build_chat_messages(system_prompt: str, history: List[ChatMessage], summary: Optional[str] = None) -> list:
+    """
+    Converts the chat history into LangChain messages behind the persona prompt.
+    `summary` stands in for older turns that were compacted out of the history.
+    """
+    # Deferred: langchain_core is only needed once a chat turn actually runs
+    from langchain_core.messages import HumanMessage, SystemMessage
+
+    messages = [SystemMessage(content=system_prompt)]
+    if summary:
+        messages.append(SystemMessage(content=f"--- CONVERSATION SO FAR (summary of earlier turns) ---\n{summary}"))
+    for msg in history:
+        if msg.role == "user":
+            messages.append(HumanMessage(content=msg.content))
+        else:
+            messages.append(HumanMessage(content=f"(You previously said): {msg.content}"))
+    return messages
+
+
+def build_summary_prompt(previous_summary: Optional[str], history: List[ChatMessage]) -> str:
+    """Asks for a rolling summary that folds older turns into the previous summary."""
+    transcript = "\n".join(
+        f"{'USER' if msg.role == 'user' else 'PERSONA'}: {msg.content}" for msg in history
+    )
+    return f"""
+Summarize this practice conversation between a USER and a simulated PERSONA so it can
+replace the transcript in the persona's memory.
+
+Keep: facts either side stated, commitments, open questions, objections raised,
+the current tone/rapport, and anything the user is trying to get from the persona.
+Drop greetings and filler. Write at most 200 words in plain prose, past tense.
+
+PREVIOUS SUMMARY:
+{previous_summary or "(none)"}
+
+NEW TRANSCRIPT TO FOLD IN:
+{transcript}
+"""
+
+
+def content_to_text(content: Any) -> str:
+    """Ensures we send a String, not a complex object."""
+    if isinstance(content, list):
+        # If it's a list of blocks (common in newer LangChain versions), join the text parts
+        text_parts = []
+        for block in content:
+            if isinstance(block, dict) and block.get("type") == "text":
+                text_parts.append(block.get("text", ""))
+            elif isinstance(block, str):
+                text_parts.append(block)
+        return "\n".join(text_parts)
+    return str(content)
@@ -0,0 +1,103 @@
+"""
+Analysis Executor
+
+Admission control for whole pipeline runs (the scheduler below it limits
+individual provider calls):
+- at most KYOKA_MAX_CONCURRENT_ANALYSES analyses run at once,
+- up to KYOKA_ANALYSIS_QUEUE_SIZE more wait for a slot in arrival order,
+- anything beyond that is rejected up front with AnalysisRejected, which
+  carries a Retry-After estimate derived from recent analysis durations.
+
+    executor.reserve()              # on the request path; may raise AnalysisRejected
+    async with executor.slot():     # in the pipeline task; waits its turn
+        ...
+    executor.release()              # once the task is done, however it ended
+"""
+
+import os
+import math
+import time
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+from .metrics import event, record_duration
+
+
+MAX_CONCURRENT_ANALYSES = int(os.getenv("KYOKA_MAX_CONCURRENT_ANALYSES", "4"))
+ANALYSIS_QUEUE_SIZE = int(os.getenv("KYOKA_ANALYSIS_QUEUE_SIZE", "8"))
+# Assumed analysis duration until a few have completed
+DEFAULT_ANALYSIS_SECONDS = 30.0
+
+
+class AnalysisRejected(RuntimeError):
+    """Raised by reserve() when every running and queued slot is taken."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Analysis capacity exhausted, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class AnalysisExecutor:
+    def __init__(self, max_concurrent: int = MAX_CONCURRENT_ANALYSES, max_queued: int = ANALYSIS_QUEUE_SIZE):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queued = max(0, max_queued)
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._reserved = 0
+        self._running = 0
+        self._durations: deque = deque(maxlen=50)
+        self._counters = {"admitted": 0, "rejected": 0}
+
+    @property
+    def queued(self) -> int:
+        return self._reserved - self._running
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely to free up: queue waves times the median run."""
+        durations = sorted(self._durations)
+        typical = durations[len(durations) // 2] if durations else DEFAULT_ANALYSIS_SECONDS
+        waves = (self.queued + 1) / self.max_concurrent
+        return max(1, math.ceil(typical * waves))
+
+    def reserve(self):
+        """Claims a running-or-queued place (event loop thread) or raises AnalysisRejected."""
+        if self._reserved >= self.max_concurrent + self.max_queued:
+            self._counters["rejected"] += 1
+            event("analysis.rejected")
+            raise AnalysisRejected(self.retry_after())
+        self._reserved += 1
+        self._counters["admitted"] += 1
+
+    def release(self):
+        """Returns a place claimed by reserve()."""
+        self._reserved -= 1
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Waits (FIFO) for one of the concurrent slots, held for the duration of the run."""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        queued_at = time.perf_counter()
+        async with self._semaphore:
+            started = time.perf_counter()
+            if started - queued_at > 0.001:
+                record_duration("queue.analysis", started - queued_at, start=queued_at)
+            self._running += 1
+            try:
+                yield
+            finally:
+                self._running -= 1
+                self._durations.append(time.perf_counter() - started)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._running,
+            "queued": self.queued,
+            "max_concurrent": self.max_concurrent,
+            "max_queued": self.max_queued,
+            **self._counters,
+        }
+
+
+analysis_executor = AnalysisExecutor()
@@ -0,0 +1,166 @@
+"""
+Analysis Single-Flight
+
+Identical analyses that overlap in time share one pipeline run. The first
+request for a normalized (name, context) starts the pipeline; later
+requests subscribe to the same run, get every event emitted so far
+replayed, and then receive new events live, ending with the same
+"final" (or "error") event.
+
+A flight is forgotten as soon as its pipeline finishes, so this only
+deduplicates concurrent work; it is not a result cache.
+
+New flights are admitted through the analysis executor (bounded running +
+queued analyses). A flight whose last subscriber has been gone for
+KYOKA_ABANDON_GRACE_SECONDS (or that never got one) is cancelled, aborting
+its pending searches and LLM calls; a client reconnecting within the grace
+period rejoins it.
+"""
+
+import os
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set
+
+from .cache import make_cache_key, normalize_text
+from .metrics import event
+from .executor import AnalysisExecutor, analysis_executor
+
+logger = logging.getLogger(__name__)
+
+
+ABANDON_GRACE_SECONDS = float(os.getenv("KYOKA_ABANDON_GRACE_SECONDS", "5"))
+
+
+Emit = Callable[[Dict[str, Any]], None]
+Runner = Callable[[Emit], Awaitable[Dict[str, Any]]]
+
+
+class AnalysisFlight:
+    """One running pipeline, its event log and its live subscribers."""
+
+    def __init__(self, key: str):
+        self.key = key
+        self.events: List[Dict[str, Any]] = []
+        self.finished = False
+        self._queues: Set[asyncio.Queue] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._abandon_timer: Optional[asyncio.TimerHandle] = None
+
+    def publish(self, item: Dict[str, Any]):
+        """Pipeline emit callback (event loop thread): records and fans out one event."""
+        self.events.append(item)
+        for queue in self._queues:
+            queue.put_nowait(item)
+
+    def _close(self):
+        self.finished = True
+        if self._abandon_timer is not None:
+            self._abandon_timer.cancel()
+            self._abandon_timer = None
+        for queue in self._queues:
+            queue.put_nowait(None)
+
+    def _arm_abandon_timer(self):
+        """Starts the grace period after which a run nobody is listening to is cancelled."""
+        if not self._queues and not self.finished and self._abandon_timer is None:
+            self._abandon_timer = asyncio.get_running_loop().call_later(ABANDON_GRACE_SECONDS, self._cancel_if_abandoned)
+
+    async def subscribe(self) -> AsyncIterator[Dict[str, Any]]:
+        """Replays every event so far, then follows the run live until it ends."""
+        queue: asyncio.Queue = asyncio.Queue()
+        if self._abandon_timer is not None:
+            self._abandon_timer.cancel()
+            self._abandon_timer = None
+        # Snapshot and registration happen without an await in between, so no event is missed or doubled
+        for item in self.events:
+            queue.put_nowait(item)
+        if self.finished:
+            queue.put_nowait(None)
+        else:
+            self._queues.add(queue)
+        try:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                yield item
+        finally:
+            self._queues.discard(queue)
+            self._arm_abandon_timer()
+
+    def _cancel_if_abandoned(self):
+        self._abandon_timer = None
+        if self._queues or self.finished or self._task is None:
+            return
+        logger.info(f"Every client left analysis {self.key[:12]}; cancelling it.")
+        self._task.cancel()
+
+
+class AnalysisFlights:
+    def __init__(self, executor: AnalysisExecutor = analysis_executor):
+        self.executor = executor
+        self._flights: Dict[str, AnalysisFlight] = {}
+        self.started = 0
+        self.coalesced = 0
+        self.cancelled = 0
+
+    @staticmethod
+    def key(name: str, context: str, **options) -> str:
+        return make_cache_key("analysis", normalize_text(name), normalize_text(context), options)
+
+    def join(self, name: str, context: str, runner: Runner, **options) -> AnalysisFlight:
+        """
+        Returns the in-flight run for (name, context, options), starting
+        `runner(emit)` as a new one if there is none. The runner's result
+        becomes the "final" event; an exception becomes the "error" event.
+        Starting a new run raises AnalysisRejected when the executor is full.
+        """
+        key = self.key(name, context, **options)
+        flight = self._flights.get(key)
+        if flight is not None:
+            self.coalesced += 1
+            event("analysis.coalesced")
+            logger.info(f"Joining in-flight analysis for {name!r} ({len(flight.events)} events to replay).")
+            return flight
+
+        # Before anything is registered, so a rejected request leaves no trace
+        self.executor.reserve()
+        flight = self._flights[key] = AnalysisFlight(key)
+        self.started += 1
+        flight._task = asyncio.create_task(self._run(flight, runner))
+        # A done callback also covers a task cancelled before it ever started
+        flight._task.add_done_callback(lambda _: self.executor.release())
+        # Armed until the first subscriber arrives, so a client that leaves before reading still cancels the run
+        flight._arm_abandon_timer()
+        return flight
+
+    async def _run(self, flight: AnalysisFlight, runner: Runner):
+        try:
+            async with self.executor.slot():
+                result = await runner(flight.publish)
+            flight.publish({"type": "final", "data": result})
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            event("analysis.cancelled")
+            flight.publish({"type": "error", "data": "Analysis cancelled."})
+            raise
+        except Exception as e:
+            flight.publish({"type": "error", "data": str(e)})
+        finally:
+            # New requests from here on start a fresh run
+            if self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+            flight._close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._flights),
+            "subscribers": sum(len(flight._queues) for flight in self._flights.values()),
+            "started": self.started,
+            "coalesced": self.coalesced,
+            "cancelled": self.cancelled,
+        }
+
+
+analysis_flights = AnalysisFlights()
@@ -0,0 +1,37 @@
+"""
+Gunicorn settings for `run.py --prod` (Linux/macOS).
+
+The app is imported once in the master (preload_app) and forked into
+uvicorn workers. The collector is kept off until the fork and the heap is
+frozen right before it, so module code, schemas and prompt templates stay
+shared copy-on-write instead of being copied into every worker when a GC
+pass touches their reference counts. Per-worker resources (HTTP client
+pools, the log writer thread, SQLite handles) are created after the fork.
+
+Jobs, chat sessions, analysis flights and admission limits live in worker
+memory, so a single worker is the default; more workers need sticky routing.
+"""
+
+import gc
+import os
+
+
+bind = os.getenv("KYOKA_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("KYOKA_WORKERS", "1"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+# SSE analyses can run for minutes; give in-flight streams time to finish on reload/shutdown
+graceful_timeout = int(os.getenv("KYOKA_GRACEFUL_TIMEOUT", "120"))
+keepalive = 5
+
+gc.disable()
+
+
+def pre_fork(server, worker):
+    gc.freeze()
+    # Frozen objects are never scanned again, so the master can collect its own garbage
+    gc.enable()
+
+
+def post_fork(server, worker):
+    gc.enable()
@@ -0,0 +1,144 @@
+"""
+Analysis Jobs
+
+Backs the job-based POST /analyze API: submitting returns immediately with
+a job id while the pipeline runs as a background task on the event loop,
+and clients poll (or long-poll) for status and result.
+"""
+
+import os
+import time
+import uuid
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+
+from .pipeline import run_analysis
+from .flights import AnalysisFlight, analysis_flights
+
+logger = logging.getLogger(__name__)
+
+
+# Finished jobs are kept this long for polling before being pruned
+JOB_RETENTION_SECONDS = float(os.getenv("KYOKA_JOB_RETENTION_SECONDS", "3600"))
+MAX_RETAINED_JOBS = int(os.getenv("KYOKA_MAX_RETAINED_JOBS", "1000"))
+
+
+class AnalysisJob:
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+    def __init__(self, name: str, context: str, refresh: bool = False):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.context = context
+        self.refresh = refresh
+        self.status = self.QUEUED
+        self.progress: Optional[str] = None
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self._done = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (self.COMPLETED, self.FAILED)
+
+    def record(self, event: Dict[str, Any]):
+        """Pipeline emit callback: keeps the latest status line for pollers."""
+        if event.get("type") == "status":
+            self.progress = event["data"]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "progress": self.progress,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobStore:
+    def __init__(self, retention_seconds: float = JOB_RETENTION_SECONDS, max_jobs: int = MAX_RETAINED_JOBS):
+        self.retention_seconds = retention_seconds
+        self.max_jobs = max_jobs
+        self._jobs: Dict[str, AnalysisJob] = {}
+
+    def submit(self, name: str, context: str, refresh: bool = False) -> AnalysisJob:
+        """
+        Registers a job and starts its pipeline as a background task.
+        Raises AnalysisRejected (nothing registered) when the executor is full.
+        """
+        self._prune()
+        job = AnalysisJob(name, context, refresh)
+        # Shares the run with any identical analysis already in flight (streamed or job)
+        flight = analysis_flights.join(
+            name,
+            context,
+            lambda emit: run_analysis(name, context, emit=emit, analysis_id=job.id, refresh=refresh),
+            refresh=refresh
+        )
+        self._jobs[job.id] = job
+        job._task = asyncio.create_task(self._run(job, flight))
+        return job
+
+    async def _run(self, job: AnalysisJob, flight: AnalysisFlight):
+        try:
+            async for event in flight.subscribe():
+                # Stays queued while the flight waits for an executor slot
+                job.status = AnalysisJob.RUNNING
+                if event["type"] == "final":
+                    job.result = event["data"]
+                elif event["type"] == "error":
+                    raise RuntimeError(event["data"])
+                else:
+                    job.record(event)
+            job.status = AnalysisJob.COMPLETED
+        except Exception as e:
+            logger.exception(f"Analysis job {job.id} failed: {e}")
+            job.error = str(e)
+            job.status = AnalysisJob.FAILED
+        finally:
+            job.finished_at = time.time()
+            job._done.set()
+
+    def get(self, job_id: str) -> Optional[AnalysisJob]:
+        return self._jobs.get(job_id)
+
+    async def wait(self, job: AnalysisJob, timeout: float) -> AnalysisJob:
+        """Long-poll: returns once the job finishes or `timeout` seconds pass."""
+        if timeout > 0 and not job.finished:
+            try:
+                await asyncio.wait_for(job._done.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return job
+
+    def _prune(self):
+        now = time.time()
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished and now - job.finished_at > self.retention_seconds
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+        # Hard cap: drop the oldest finished jobs first
+        if len(self._jobs) >= self.max_jobs:
+            finished = sorted((j for j in self._jobs.values() if j.finished), key=lambda j: j.finished_at)
+            for job in finished[:len(self._jobs) - self.max_jobs + 1]:
+                del self._jobs[job.id]
+
+    def stats(self) -> Dict[str, Any]:
+        counts: Dict[str, int] = {}
+        for job in self._jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {"retained": len(self._jobs), "by_status": counts}
+
+
+job_store = JobStore()
@@ -9,62 +9,878 @@ Supports:
 import os
 import re
 import json
+import time
+import random
+import asyncio
+import threading
+import logging
+from contextlib import aclosing
+from email.utils import parsedate_to_datetime
+from collections import deque
 from enum import Enum
-from typing import Optional, Dict, Any
+from functools import lru_cache
+from typing import Optional, Dict, Any, Tuple, List, AsyncIterator, Iterator, Callable, Type
 from dotenv import load_dotenv
+from pydantic import BaseModel
+
+from .cache import LRUCache, make_cache_key
+from .scheduler import scheduler, PRIORITY_BACKGROUND
+from .metrics import span, event
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 
 class LLMProvider(Enum):
     DEEPSEEK = "deepseek"
     GOOGLE = "google"
 
 
-def extract_json(text: str) -> Dict[str, Any]:
+class ProviderConfigError(ValueError):
+    """A provider cannot be used at all (e.g. its API key is missing)."""
+
+
+class ProviderUnavailable(RuntimeError):
+    """Raised without calling a provider whose circuit breaker is open."""
+
+    def __init__(self, provider: "LLMProvider", retry_after: float):
+        super().__init__(f"{provider.value} circuit open, retry in {retry_after:.0f}s")
+        self.provider = provider
+        self.retry_after = retry_after
+
+
+DEEPSEEK_MODEL = "deepseek-chat"
+DEEPSEEK_BASE_URL = "https://api.deepseek.com"
+GEMINI_MODEL = "gemini-flash-latest"  # Stable alias - always works
+
+# DeepSeek only accepts {"type": "json_object"}; "json_schema" is for OpenAI-compatible gateways that enforce schemas
+DEEPSEEK_STRUCTURED_OUTPUT = os.getenv("KYOKA_DEEPSEEK_STRUCTURED_OUTPUT", "json_object")
+
+# Keep-alive pool shared by every DeepSeek call in this process
+HTTP_MAX_CONNECTIONS = int(os.getenv("KYOKA_HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("KYOKA_HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("KYOKA_HTTP_KEEPALIVE_EXPIRY", "60"))
+
+# Safety settings - allow all content for profiling
+SAFETY_SETTINGS = [
+    {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
+    {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
+    {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_NONE"},
+    {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"},
+]
+
+
+# Opt-in response cache for deterministic (temperature 0) calls
+LLM_CACHE_ENABLED = os.getenv("KYOKA_LLM_CACHE", "0").lower() in ("1", "true", "yes")
+LLM_CACHE_ANY_TEMPERATURE = os.getenv("KYOKA_LLM_CACHE_ANY_TEMPERATURE", "0").lower() in ("1", "true", "yes")
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("KYOKA_LLM_CACHE_MAX_ENTRIES", "256"))
+LLM_CACHE_MAX_BYTES = int(os.getenv("KYOKA_LLM_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+
+# Hedged requests: if DeepSeek has not answered within the hedge delay, race Gemini
+LLM_HEDGE_ENABLED = os.getenv("KYOKA_LLM_HEDGE", "0").lower() in ("1", "true", "yes")
+LLM_HEDGE_DELAY = os.getenv("KYOKA_LLM_HEDGE_DELAY")  # seconds; unset = learned from latency percentile
+LLM_HEDGE_PERCENTILE = float(os.getenv("KYOKA_LLM_HEDGE_PERCENTILE", "0.95"))
+LLM_HEDGE_DEFAULT_DELAY = float(os.getenv("KYOKA_LLM_HEDGE_DEFAULT_DELAY", "20"))
+LLM_HEDGE_MIN_SAMPLES = 20
+
+# Retries (exponential backoff + jitter) and per-provider circuit breakers
+LLM_RETRY_ATTEMPTS = int(os.getenv("KYOKA_LLM_RETRY_ATTEMPTS", "3"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("KYOKA_LLM_RETRY_BASE_DELAY", "1"))
+LLM_RETRY_MAX_DELAY = float(os.getenv("KYOKA_LLM_RETRY_MAX_DELAY", "30"))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("KYOKA_BREAKER_FAILURES", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("KYOKA_BREAKER_RESET_SECONDS", "30"))
+
+# HTTP statuses worth retrying; any other 4xx is the request's fault and is fatal
+RETRYABLE_STATUS = {408, 409, 425, 429}
+
+
+def _google_api_key() -> Optional[str]:
+    return os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
+
+
+class ProviderRegistry:
     """
-    Robustly extract JSON from LLM response using brace counting.
-    Handles markdown code blocks, raw JSON, and text noise.
+    Process-wide registry of LLM SDK clients.
+
+    Clients are created once (lazily, or eagerly via warm_up() at app startup)
+    and reused by every request, so calls ride on the same keep-alive
+    connection pool instead of paying a new TLS handshake each time.
+    Gemini model objects are cached per (model, temperature, json_mode).
     """
-    # Try to find a JSON block starting with {
-    start_idx = text.find('{')
-    if start_idx == -1:
-        return {}
 
-    # Balanced brace counting
-    brace_count = 0
-    json_str = ""
-    for i in range(start_idx, len(text)):
-        char = text[i]
-        if char == '{':
-            brace_count += 1
-        elif char == '}':
-            brace_count -= 1
-        
-        json_str += char
-        
-        if brace_count == 0:
-            # Found the end of the JSON object
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._deepseek_client = None
+        self._async_deepseek_client = None
+        self._google_configured = False
+        self._google_models: Dict[Tuple[str, float, bool], Any] = {}
+        self._chat_models: Dict[Tuple[str, float], Any] = {}
+        self._counters = {
+            "clients_created": 0,
+            "model_cache_hits": 0,
+            "model_cache_misses": 0,
+            "deepseek_requests": 0,
+            "google_requests": 0,
+            "chat_requests": 0,
+        }
+
+    def record(self, key: str, amount: int = 1):
+        """Increments a usage counter (exposed via stats())."""
+        with self._lock:
+            self._counters[key] += amount
+
+    def deepseek_client(self):
+        """Returns the shared DeepSeek client (OpenAI SDK over a pooled httpx client)."""
+        if self._deepseek_client is not None:
+            return self._deepseek_client
+
+        api_key = os.getenv("DEEPSEEK_API_KEY")
+        if not api_key:
+            raise ProviderConfigError("DEEPSEEK_API_KEY not set in environment")
+
+        import httpx
+        from openai import OpenAI
+
+        with self._lock:
+            if self._deepseek_client is None:
+                self._deepseek_client = OpenAI(
+                    api_key=api_key,
+                    base_url=DEEPSEEK_BASE_URL,
+                    http_client=httpx.Client(
+                        limits=httpx.Limits(
+                            max_connections=HTTP_MAX_CONNECTIONS,
+                            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+                        )
+                    )
+                )
+                self._counters["clients_created"] += 1
+            return self._deepseek_client
+
+    def async_deepseek_client(self):
+        """Returns the shared AsyncOpenAI DeepSeek client used on the event loop."""
+        if self._async_deepseek_client is not None:
+            return self._async_deepseek_client
+
+        api_key = os.getenv("DEEPSEEK_API_KEY")
+        if not api_key:
+            raise ProviderConfigError("DEEPSEEK_API_KEY not set in environment")
+
+        import httpx
+        from openai import AsyncOpenAI
+
+        with self._lock:
+            if self._async_deepseek_client is None:
+                self._async_deepseek_client = AsyncOpenAI(
+                    api_key=api_key,
+                    base_url=DEEPSEEK_BASE_URL,
+                    http_client=httpx.AsyncClient(
+                        limits=httpx.Limits(
+                            max_connections=HTTP_MAX_CONNECTIONS,
+                            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+                        )
+                    )
+                )
+                self._counters["clients_created"] += 1
+            return self._async_deepseek_client
+
+    def _configure_google(self):
+        import google.generativeai as genai
+
+        if self._google_configured:
+            return genai
+
+        api_key = _google_api_key()
+        if not api_key:
+            raise ProviderConfigError("GOOGLE_API_KEY or GEMINI_API_KEY not set in environment")
+
+        with self._lock:
+            if not self._google_configured:
+                genai.configure(api_key=api_key)
+                self._google_configured = True
+                self._counters["clients_created"] += 1
+        return genai
+
+    def google_model(
+        self,
+        temperature: float = 0.0,
+        json_mode: bool = False,
+        model_name: str = GEMINI_MODEL,
+        schema: Optional[Type[BaseModel]] = None
+    ):
+        """
+        Returns a cached Gemini GenerativeModel for the given generation settings.
+        A `schema` turns on constrained decoding (response_schema).
+        """
+        key = (model_name, float(temperature), bool(json_mode or schema), schema)
+        model = self._google_models.get(key)
+        if model is not None:
+            self.record("model_cache_hits")
+            return model
+
+        genai = self._configure_google()
+
+        generation_config = {"temperature": temperature}
+        if json_mode or schema:
+            generation_config["response_mime_type"] = "application/json"
+        if schema:
+            generation_config["response_schema"] = schema
+
+        with self._lock:
+            model = self._google_models.get(key)
+            if model is None:
+                model = genai.GenerativeModel(
+                    model_name=model_name,
+                    safety_settings=SAFETY_SETTINGS,
+                    generation_config=generation_config
+                )
+                self._google_models[key] = model
+                self._counters["model_cache_misses"] += 1
+            else:
+                self._counters["model_cache_hits"] += 1
+        return model
+
+    def chat_model(self, temperature: float = 0.8, model_name: str = GEMINI_MODEL):
+        """Returns a cached LangChain Gemini chat model used by the /chat simulator."""
+        key = (model_name, float(temperature))
+        model = self._chat_models.get(key)
+        if model is not None:
+            self.record("model_cache_hits")
+            return model
+
+        api_key = _google_api_key()
+        if not api_key:
+            raise ProviderConfigError("GOOGLE_API_KEY or GEMINI_API_KEY not set in environment")
+
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
+        with self._lock:
+            model = self._chat_models.get(key)
+            if model is None:
+                model = ChatGoogleGenerativeAI(
+                    model=model_name,
+                    google_api_key=api_key,
+                    temperature=temperature
+                )
+                self._chat_models[key] = model
+                self._counters["clients_created"] += 1
+                self._counters["model_cache_misses"] += 1
+            else:
+                self._counters["model_cache_hits"] += 1
+        return model
+
+    def warm_up(self):
+        """
+        Eagerly creates every client whose API key is configured.
+        Called once from the FastAPI lifespan so the first request does not pay setup cost.
+        """
+        warmed = []
+        steps = [
+            ("deepseek", self.deepseek_client),
+            ("deepseek-async", self.async_deepseek_client),
+            ("google-json", lambda: self.google_model(temperature=0.0, json_mode=True)),
+            ("google", lambda: self.google_model(temperature=0.7)),
+            ("chat", lambda: self.chat_model(temperature=0.8)),
+        ]
+        for label, step in steps:
             try:
-                # Clean up potential markdown noise like ```json or whitespace
-                cleaned_json = json_str.strip()
-                return json.loads(cleaned_json)
-            except json.JSONDecodeError:
-                # If this specific block failed, keep searching for another candidate
-                pass
-    
-    # Final fallback attempt if brace counting logic was somehow skipped or failed partially
+                step()
+                warmed.append(label)
+            except Exception as e:
+                logger.warning(f"Warm-up skipped for {label}: {e}")
+        return warmed
+
+    def close(self):
+        """Closes pooled sync connections."""
+        with self._lock:
+            if self._deepseek_client is not None:
+                self._deepseek_client.close()
+                self._deepseek_client = None
+
+    async def aclose(self):
+        """Closes every pooled connection (FastAPI shutdown)."""
+        self.close()
+        client = self._async_deepseek_client
+        self._async_deepseek_client = None
+        if client is not None:
+            await client.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of client/model reuse counters and pool configuration."""
+        with self._lock:
+            stats = dict(self._counters)
+            stats["deepseek_client_ready"] = self._deepseek_client is not None
+            stats["async_deepseek_client_ready"] = self._async_deepseek_client is not None
+            stats["google_configured"] = self._google_configured
+            stats["cached_google_models"] = len(self._google_models)
+            stats["cached_chat_models"] = len(self._chat_models)
+        stats["http_pool"] = {
+            "max_connections": HTTP_MAX_CONNECTIONS,
+            "max_keepalive_connections": HTTP_MAX_KEEPALIVE,
+            "keepalive_expiry": HTTP_KEEPALIVE_EXPIRY,
+        }
+        return stats
+
+
+registry = ProviderRegistry()
+
+
+class ResponseCache:
+    """
+    LRU cache of LLM responses keyed by a hash of
+    (provider, model, system prompt, prompt, temperature, json_mode).
+
+    Disabled unless KYOKA_LLM_CACHE is set (or a call passes cache=True).
+    Only temperature-0 calls are cached unless any_temperature is enabled,
+    since sampled outputs are not meant to repeat. Fallback answers and
+    responses that fail the caller's validator are never stored.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = LLM_CACHE_ENABLED,
+        any_temperature: bool = LLM_CACHE_ANY_TEMPERATURE,
+        max_entries: int = LLM_CACHE_MAX_ENTRIES,
+        max_bytes: int = LLM_CACHE_MAX_BYTES
+    ):
+        self.enabled = enabled
+        self.any_temperature = any_temperature
+        self._cache = LRUCache(
+            max_entries=max_entries,
+            max_bytes=max_bytes,
+            sizeof=lambda text: len(text.encode("utf-8"))
+        )
+        self._lock = threading.Lock()
+        self.bytes_saved = 0
+
+    def applies(self, temperature: float, cache: Optional[bool] = None) -> bool:
+        """Whether a call with these settings should read/write the cache."""
+        if cache is False or not (self.enabled or cache is True):
+            return False
+        return temperature == 0 or self.any_temperature
+
+    @staticmethod
+    def key(
+        provider: LLMProvider,
+        prompt: str,
+        system_prompt: Optional[str],
+        temperature: float,
+        json_mode: bool,
+        schema: Optional[Type[BaseModel]] = None
+    ) -> str:
+        model = DEEPSEEK_MODEL if provider == LLMProvider.DEEPSEEK else GEMINI_MODEL
+        schema_key = json_schema(schema) if schema else None
+        return make_cache_key(provider.value, model, system_prompt, prompt, temperature, json_mode, schema_key)
+
+    def get(self, key: str) -> Optional[str]:
+        text = self._cache.get(key)
+        if text is not None:
+            with self._lock:
+                self.bytes_saved += len(text.encode("utf-8"))
+        return text
+
+    def set(self, key: str, text: str):
+        if text:
+            self._cache.set(key, text)
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self._cache.stats()
+        stats["enabled"] = self.enabled
+        stats["any_temperature"] = self.any_temperature
+        stats["bytes_saved"] = self.bytes_saved
+        return stats
+
+
+response_cache = ResponseCache()
+
+
+class LatencyTracker:
+    """Rolling window of observed call latencies per series (e.g. "deepseek", "deepseek:ttft")."""
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._samples: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, series: str, seconds: float):
+        with self._lock:
+            self._samples.setdefault(series, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, series: str, q: float, min_samples: int = 1) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples.get(series, ()))
+        if len(samples) < max(1, min_samples):
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            series: {
+                "samples": len(self._samples[series]),
+                "p50": self.percentile(series, 0.5),
+                "p95": self.percentile(series, 0.95),
+            }
+            for series in list(self._samples)
+        }
+
+
+class HedgePolicy:
+    """
+    Decides when a DeepSeek call gets hedged with a parallel Gemini call.
+
+    The hedge delay is KYOKA_LLM_HEDGE_DELAY when set; otherwise the learned
+    percentile (default p95) of recent primary latencies, falling back to
+    KYOKA_LLM_HEDGE_DEFAULT_DELAY until enough samples exist.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = LLM_HEDGE_ENABLED,
+        fixed_delay: Optional[float] = float(LLM_HEDGE_DELAY) if LLM_HEDGE_DELAY else None,
+        percentile: float = LLM_HEDGE_PERCENTILE,
+        default_delay: float = LLM_HEDGE_DEFAULT_DELAY
+    ):
+        self.enabled = enabled
+        self.fixed_delay = fixed_delay
+        self.percentile = percentile
+        self.default_delay = default_delay
+        self._lock = threading.Lock()
+        self._counters = {
+            "calls": 0,
+            "hedges_fired": 0,
+            "hedge_wins": 0,
+            "primary_wins_after_hedge": 0,
+            "fallbacks": 0,
+            "failures": 0,
+        }
+
+    def applies(self, provider: LLMProvider, fallback: bool, hedge: Optional[bool] = None) -> bool:
+        if hedge is False or not (self.enabled or hedge is True):
+            return False
+        return fallback and provider == LLMProvider.DEEPSEEK
+
+    def delay(self, series: str) -> float:
+        if self.fixed_delay is not None:
+            return self.fixed_delay
+        learned = latency_tracker.percentile(series, self.percentile, LLM_HEDGE_MIN_SAMPLES)
+        return learned if learned is not None else self.default_delay
+
+    def record(self, key: str):
+        with self._lock:
+            self._counters[key] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._counters)
+        stats["enabled"] = self.enabled
+        stats["hedge_rate"] = round(stats["hedges_fired"] / stats["calls"], 4) if stats["calls"] else 0.0
+        stats["current_delay"] = {
+            "call": self.delay(LLMProvider.DEEPSEEK.value),
+            "stream_first_token": self.delay(f"{LLMProvider.DEEPSEEK.value}:ttft"),
+        }
+        stats["latency"] = latency_tracker.stats()
+        return stats
+
+
+latency_tracker = LatencyTracker()
+hedge_policy = HedgePolicy()
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    # OpenAI SDK: .status_code; google.api_core: .code; httpx: .response.status_code
+    for value in (
+        getattr(error, "status_code", None),
+        getattr(error, "code", None),
+        getattr(getattr(error, "response", None), "status_code", None),
+    ):
+        if isinstance(value, int):
+            return int(value)
+    return None
+
+
+def _retry_after(error: BaseException) -> Optional[float]:
+    """Seconds the server asked us to wait (Retry-After / retry-after-ms), if any."""
+    if isinstance(error, ProviderUnavailable):
+        return error.retry_after
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
     try:
-        # Try finding markdown block as secondary
-        json_match = re.search(r'```(?:json)?\s*(\{.*?\})\s*```', text, re.DOTALL)
-        if json_match:
-            return json.loads(json_match.group(1))
-    except:
-        pass
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
 
-    if text.strip():
-        print(f"DEBUG: extract_json failed to find JSON in text (len: {len(text)})")
-    return {}
+
+def classify_error(error: BaseException) -> Tuple[bool, Optional[float]]:
+    """
+    Returns (retryable, retry_after) for an exception raised by a provider call.
+    Timeouts, connection errors, 429 and 5xx are retryable; other 4xx and
+    configuration errors are fatal.
+    """
+    if isinstance(error, ProviderConfigError):
+        return False, None
+    status = _status_code(error)
+    if status is not None and 400 <= status < 500 and status not in RETRYABLE_STATUS:
+        return False, None
+    return True, _retry_after(error)
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with jitter, shared by every agent retry loop
+    (usually through tiers(), which adds a one-shot fallback provider):
+
+        for attempt in range(retry_policy.attempts):
+            try: ...; break
+            except Exception as e:
+                delay = retry_policy.next_delay(attempt, e)
+                if delay is None: raise
+                await asyncio.sleep(delay)
+    """
+
+    def __init__(
+        self,
+        attempts: int = LLM_RETRY_ATTEMPTS,
+        base_delay: float = LLM_RETRY_BASE_DELAY,
+        max_delay: float = LLM_RETRY_MAX_DELAY
+    ):
+        self.attempts = max(1, attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self._counters = {"retries": 0, "fatal": 0, "exhausted": 0}
+
+    def next_delay(self, attempt: int, error: BaseException) -> Optional[float]:
+        """
+        Seconds to wait before retrying after the 0-based `attempt` failed with
+        `error`, or None if the caller should give up and re-raise.
+        """
+        retryable, retry_after = classify_error(error)
+        if not retryable or (retry_after is not None and retry_after > self.max_delay):
+            self._record("fatal")
+            return None
+        if attempt >= self.attempts - 1:
+            self._record("exhausted")
+            return None
+
+        self._record("retries")
+        event("llm.retry", error=type(error).__name__)
+        if retry_after is not None:
+            return retry_after
+        # "Equal jitter": at least half the backoff, so retries never stampede back immediately
+        backoff = min(self.max_delay, self.base_delay * 2 ** attempt)
+        return backoff / 2 + random.uniform(0, backoff / 2)
+
+    def tiers(
+        self,
+        provider: LLMProvider,
+        fallback: Optional[LLMProvider] = None,
+        hedge: Optional[bool] = None
+    ) -> "RetryTiers":
+        """Retry schedule for one call: `provider` under this policy, then `fallback` once."""
+        hedged = fallback == LLMProvider.GOOGLE and hedge_policy.applies(provider, True, hedge)
+        return RetryTiers(self, provider, fallback, hedged)
+
+    def _record(self, key: str):
+        with self._lock:
+            self._counters[key] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._counters)
+        stats.update(attempts=self.attempts, base_delay=self.base_delay, max_delay=self.max_delay)
+        return stats
+
+
+class RetryTiers:
+    """
+    Tiered retry schedule: the primary provider is retried with backoff, then
+    the fallback provider gets a single attempt, so an outage costs at most
+    attempts + 1 calls. With hedging, the first attempt races both providers
+    and already counts as the fallback attempt. Iteration yields
+    (provider, fallback) for each call; the fallback flag is only set for
+    the hedged race. Sync and async callers share it:
+
+        tiers = retry_policy.tiers(primary, fallback)
+        for provider, race in tiers:
+            try:
+                text = get_llm_response(prompt, provider=provider, fallback=race)
+                break
+            except Exception as e:
+                delay = tiers.failed(e)  # re-raises once every tier is spent
+                time.sleep(delay)
+    """
+
+    def __init__(
+        self,
+        policy: RetryPolicy,
+        provider: LLMProvider,
+        fallback: Optional[LLMProvider] = None,
+        hedged: bool = False
+    ):
+        self.policy = policy
+        self.provider = provider
+        self.fallback = fallback
+        self.hedged = hedged
+        self.calls = 0
+        self._attempt = 0
+        self._fallback_pending = fallback is not None
+        self._next: Optional[Tuple[LLMProvider, bool]] = (provider, hedged)
+        self._current: Optional[Tuple[LLMProvider, bool]] = None
+
+    def __iter__(self) -> Iterator[Tuple[LLMProvider, bool]]:
+        while self._next is not None:
+            self._current, self._next = self._next, None
+            self.calls += 1
+            yield self._current
+
+    def failed(self, error: BaseException) -> float:
+        """
+        Schedules the next call after the current one failed with `error` and
+        returns the seconds to wait first; re-raises `error` when none is left.
+        """
+        provider, race = self._current
+        if provider == self.provider:
+            if race:
+                # The hedged race has already tried the fallback
+                self._fallback_pending = False
+            # A provider behind an open breaker is skipped rather than waited for
+            skip = self._fallback_pending and isinstance(error, ProviderUnavailable)
+            delay = None if skip else self.policy.next_delay(self._attempt, error)
+            self._attempt += 1
+            if delay is not None:
+                self._next = (self.provider, False)
+                return delay
+            if self._fallback_pending:
+                self._fallback_pending = False
+                logger.info(f"{provider.value} failed ({error}), falling back to {self.fallback.value}...")
+                event("llm.fallback", failed=provider.value)
+                self._next = (self.fallback, False)
+                return 0.0
+        raise error
+
+
+class CircuitBreaker:
+    """
+    Per-provider circuit breaker. After `failure_threshold` consecutive
+    failures the provider is skipped (ProviderUnavailable) for
+    `reset_timeout` seconds; then a single probe call decides whether it
+    closes again or stays open.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        provider: LLMProvider,
+        failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+        reset_timeout: float = BREAKER_RESET_SECONDS
+    ):
+        self.provider = provider
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self._counters = {"opened": 0, "rejected": 0}
+
+    def retry_after(self) -> float:
+        return max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+
+    def check(self):
+        """Raises ProviderUnavailable unless a call may go through right now."""
+        with self._lock:
+            if self.state == self.OPEN and self.retry_after() == 0:
+                self.state = self.HALF_OPEN
+            if self.state == self.CLOSED:
+                return
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+            self._counters["rejected"] += 1
+            retry_after = self.retry_after() or self.reset_timeout
+        event("llm.breaker_rejected", provider=self.provider.value)
+        raise ProviderUnavailable(self.provider, retry_after)
+
+    def record(self, error: Optional[BaseException] = None):
+        """Settles a call admitted by check(). Only provider-side failures count."""
+        with self._lock:
+            self._probing = False
+            if error is not None and not isinstance(error, Exception):
+                return  # Cancelled (e.g. lost a hedge race): no verdict on the provider
+            if error is None or not (isinstance(error, ProviderConfigError) or classify_error(error)[0]):
+                self.state = self.CLOSED
+                self._failures = 0
+                return
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self._counters["opened"] += 1
+                    logger.warning(f"{self.provider.value} circuit opened for {self.reset_timeout:.0f}s")
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self._failures,
+                "retry_after": round(self.retry_after(), 1) if self.state != self.CLOSED else 0.0,
+                **self._counters,
+            }
+
+
+retry_policy = RetryPolicy()
+breakers = {provider: CircuitBreaker(provider) for provider in LLMProvider}
+
+
+def resilience_stats() -> Dict[str, Any]:
+    return {
+        "retry": retry_policy.stats(),
+        "breakers": {provider.value: breaker.stats() for provider, breaker in breakers.items()},
+    }
+
+
+# Precompiled once: these run on every (possibly multi-hundred-KB) LLM response
+_JSON_STRUCTURE = re.compile(r'[{}"]')
+_JSON_STRING_TAIL = re.compile(r'(?:[^"\\]|\\.)*"', re.DOTALL)
+_JSON_OBJECT_START = re.compile(r'\{\s*"')
+_MARKDOWN_FENCE = re.compile(r'```(?:json)?')
+_REASONING_PATTERNS = [
+    re.compile(r"(?i)###\s*Reasoning(.*?)(?={|\n###)", re.DOTALL),
+    re.compile(r"(?i)###\s*Thought Process(.*?)(?={|\n###)", re.DOTALL),
+    re.compile(r"(?i)\*\*Reasoning\*\*(.*?)(?={)", re.DOTALL),
+    re.compile(r"(?i)\*\*Thought Process\*\*(.*?)(?={)", re.DOTALL),
+]
+_JSON_DECODER = json.JSONDecoder()
+
+THINK_OPEN = "<think>"
+THINK_CLOSE = "</think>"
+
+
+def _decode_object(text: str, start: int) -> Optional[Dict[str, Any]]:
+    try:
+        value, _ = _JSON_DECODER.raw_decode(text, start)
+    except json.JSONDecodeError:
+        return None
+    return value if isinstance(value, dict) else None
+
+
+def find_json_object(text: str, start: int = 0) -> Tuple[Optional[Dict[str, Any]], int]:
+    """
+    Returns (first valid JSON object in text[start:], its start index) or (None, -1).
+
+    The first brace is tried directly with the C decoder (raw_decode). Otherwise
+    a single forward scan with a string-aware brace matcher jumps between
+    structural characters via a precompiled regex (braces inside JSON strings
+    are ignored) and hands each balanced candidate to raw_decode. Failed
+    candidates are skipped past, never rescanned, so cost is linear.
+    """
+    first = text.find('{', start)
+    if first == -1:
+        return None, -1
+
+    # Fast path (JSON mode): the first brace already starts a valid object
+    obj = _decode_object(text, first)
+    if obj is not None:
+        return obj, first
+
+    candidate = first
+    depth = 0
+    pos = first
+    n = len(text)
+    while pos < n:
+        match = _JSON_STRUCTURE.search(text, pos)
+        if match is None:
+            break
+        char = match.group()
+        pos = match.end()
+        if char == '"':
+            if depth == 0:
+                continue
+            tail = _JSON_STRING_TAIL.match(text, pos)
+            if tail is None:
+                break  # Unterminated string: no balanced object from here
+            pos = tail.end()
+        elif char == '{':
+            if depth == 0:
+                candidate = match.start()
+            depth += 1
+        elif depth > 0:
+            depth -= 1
+            if depth == 0:
+                obj = _decode_object(text, candidate)
+                if obj is not None:
+                    return obj, candidate
+
+    # Fallback for prose with stray quotes/braces before the JSON: only try
+    # positions that look like an object start ('{' followed by a key)
+    for match in _JSON_OBJECT_START.finditer(text, first):
+        obj = _decode_object(text, match.start())
+        if obj is not None:
+            return obj, match.start()
+    return None, -1
+
+
+def parse_llm_response(text: str) -> Tuple[str, Dict[str, Any]]:
+    """
+    Unified parser: extracts (think_block, first_json_object) from an LLM response
+    in one pass. The JSON scan starts after a <think> block when one is present.
+    Returns ("", {}) parts when nothing is found.
+    """
+    if not text:
+        return "", {}
+
+    thought = ""
+    json_start = 0
+    think_start = text.find(THINK_OPEN)
+    if think_start != -1:
+        think_end = text.find(THINK_CLOSE, think_start)
+        if think_end == -1:
+            return text[think_start + len(THINK_OPEN):].strip(), {}
+        thought = text[think_start + len(THINK_OPEN):think_end].strip()
+        json_start = think_end + len(THINK_CLOSE)
+
+    data, _ = find_json_object(text, json_start)
+    if data is None and json_start:
+        # JSON placed before the think block
+        data, _ = find_json_object(text[:think_start])
+    if data is None:
+        if text.strip():
+            logger.debug(f"parse_llm_response failed to find JSON in text (len: {len(text)})")
+        data = {}
+    return thought, data
+
+
+def extract_json(text: str) -> Dict[str, Any]:
+    """
+    Robustly extract JSON from LLM response.
+    Handles markdown code blocks, raw JSON, and text noise.
+    """
+    data, _ = find_json_object(text)
+    if data is None:
+        if text.strip():
+            logger.debug(f"extract_json failed to find JSON in text (len: {len(text)})")
+        return {}
+    return data
 
 
 def extract_think_block(text: str) -> tuple[str, str]:
@@ -73,115 +889,215 @@ def extract_think_block(text: str) -> tuple[str, str]:
     Returns (thought_process, remaining_text)
     """
     # Pattern 1: Explicit <think> tags
-    think_start = text.find('<think>')
-    think_end = text.find('</think>')
-    
-    if think_start != -1 and think_end != -1:
-        thought = text[think_start + 7:think_end].strip()
-        remaining = text[:think_start] + text[think_end + 8:]
+    think_start = text.find(THINK_OPEN)
+    if think_start != -1:
+        think_end = text.find(THINK_CLOSE, think_start)
+        if think_end == -1:
+            return text[think_start + len(THINK_OPEN):].strip(), ""
+        thought = text[think_start + len(THINK_OPEN):think_end].strip()
+        remaining = text[:think_start] + text[think_end + len(THINK_CLOSE):]
         return thought, remaining
-    elif think_start != -1:
-        thought = text[think_start + 7:].strip()
-        return thought, ""
-
-    # Pattern 2: Typical headers or bold labels
-    patterns = [
-        r"(?i)###\s*Reasoning(.*?)(?={|\n###)",
-        r"(?i)###\s*Thought Process(.*?)(?={|\n###)",
-        r"(?i)\*\*Reasoning\*\*(.*?)(?={)",
-        r"(?i)\*\*Thought Process\*\*(.*?)(?={)"
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, text, re.DOTALL)
-        if match:
-            thought = match.group(1).strip()
-            # We don't necessarily remove it from text to avoid breaking JSON extraction later
-            return thought, text
 
-    # Pattern 3: If there's text before the first '{', treat it as thought
+    # Pattern 2: Typical headers or bold labels (all require a following '{')
     first_brace = text.find('{')
+    if first_brace != -1:
+        head = text[:first_brace + 1]
+        for pattern in _REASONING_PATTERNS:
+            match = pattern.search(head)
+            if match:
+                # We don't remove it from text to avoid breaking JSON extraction later
+                return match.group(1).strip(), text
+    else:
+        for pattern in _REASONING_PATTERNS[:2]:
+            match = pattern.search(text)
+            if match:
+                return match.group(1).strip(), text
+
+    # Pattern 3: If there's text before the first '{', treat it as thought
     if first_brace > 50: # Only if there's significant text before JSON
-        thought = text[:first_brace].strip()
-        # Clean up common markdown noise
-        thought = re.sub(r'```(?:json)?', '', thought).strip()
+        thought = _MARKDOWN_FENCE.sub('', text[:first_brace]).strip()
         return thought, text[first_brace:]
     
     return "", text
 
 
-def get_deepseek_response(
-    prompt: str,
-    system_prompt: Optional[str] = None,
-    temperature: float = 0.0
-) -> str:
-    """Get response from DeepSeek-V3 via OpenAI SDK."""
-    from openai import OpenAI
-    
-    api_key = os.getenv("DEEPSEEK_API_KEY")
-    if not api_key:
-        raise ValueError("DEEPSEEK_API_KEY not set in environment")
-    
-    client = OpenAI(
-        api_key=api_key,
-        base_url="https://api.deepseek.com"
-    )
-    
+class IncrementalJSONParser:
+    """
+    Incremental parser for a top-level JSON object that arrives in chunks.
+
+    feed() each streamed chunk; it returns the (key, value) pairs of every
+    top-level field whose value has just become complete, so callers can
+    surface profile fields long before the whole object has been generated.
+    Text before the object (markdown fences, preambles, a <think> block) is
+    skipped, and a '{' only starts the object when its first token is a
+    quoted key, so braces in prose such as "{scope}" are passed over.
+
+    Each chunk is scanned once: only the key or value being read is kept
+    (as a list of pieces, joined when it completes), so a long stream costs
+    linear time rather than re-copying everything received so far.
+    """
+
+    def __init__(self):
+        # Undecided text before the object: a split <think> tag or a '{' awaiting its first token
+        self._pending = ""
+        # Pieces of the top-level key or value currently being read
+        self._capture: Optional[List[str]] = None
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._in_think = False
+        self._in_value = False
+        self._key = None
+        self.done = False
+        self.fields: Dict[str, Any] = {}
+
+    def _captured(self, text: str, start: int, end: int) -> str:
+        """Ends the capture, returning everything read since it began up to text[end]."""
+        pieces, self._capture = self._capture, None
+        pieces.append(text[start:end])
+        return "".join(pieces)
+
+    def _emit(self, raw: str, out: List[Tuple[str, Any]]):
+        key = self._key
+        self._key = None
+        self._in_value = False
+        raw = raw.strip()
+        if key is None or not raw:
+            return
+        try:
+            value = json.loads(raw)
+        except json.JSONDecodeError:
+            return
+        self.fields[key] = value
+        out.append((key, value))
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        out: List[Tuple[str, Any]] = []
+        if self.done or not chunk:
+            return out
+        text = self._pending + chunk if self._pending else chunk
+        self._pending = ""
+
+        # Where the active capture resumes in this chunk
+        start = 0
+        i = 0
+        n = len(text)
+        while i < n:
+            char = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        raw = self._captured(text, start, i + 1)
+                        if self._in_value:
+                            # A string value is complete as soon as its quote closes
+                            self._emit(raw, out)
+                        else:
+                            try:
+                                self._key = json.loads(raw)
+                            except json.JSONDecodeError:
+                                self._key = None
+            elif self._depth == 0:
+                if self._in_think:
+                    think_end = text.find(THINK_CLOSE, i)
+                    if think_end == -1:
+                        # Keep just enough to match a closing tag split across chunks
+                        self._pending = text[max(i, n - len(THINK_CLOSE) + 1):]
+                        break
+                    self._in_think = False
+                    i = think_end + len(THINK_CLOSE)
+                    continue
+                if char == '<' and THINK_OPEN.startswith(text[i:i + len(THINK_OPEN)]):
+                    if n - i < len(THINK_OPEN):
+                        self._pending = text[i:]  # could be a <think> tag split across chunks
+                        break
+                    self._in_think = True
+                    i += len(THINK_OPEN)
+                    continue
+                if char == '{':
+                    j = i + 1
+                    while j < n and text[j].isspace():
+                        j += 1
+                    if j == n:
+                        self._pending = text[i:]  # wait for the token after the brace
+                        break
+                    if text[j] in '"}':
+                        self._depth = 1
+            elif char == '"':
+                self._in_string = True
+                if self._depth == 1 and not self._in_value:
+                    self._capture, start = [], i
+            elif char in '{[':
+                self._depth += 1
+            elif char in '}]':
+                self._depth -= 1
+                if self._depth == 1 and self._in_value:
+                    # A nested object/array value just closed
+                    self._emit(self._captured(text, start, i + 1), out)
+                elif self._depth == 0:
+                    if self._in_value:
+                        self._emit(self._captured(text, start, i), out)
+                    self.done = True
+                    break
+            elif self._depth == 1:
+                if char == ':':
+                    self._in_value = True
+                    self._capture, start = [], i + 1
+                elif char == ',' and self._in_value:
+                    # Scalar values (numbers, booleans, null) end at the next comma
+                    self._emit(self._captured(text, start, i), out)
+            i += 1
+
+        if self._capture is not None:
+            self._capture.append(text[start:])
+        return out
+
+
+@lru_cache(maxsize=None)
+def json_schema(schema: Type[BaseModel]) -> str:
+    """Compact JSON Schema text for a Pydantic model (computed once per model)."""
+    return json.dumps(schema.model_json_schema(), separators=(",", ":"))
+
+
+def _deepseek_format(schema: Optional[Type[BaseModel]]) -> Dict[str, Any]:
+    """response_format kwargs for a DeepSeek (OpenAI-style) structured call."""
+    if not schema:
+        return {}
+    if DEEPSEEK_STRUCTURED_OUTPUT == "json_schema":
+        return {"response_format": {
+            "type": "json_schema",
+            "json_schema": {"name": schema.__name__, "schema": schema.model_json_schema()},
+        }}
+    return {"response_format": {"type": "json_object"}}
+
+
+def _build_messages(prompt: str, system_prompt: Optional[str], schema: Optional[Type[BaseModel]] = None) -> list:
     messages = []
     if system_prompt:
         messages.append({"role": "system", "content": system_prompt})
+    if schema:
+        # json_object mode only guarantees valid JSON, so spell out the exact shape
+        messages.append({
+            "role": "system",
+            "content": f"Respond with one JSON object that validates against this JSON Schema:\n{json_schema(schema)}"
+        })
     messages.append({"role": "user", "content": prompt})
-    
-    response = client.chat.completions.create(
-        model="deepseek-chat",
-        messages=messages,
-        temperature=temperature,
-        max_tokens=8192
-    )
-    
-    return response.choices[0].message.content
+    return messages
 
 
-def get_google_response(
-    prompt: str,
-    system_prompt: Optional[str] = None,
-    temperature: float = 0.0,
-    json_mode: bool = False
-) -> str:
-    """Get response from Google Gemini 1.5 Flash."""
-    import google.generativeai as genai
-    
-    api_key = os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
-    if not api_key:
-        raise ValueError("GOOGLE_API_KEY or GEMINI_API_KEY not set in environment")
-    
-    genai.configure(api_key=api_key)
-    
-    # Safety settings - allow all content for profiling
-    safety_settings = [
-        {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
-        {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
-        {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_NONE"},
-        {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"},
-    ]
-    
-    generation_config = {"temperature": temperature}
-    if json_mode:
-        generation_config["response_mime_type"] = "application/json"
-
-    model = genai.GenerativeModel(
-        model_name="gemini-flash-latest",  # Stable alias - always works
-        safety_settings=safety_settings,
-        generation_config=generation_config
-    )
-    
-    full_prompt = prompt
+def _build_gemini_prompt(prompt: str, system_prompt: Optional[str]) -> str:
     if system_prompt:
-        full_prompt = f"{system_prompt}\n\n{prompt}"
-    
+        return f"{system_prompt}\n\n{prompt}"
+    return prompt
+
+
+def _gemini_text(response) -> str:
+    """Extracts the text of a Gemini response, raising on blocked or empty generations."""
     try:
-        response = model.generate_content(full_prompt)
-        
         # Robustly handle the response object
         if not response.candidates:
             raise ValueError("Gemini returned no candidates.")
@@ -200,7 +1116,7 @@ def get_google_response(
         return candidate.content.parts[0].text
         
     except Exception as e:
-        print(f"DEBUG: Gemini SDK Error: {str(e)}")
+        logger.debug(f"Gemini SDK Error: {str(e)}")
         # If the error is about response.text but we have candidates, try to extract manually
         try:
             if hasattr(response, 'candidates') and response.candidates:
@@ -212,13 +1128,423 @@ def get_google_response(
         raise e
 
 
+def get_deepseek_response(
+    prompt: str,
+    system_prompt: Optional[str] = None,
+    temperature: float = 0.0,
+    schema: Optional[Type[BaseModel]] = None
+) -> str:
+    """Get response from DeepSeek-V3 via OpenAI SDK."""
+    client = registry.deepseek_client()
+    registry.record("deepseek_requests")
+    
+    response = client.chat.completions.create(
+        model=DEEPSEEK_MODEL,
+        messages=_build_messages(prompt, system_prompt, schema),
+        temperature=temperature,
+        max_tokens=8192,
+        **_deepseek_format(schema)
+    )
+    
+    return response.choices[0].message.content
+
+
+async def get_deepseek_response_async(
+    prompt: str,
+    system_prompt: Optional[str] = None,
+    temperature: float = 0.0,
+    schema: Optional[Type[BaseModel]] = None
+) -> str:
+    """Async variant of get_deepseek_response (AsyncOpenAI, no worker thread)."""
+    client = registry.async_deepseek_client()
+    registry.record("deepseek_requests")
+
+    response = await client.chat.completions.create(
+        model=DEEPSEEK_MODEL,
+        messages=_build_messages(prompt, system_prompt, schema),
+        temperature=temperature,
+        max_tokens=8192,
+        **_deepseek_format(schema)
+    )
+
+    return response.choices[0].message.content
+
+
+def get_google_response(
+    prompt: str,
+    system_prompt: Optional[str] = None,
+    temperature: float = 0.0,
+    json_mode: bool = False,
+    schema: Optional[Type[BaseModel]] = None
+) -> str:
+    """Get response from Google Gemini 1.5 Flash."""
+    model = registry.google_model(temperature=temperature, json_mode=json_mode, schema=schema)
+    registry.record("google_requests")
+    
+    response = model.generate_content(_build_gemini_prompt(prompt, system_prompt))
+    return _gemini_text(response)
+
+
+async def get_google_response_async(
+    prompt: str,
+    system_prompt: Optional[str] = None,
+    temperature: float = 0.0,
+    json_mode: bool = False,
+    schema: Optional[Type[BaseModel]] = None
+) -> str:
+    """Async variant of get_google_response (native async Gemini generation)."""
+    model = registry.google_model(temperature=temperature, json_mode=json_mode, schema=schema)
+    registry.record("google_requests")
+
+    response = await model.generate_content_async(_build_gemini_prompt(prompt, system_prompt))
+    return _gemini_text(response)
+
+
+def _gemini_chunk_text(chunk) -> str:
+    """Text of one streamed Gemini chunk ('' for empty or metadata-only chunks)."""
+    try:
+        if not chunk.candidates:
+            return ""
+        parts = chunk.candidates[0].content.parts
+        return "".join(part.text for part in parts if getattr(part, "text", None))
+    except Exception:
+        return ""
+
+
+async def stream_deepseek_response(
+    prompt: str,
+    system_prompt: Optional[str] = None,
+    temperature: float = 0.0,
+    schema: Optional[Type[BaseModel]] = None
+) -> AsyncIterator[str]:
+    """Streams DeepSeek-V3 output as text deltas."""
+    client = registry.async_deepseek_client()
+    registry.record("deepseek_requests")
+
+    stream = await client.chat.completions.create(
+        model=DEEPSEEK_MODEL,
+        messages=_build_messages(prompt, system_prompt, schema),
+        temperature=temperature,
+        max_tokens=8192,
+        stream=True,
+        **_deepseek_format(schema)
+    )
+    async for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+async def stream_google_response(
+    prompt: str,
+    system_prompt: Optional[str] = None,
+    temperature: float = 0.0,
+    json_mode: bool = False,
+    schema: Optional[Type[BaseModel]] = None
+) -> AsyncIterator[str]:
+    """Streams Gemini output as text deltas."""
+    model = registry.google_model(temperature=temperature, json_mode=json_mode, schema=schema)
+    registry.record("google_requests")
+
+    response = await model.generate_content_async(
+        _build_gemini_prompt(prompt, system_prompt),
+        stream=True
+    )
+    async for chunk in response:
+        text = _gemini_chunk_text(chunk)
+        if text:
+            yield text
+
+
+async def _call_provider_async(
+    provider: LLMProvider,
+    prompt: str,
+    system_prompt: Optional[str],
+    temperature: float,
+    json_mode: bool,
+    priority: int = PRIORITY_BACKGROUND,
+    schema: Optional[Type[BaseModel]] = None
+) -> str:
+    """
+    Single async provider call behind its circuit breaker and scheduler slot,
+    recording latency (excluding queueing) for hedge tuning.
+    """
+    breaker = breakers[provider]
+    breaker.check()
+    try:
+        async with scheduler.slot_async(provider.value, priority):
+            start = time.perf_counter()
+            with span(f"llm.{provider.value}", mode="call"):
+                if provider == LLMProvider.DEEPSEEK:
+                    text = await get_deepseek_response_async(prompt, system_prompt, temperature, schema)
+                else:
+                    text = await get_google_response_async(prompt, system_prompt, temperature, json_mode, schema)
+    except BaseException as e:
+        breaker.record(e)
+        raise
+    breaker.record()
+    latency_tracker.observe(provider.value, time.perf_counter() - start)
+    return text
+
+
+def _call_provider(
+    provider: LLMProvider,
+    prompt: str,
+    system_prompt: Optional[str],
+    temperature: float,
+    json_mode: bool,
+    priority: int = PRIORITY_BACKGROUND,
+    schema: Optional[Type[BaseModel]] = None
+) -> str:
+    """Sync counterpart of _call_provider_async."""
+    breaker = breakers[provider]
+    breaker.check()
+    try:
+        with scheduler.slot(provider.value, priority):
+            start = time.perf_counter()
+            with span(f"llm.{provider.value}", mode="call"):
+                if provider == LLMProvider.DEEPSEEK:
+                    text = get_deepseek_response(prompt, system_prompt, temperature, schema)
+                else:
+                    text = get_google_response(prompt, system_prompt, temperature, json_mode, schema)
+    except BaseException as e:
+        breaker.record(e)
+        raise
+    breaker.record()
+    latency_tracker.observe(provider.value, time.perf_counter() - start)
+    return text
+
+
+async def _open_stream(
+    provider: LLMProvider,
+    prompt: str,
+    system_prompt: Optional[str],
+    temperature: float,
+    json_mode: bool,
+    priority: int = PRIORITY_BACKGROUND,
+    schema: Optional[Type[BaseModel]] = None
+) -> AsyncIterator[str]:
+    """Provider stream behind its circuit breaker; holds a scheduler slot until it ends."""
+    breaker = breakers[provider]
+    breaker.check()
+    if provider == LLMProvider.DEEPSEEK:
+        stream = stream_deepseek_response(prompt, system_prompt, temperature, schema)
+    else:
+        stream = stream_google_response(prompt, system_prompt, temperature, json_mode, schema)
+    try:
+        # aclosing: the provider's HTTP stream is closed now, not at garbage collection
+        async with scheduler.slot_async(provider.value, priority), aclosing(stream):
+            with span(f"llm.{provider.value}", mode="stream") as attrs:
+                attrs["deltas"] = 0
+                async for delta in stream:
+                    attrs["deltas"] += 1
+                    yield delta
+    except BaseException as e:
+        breaker.record(e)
+        raise
+    breaker.record()
+
+
+async def _hedged_response_async(
+    prompt: str,
+    system_prompt: Optional[str],
+    temperature: float,
+    json_mode: bool,
+    validate: Optional[Callable[[str], bool]] = None,
+    priority: int = PRIORITY_BACKGROUND,
+    schema: Optional[Type[BaseModel]] = None
+) -> Tuple[LLMProvider, str]:
+    """
+    DeepSeek first; if it has not returned within the hedge delay, Gemini is
+    launched in parallel. The first response that passes `validate` wins and
+    the other call is cancelled. A fast DeepSeek failure falls back immediately.
+    Returns the provider that answered along with its text.
+    """
+    primary, secondary = LLMProvider.DEEPSEEK, LLMProvider.GOOGLE
+    hedge_policy.record("calls")
+    delay = hedge_policy.delay(primary.value)
+    tasks: Dict[asyncio.Task, LLMProvider] = {}
+    secondary_started = False
+    hedge_fired = False
+    last_error: Optional[Exception] = None
+
+    def launch(provider: LLMProvider):
+        task = asyncio.create_task(_call_provider_async(
+            provider, prompt, system_prompt, temperature, json_mode, priority, schema
+        ))
+        tasks[task] = provider
+
+    launch(primary)
+    try:
+        while tasks:
+            done, _ = await asyncio.wait(
+                tasks,
+                timeout=None if secondary_started else delay,
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                logger.info(f"DeepSeek slower than {delay:.1f}s, hedging with Gemini...")
+                hedge_policy.record("hedges_fired")
+                event("llm.hedge", provider=secondary.value)
+                secondary_started = hedge_fired = True
+                launch(secondary)
+                continue
+
+            for task in done:
+                provider = tasks.pop(task)
+                try:
+                    text = task.result()
+                    if validate and not validate(text):
+                        raise ValueError(f"{provider.value} returned an unparseable response")
+                except Exception as e:
+                    logger.warning(f"{provider.value} failed: {e}")
+                    last_error = e
+                    if not secondary_started:
+                        logger.info("Falling back to Gemini 1.5 Flash...")
+                        event("llm.fallback", failed=LLMProvider.DEEPSEEK.value)
+                        hedge_policy.record("fallbacks")
+                        secondary_started = True
+                        launch(secondary)
+                    continue
+
+                if hedge_fired:
+                    hedge_policy.record("hedge_wins" if provider == secondary else "primary_wins_after_hedge")
+                return provider, text
+
+        hedge_policy.record("failures")
+        raise last_error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def _discard_stream(task: asyncio.Task, stream):
+    """Cancels a losing stream's pending read and closes it, releasing its scheduler slot and connection."""
+    task.cancel()
+    await asyncio.wait([task])
+    try:
+        await stream.aclose()
+    except Exception as e:
+        logger.debug(f"Closing a discarded stream failed: {e}")
+
+
+async def _hedged_stream(
+    prompt: str,
+    system_prompt: Optional[str],
+    temperature: float,
+    json_mode: bool,
+    priority: int = PRIORITY_BACKGROUND,
+    schema: Optional[Type[BaseModel]] = None,
+    outcome: Optional[Dict[str, Any]] = None
+) -> AsyncIterator[str]:
+    """
+    Streaming hedge on time-to-first-token: if DeepSeek has produced nothing
+    within the hedge delay, Gemini is started too, and whichever stream emits
+    first is relayed while the other is cancelled. The relayed provider is
+    recorded as outcome["provider"].
+    """
+    primary, secondary = LLMProvider.DEEPSEEK, LLMProvider.GOOGLE
+    hedge_policy.record("calls")
+    delay = hedge_policy.delay(f"{primary.value}:ttft")
+    pending: Dict[asyncio.Task, Tuple[LLMProvider, Any, float]] = {}
+    secondary_started = False
+    hedge_fired = False
+    last_error: Optional[Exception] = None
+    winner = None
+
+    def launch(provider: LLMProvider):
+        stream = _open_stream(provider, prompt, system_prompt, temperature, json_mode, priority, schema)
+        pending[asyncio.create_task(stream.__anext__())] = (provider, stream, time.perf_counter())
+
+    launch(primary)
+    try:
+        while pending and winner is None:
+            done, _ = await asyncio.wait(
+                pending,
+                timeout=None if secondary_started else delay,
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                logger.info(f"No DeepSeek token after {delay:.1f}s, hedging with Gemini...")
+                hedge_policy.record("hedges_fired")
+                event("llm.hedge", provider=secondary.value)
+                secondary_started = hedge_fired = True
+                launch(secondary)
+                continue
+
+            for task in done:
+                provider, stream, started = pending.pop(task)
+                try:
+                    first = task.result()
+                except StopAsyncIteration:
+                    last_error = ValueError(f"{provider.value} returned an empty stream")
+                except Exception as e:
+                    last_error = e
+                else:
+                    if winner is None:
+                        latency_tracker.observe(f"{provider.value}:ttft", time.perf_counter() - started)
+                        winner = (provider, stream, first)
+                    else:
+                        # Both produced a chunk in the same batch: the later one is closed right away
+                        await _discard_stream(task, stream)
+                    continue
+
+                logger.warning(f"{provider.value} stream failed: {last_error}")
+                if not secondary_started:
+                    logger.info("Falling back to Gemini 1.5 Flash...")
+                    event("llm.fallback", failed=LLMProvider.DEEPSEEK.value)
+                    hedge_policy.record("fallbacks")
+                    secondary_started = True
+                    launch(secondary)
+    finally:
+        for task, (_, stream, _) in list(pending.items()):
+            await _discard_stream(task, stream)
+
+    if winner is None:
+        hedge_policy.record("failures")
+        raise last_error
+
+    provider, stream, first = winner
+    if outcome is not None:
+        outcome["provider"] = provider
+    if hedge_fired:
+        hedge_policy.record("hedge_wins" if provider == secondary else "primary_wins_after_hedge")
+    async with aclosing(stream):
+        yield first
+        async for delta in stream:
+            yield delta
+
+
+def _remember_response(
+    cache_key: Optional[str],
+    requested: LLMProvider,
+    answered: LLMProvider,
+    text: str,
+    validate: Optional[Callable[[str], bool]] = None
+):
+    """
+    Caches a response only under the provider that produced it (a Gemini
+    fallback is never replayed as DeepSeek's answer) and only if it passes
+    `validate`, so one bad generation is not served again from cache.
+    """
+    if not cache_key or answered != requested:
+        return
+    if validate and not validate(text):
+        logger.info(f"Not caching a {answered.value} response that failed validation.")
+        return
+    response_cache.set(cache_key, text)
+
+
 def get_llm_response(
     prompt: str,
     provider: LLMProvider = LLMProvider.GOOGLE,
     temperature: float = 0.0,
     system_prompt: Optional[str] = None,
     fallback: bool = True,
-    json_mode: bool = False
+    json_mode: bool = False,
+    cache: Optional[bool] = None,
+    priority: int = PRIORITY_BACKGROUND,
+    schema: Optional[Type[BaseModel]] = None,
+    refresh: bool = False
 ) -> str:
     """
     Unified LLM response function.
@@ -229,23 +1555,173 @@ def get_llm_response(
         temperature: Sampling temperature
         system_prompt: Optional system prompt
         fallback: If True, fall back to Google if DeepSeek fails
+        json_mode: Ask the provider for a JSON response
+        cache: Force the response cache on/off (None = KYOKA_LLM_CACHE setting)
+        priority: Scheduler priority when the provider is saturated (lower goes first)
+        schema: Pydantic model the JSON response must follow (constrained decoding where supported)
+        refresh: Skip cached responses (a fresh one still replaces the cache entry)
     
     Returns:
         LLM response text
     """
+    cache_key = None
+    if response_cache.applies(temperature, cache):
+        cache_key = ResponseCache.key(provider, prompt, system_prompt, temperature, json_mode, schema)
+        cached = None if refresh else response_cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"LLM cache hit ({provider.value}).")
+            return cached
+
     try:
         if provider == LLMProvider.DEEPSEEK:
-            print(f"INFO: Using DeepSeek-V3 for inference...")
-            return get_deepseek_response(prompt, system_prompt, temperature)
+            logger.info("Using DeepSeek-V3 for inference...")
         else:
-            print(f"INFO: Using Gemini Flash (latest) for inference...")
-            return get_google_response(prompt, system_prompt, temperature, json_mode)
+            logger.info("Using Gemini Flash (latest) for inference...")
+        answered = provider
+        text = _call_provider(provider, prompt, system_prompt, temperature, json_mode, priority, schema)
     
     except Exception as e:
-        print(f"WARN: {provider.value} failed: {e}")
-        
-        if fallback and provider == LLMProvider.DEEPSEEK:
-            print("INFO: Falling back to Gemini 1.5 Flash...")
-            return get_google_response(prompt, system_prompt, temperature, json_mode)
+        logger.warning(f"{provider.value} failed: {e}")
         
-        raise
+        if not (fallback and provider == LLMProvider.DEEPSEEK):
+            raise
+        logger.info("Falling back to Gemini 1.5 Flash...")
+        event("llm.fallback", failed=LLMProvider.DEEPSEEK.value)
+        answered = LLMProvider.GOOGLE
+        text = _call_provider(LLMProvider.GOOGLE, prompt, system_prompt, temperature, json_mode, priority, schema)
+
+    _remember_response(cache_key, provider, answered, text)
+    return text
+
+
+async def get_llm_response_async(
+    prompt: str,
+    provider: LLMProvider = LLMProvider.GOOGLE,
+    temperature: float = 0.0,
+    system_prompt: Optional[str] = None,
+    fallback: bool = True,
+    json_mode: bool = False,
+    cache: Optional[bool] = None,
+    hedge: Optional[bool] = None,
+    validate: Optional[Callable[[str], bool]] = None,
+    priority: int = PRIORITY_BACKGROUND,
+    schema: Optional[Type[BaseModel]] = None,
+    refresh: bool = False
+) -> str:
+    """
+    Async variant of get_llm_response.
+    Runs entirely on the event loop, so an in-flight call does not pin a thread.
+
+    With hedging (KYOKA_LLM_HEDGE or hedge=True) a slow DeepSeek call is raced
+    against Gemini; `validate` rejects responses that would not parse.
+    """
+    cache_key = None
+    if response_cache.applies(temperature, cache):
+        cache_key = ResponseCache.key(provider, prompt, system_prompt, temperature, json_mode, schema)
+        cached = None if refresh else response_cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"LLM cache hit ({provider.value}).")
+            return cached
+
+    if hedge_policy.applies(provider, fallback, hedge):
+        logger.info("Using DeepSeek-V3 for inference (hedged)...")
+        answered, text = await _hedged_response_async(
+            prompt, system_prompt, temperature, json_mode, validate, priority, schema
+        )
+        _remember_response(cache_key, provider, answered, text, validate)
+        return text
+
+    try:
+        if provider == LLMProvider.DEEPSEEK:
+            logger.info("Using DeepSeek-V3 for inference...")
+        else:
+            logger.info("Using Gemini Flash (latest) for inference...")
+        answered = provider
+        text = await _call_provider_async(provider, prompt, system_prompt, temperature, json_mode, priority, schema)
+
+    except Exception as e:
+        logger.warning(f"{provider.value} failed: {e}")
+
+        if not (fallback and provider == LLMProvider.DEEPSEEK):
+            raise
+        logger.info("Falling back to Gemini 1.5 Flash...")
+        event("llm.fallback", failed=LLMProvider.DEEPSEEK.value)
+        answered = LLMProvider.GOOGLE
+        text = await _call_provider_async(
+            LLMProvider.GOOGLE, prompt, system_prompt, temperature, json_mode, priority, schema
+        )
+
+    _remember_response(cache_key, provider, answered, text, validate)
+    return text
+
+
+async def stream_llm_response(
+    prompt: str,
+    provider: LLMProvider = LLMProvider.GOOGLE,
+    temperature: float = 0.0,
+    system_prompt: Optional[str] = None,
+    fallback: bool = True,
+    json_mode: bool = False,
+    cache: Optional[bool] = None,
+    hedge: Optional[bool] = None,
+    priority: int = PRIORITY_BACKGROUND,
+    schema: Optional[Type[BaseModel]] = None,
+    validate: Optional[Callable[[str], bool]] = None,
+    refresh: bool = False
+) -> AsyncIterator[str]:
+    """
+    Streaming variant of get_llm_response, yielding text deltas as they are generated.
+
+    The Gemini fallback only applies if DeepSeek fails before producing any
+    output; a failure mid-stream is raised so the caller can retry cleanly.
+    With hedging, Gemini is also started when DeepSeek's first token is late.
+    A response cache hit is yielded as a single delta; a finished stream is
+    only cached if it passes `validate`.
+    """
+    cache_key = None
+    if response_cache.applies(temperature, cache):
+        cache_key = ResponseCache.key(provider, prompt, system_prompt, temperature, json_mode, schema)
+        cached = None if refresh else response_cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"LLM cache hit ({provider.value}).")
+            yield cached
+            return
+
+    chunks = []
+    if hedge_policy.applies(provider, fallback, hedge):
+        logger.info("Streaming from DeepSeek-V3 (hedged)...")
+        # aclosing: a consumer that stops early closes the provider stream right away
+        outcome: Dict[str, Any] = {}
+        async with aclosing(_hedged_stream(prompt, system_prompt, temperature, json_mode, priority, schema, outcome)) as stream:
+            async for delta in stream:
+                chunks.append(delta)
+                yield delta
+        _remember_response(cache_key, provider, outcome["provider"], "".join(chunks), validate)
+        return
+
+    answered = provider
+    try:
+        if provider == LLMProvider.DEEPSEEK:
+            logger.info("Streaming from DeepSeek-V3...")
+        else:
+            logger.info("Streaming from Gemini Flash (latest)...")
+        async with aclosing(_open_stream(provider, prompt, system_prompt, temperature, json_mode, priority, schema)) as stream:
+            async for delta in stream:
+                chunks.append(delta)
+                yield delta
+
+    except Exception as e:
+        logger.warning(f"{provider.value} stream failed: {e}")
+        if chunks or not (fallback and provider == LLMProvider.DEEPSEEK):
+            raise
+
+        logger.info("Falling back to Gemini 1.5 Flash...")
+
+        event("llm.fallback", failed=LLMProvider.DEEPSEEK.value)
+        answered = LLMProvider.GOOGLE
+        async with aclosing(_open_stream(LLMProvider.GOOGLE, prompt, system_prompt, temperature, json_mode, priority, schema)) as stream:
+            async for delta in stream:
+                chunks.append(delta)
+                yield delta
+
+    _remember_response(cache_key, provider, answered, "".join(chunks), validate)
@@ -0,0 +1,186 @@
+"""
+Logging
+
+Structured, non-blocking logging for the backend:
+- records are handed to a QueueHandler and written by a background
+  QueueListener thread, so request paths never block on stdout/file I/O,
+- every record carries the current request_id / analysis_id (contextvars,
+  so they follow asyncio tasks and context-copied worker threads),
+- KYOKA_LOG_FORMAT=json emits one JSON object per line for log shippers;
+  the default "text" format stays readable in a terminal.
+
+Modules log through `logging.getLogger(__name__)`; `configure_logging()`
+is called once when the app is imported and is safe to call again.
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import queue
+import atexit
+import logging
+import threading
+import contextvars
+import logging.handlers
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+
+# Loggers routed through the queue (uvicorn's own handlers write synchronously)
+MANAGED_LOGGERS = ("backend", "uvicorn", "uvicorn.error", "uvicorn.access")
+
+request_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("kyoka_request_id", default=None)
+analysis_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("kyoka_analysis_id", default=None)
+
+# Attributes every LogRecord has; anything else was passed via `extra=` and goes into JSON output
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class ContextFilter(logging.Filter):
+    """Stamps request/analysis ids onto the record in the context of the logging call."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        record.analysis_id = analysis_id_var.get()
+        return True
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED and value is not None:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s %(name)s%(ids)s: %(message)s", "%H:%M:%S")
+
+    def format(self, record: logging.LogRecord) -> str:
+        ids = [value for value in (getattr(record, "request_id", None), getattr(record, "analysis_id", None)) if value]
+        record.ids = f" [{' '.join(ids)}]" if ids else ""
+        return super().format(record)
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_configure_lock = threading.Lock()
+
+
+def configure_logging(level: Optional[str] = None, fmt: Optional[str] = None, log_file: Optional[str] = None):
+    """
+    Routes MANAGED_LOGGERS through one queue drained by a background listener
+    thread. Defaults come from KYOKA_LOG_LEVEL (INFO), KYOKA_LOG_FORMAT
+    (text | json) and KYOKA_LOG_FILE (optional, in addition to stdout),
+    read at call time so a .env loaded beforehand applies.
+    """
+    global _listener
+    level = (level or os.getenv("KYOKA_LOG_LEVEL", "INFO")).upper()
+    fmt = (fmt or os.getenv("KYOKA_LOG_FORMAT", "text")).lower()
+    log_file = log_file or os.getenv("KYOKA_LOG_FILE")
+    with _configure_lock:
+        if _listener is not None:
+            _listener.stop()
+
+        formatter = JSONFormatter() if fmt == "json" else TextFormatter()
+        stream = logging.StreamHandler(sys.stdout)
+        stream.setFormatter(formatter)
+        handlers = [stream]
+        if log_file:
+            file_handler = logging.FileHandler(log_file, encoding="utf-8")
+            file_handler.setFormatter(formatter)
+            handlers.append(file_handler)
+
+        # Unbounded: producers never wait, the listener catches up in the background
+        records: queue.SimpleQueue = queue.SimpleQueue()
+        queue_handler = logging.handlers.QueueHandler(records)
+        queue_handler.addFilter(ContextFilter())
+        for name in MANAGED_LOGGERS:
+            logger = logging.getLogger(name)
+            logger.handlers = [queue_handler]
+            logger.propagate = False
+        logging.getLogger("backend").setLevel(level)
+
+        _listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+        _listener.start()
+
+
+def shutdown_logging():
+    """Flushes queued records; registered with atexit."""
+    global _listener
+    with _configure_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+atexit.register(shutdown_logging)
+
+
+def _restart_listener_after_fork():
+    # Only the forking thread survives fork(); workers of a preloaded app need their own writer
+    global _listener, _configure_lock
+    _configure_lock = threading.Lock()
+    if _listener is not None:
+        _listener = logging.handlers.QueueListener(_listener.queue, *_listener.handlers, respect_handler_level=True)
+        _listener.start()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_listener_after_fork)
+
+
+@contextmanager
+def log_context(request_id: Optional[str] = None, analysis_id: Optional[str] = None) -> Iterator[None]:
+    """Tags every record logged in this context (and tasks/threads spawned from it)."""
+    tokens = []
+    if request_id is not None:
+        tokens.append((request_id_var, request_id_var.set(request_id)))
+    if analysis_id is not None:
+        tokens.append((analysis_id_var, analysis_id_var.set(analysis_id)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+class RequestIdMiddleware:
+    """
+    ASGI middleware: takes X-Request-ID from the client (or generates one),
+    binds it for the lifetime of the request, including streamed bodies,
+    and echoes it back on the response.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        request_id = None
+        for name, value in scope.get("headers", []):
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex[:12]
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        with log_context(request_id=request_id):
+            await self.app(scope, receive, send_with_id)
@@ -1,15 +1,31 @@
 import sys
 import os
 import io
+import math
+import asyncio
+import logging
+import importlib
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from .schemas import ProfileRequest, ProfileResponse, ChatRequest, ChatMessage
-from .agents.researcher import DeepResearchAgent
-from .agents.profiler import PsychProfiler
-from .agents.strategist import MeetingStrategist
-from langchain_groq import ChatGroq
-from langchain_core.messages import HumanMessage, SystemMessage
+from fastapi.middleware.gzip import GZipMiddleware
+from .schemas import (
+    ProfileRequest, ChatRequest, ChatMessage, AnalysisJobResponse,
+    ChatSessionRequest, ChatSessionResponse, ChatTurnRequest, ChatTurnResponse
+)
+from .agents.researcher import get_search_cache
+from .pipeline import run_analysis
+from .jobs import job_store
+from .flights import AnalysisFlight, analysis_flights
+from .executor import AnalysisRejected, analysis_executor
+from .sessions import session_store
+from .scheduler import scheduler, PRIORITY_INTERACTIVE
+from .llm_provider import registry, response_cache, hedge_policy, resilience_stats, breakers
+from .metrics import metrics
+from .log import configure_logging, RequestIdMiddleware
+from .static import StripPrefixMiddleware, mount_frontend
+from .chat import build_persona_prompt, build_chat_messages, content_to_text
 
 # Force UTF-8 encoding for stdout/stderr to prevent 'charmap' errors on Windows
 if sys.platform == "win32":
@@ -19,14 +35,53 @@ if sys.platform == "win32":
 # Load environment variables
 load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
 
+configure_logging()
+logger = logging.getLogger(__name__)
+
 # Verify critical API keys
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 if not GOOGLE_API_KEY:
-    print("❌ WARNING: GOOGLE_API_KEY is missing in .env! Features will fail.")
+    logger.warning("GOOGLE_API_KEY is missing in .env! Features will fail.")
 elif len(GOOGLE_API_KEY) < 10:
-    print("⚠️ WARNING: GOOGLE_API_KEY looks invalid (too short).")
+    logger.warning("GOOGLE_API_KEY looks invalid (too short).")
+
+# Provider SDKs are imported lazily; warm-up loads them once per worker, off the request path.
+# "background" starts serving immediately, "eager" finishes warm-up before the first request.
+WARM_UP_MODE = os.getenv("KYOKA_WARM_UP", "background").lower()
+WARM_UP_MODULES = ("tavily", "langchain_core.messages")
+
+
+def warm_up() -> list:
+    """Creates pooled LLM clients and preloads the remaining lazily imported SDKs."""
+    warmed = registry.warm_up()
+    for module in WARM_UP_MODULES:
+        try:
+            importlib.import_module(module)
+            warmed.append(module)
+        except ImportError as e:
+            logger.warning(f"Warm-up skipped for {module}: {e}")
+    logger.info(f"Warm-up complete: {', '.join(warmed) or 'none'}")
+    return warmed
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Create pooled LLM clients once per worker instead of once per request
+    warm_up_task = None
+    if WARM_UP_MODE == "eager":
+        await asyncio.to_thread(warm_up)
+    elif WARM_UP_MODE != "off":
+        warm_up_task = asyncio.create_task(asyncio.to_thread(warm_up))
+    yield
+    if warm_up_task is not None and not warm_up_task.done():
+        await warm_up_task
+    await registry.aclose()
 
-app = FastAPI(title="The Mentalist API")
+
+app = FastAPI(title="The Mentalist API", lifespan=lifespan)
+
+# Compress JSON responses (SSE and already-encoded static assets are passed through untouched)
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=6)
 
 # CORS Configuration
 app.add_middleware(
@@ -35,157 +90,137 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID"],
 )
+# The frontend calls /api/...; the Vite proxy strips the prefix in development, this does in production
+app.add_middleware(StripPrefixMiddleware, prefix="/api")
+# Outermost, so the request id is bound before any other middleware or route logs
+app.add_middleware(RequestIdMiddleware)
 
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, PlainTextResponse
 import json
-import asyncio
-
-async def analysis_generator(name: str, context: str):
-    """Generator for streaming analysis progress and final result."""
-    google_api_key = os.getenv("GOOGLE_API_KEY")
-    tavily_api_key = os.getenv("TAVILY_API_KEY")
-    
-    queue = asyncio.Queue()
 
-    def status_callback(msg):
-        # We use a thread-safe way to put items into the queue
-        loop.call_soon_threadsafe(queue.put_nowait, {"type": "status", "data": msg})
+def rejected(e: AnalysisRejected) -> HTTPException:
+    """429 telling the client when to try again."""
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(math.ceil(e.retry_after))})
 
-    loop = asyncio.get_event_loop()
+def start_analysis(name: str, context: str, refresh: bool = False) -> AnalysisFlight:
+    """
+    Joins the in-flight run for (name, context) or starts one.
+    Identical concurrent requests share one pipeline run (replayed, then live).
+    """
+    return analysis_flights.join(
+        name,
+        context,
+        lambda emit: run_analysis(name, context, emit=emit, refresh=refresh),
+        refresh=refresh
+    )
 
-    # 1. Start Research in a thread
-    async def run_pipeline():
-        try:
-            status_callback("Initializing Deep Intelligence Scan...")
-            researcher = DeepResearchAgent(tavily_api_key=tavily_api_key)
-            
-            # This is sync, so we run it in a thread
-            research_results = await asyncio.to_thread(
-                researcher.run_deep_search, 
-                name=name, 
-                context=context, 
-                status_callback=status_callback
-            )
-            
-            status_callback("Constructing Behavioral Neural Matrix...")
-            profiler = PsychProfiler(api_key=google_api_key)
-            analysis_result = await asyncio.to_thread(
-                profiler.analyze_psychology, 
-                text_data=research_results["text"],
-                name=name,
-                context=context
-            )
-            
-            status_callback("Generating Strategic Tactical Protocol...")
-            strategist = MeetingStrategist(api_key=google_api_key)
-            strategy_doc = await asyncio.to_thread(
-                strategist.generate_strategy,
-                profile_data=analysis_result["profile"],
-                meeting_purpose=context
-            )
-            
-            final_data = {
-                "type": "final",
-                "data": {
-                    "profile": analysis_result["profile"],
-                    "thought_process": analysis_result.get("thought_process", ""),
-                    "strategy": strategy_doc,
-                    "sources": research_results.get("sources", [])
-                }
-            }
-            await queue.put(final_data)
-        except Exception as e:
-            await queue.put({"type": "error", "data": str(e)})
-        finally:
-            await queue.put(None) # Signal end
-
-    asyncio.create_task(run_pipeline())
-
-    while True:
-        item = await queue.get()
-        if item is None:
-            break
+async def flight_events(flight: AnalysisFlight):
+    """
+    SSE body for a flight. If the client disconnects the generator is closed,
+    which unsubscribes it; the run is cancelled once nobody is listening.
+    """
+    async for item in flight.subscribe():
         yield f"data: {json.dumps(item)}\n\n"
 
 @app.get("/analyze/stream")
-async def analyze_profile_stream(name: str, context: str):
-    return StreamingResponse(analysis_generator(name, context), media_type="text/event-stream")
+async def analyze_profile_stream(name: str, context: str, refresh: bool = False):
+    """
+    `refresh=true` recomputes every stage instead of reusing memoized stages or cached searches and LLM responses.
+    Answers 429 with Retry-After when every analysis slot and queue place is taken.
+    """
+    try:
+        flight = start_analysis(name, context, refresh)
+    except AnalysisRejected as e:
+        raise rejected(e)
+    return StreamingResponse(flight_events(flight), media_type="text/event-stream")
 
-@app.post("/analyze", response_model=ProfileResponse)
+@app.post("/analyze", response_model=AnalysisJobResponse, status_code=202)
 async def analyze_profile(req: ProfileRequest):
-    # Keep legacy endpoint for compatibility if needed, but we'll use stream in frontend
+    """
+    Submits an analysis job and returns its id immediately.
+    Poll GET /analyze/{job_id} (optionally with ?wait=seconds) for the result.
+    """
     try:
-        google_api_key = os.getenv("GOOGLE_API_KEY")
-        tavily_api_key = os.getenv("TAVILY_API_KEY")
-        
-        researcher = DeepResearchAgent(tavily_api_key=tavily_api_key)
-        research_results = researcher.run_deep_search(name=req.name, context=req.context)
-        
-        profiler = PsychProfiler(api_key=google_api_key)
-        analysis_result = profiler.analyze_psychology(
-            text_data=research_results["text"],
-            name=req.name,
-            context=req.context
-        )
-        
-        strategist = MeetingStrategist(api_key=google_api_key)
-        strategy_doc = strategist.generate_strategy(
-            profile_data=analysis_result["profile"],
-            meeting_purpose=req.context
-        )
-        
-        return ProfileResponse(
-            profile=analysis_result["profile"],
-            thought_process=analysis_result.get("thought_process", ""),
-            strategy=strategy_doc,
-            sources=research_results.get("sources", [])
-        )
+        job = job_store.submit(req.name, req.context, refresh=req.refresh)
+    except AnalysisRejected as e:
+        raise rejected(e)
+    return job.to_dict()
+
+@app.get("/analyze/{job_id}", response_model=AnalysisJobResponse)
+async def analyze_job_status(job_id: str, wait: float = 0.0):
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired analysis job.")
+    # Long-poll: hold the request (without blocking the loop) until done or timeout
+    await job_store.wait(job, timeout=min(max(wait, 0.0), 60.0))
+    return job.to_dict()
+
+def wants_event_stream(request: Request) -> bool:
+    """Chat routes stream over SSE when the client asks for text/event-stream."""
+    return "text/event-stream" in request.headers.get("accept", "")
+
+
+async def simulate_reply(messages: list) -> str:
+    """Runs one persona turn on Gemini without blocking the event loop."""
+    logger.debug("Using Gemini for simulation fallback")
+    sim_llm = registry.chat_model(temperature=0.8)
+    registry.record("chat_requests")
+    # Interactive turns jump the Gemini queue ahead of background profiling
+    async with scheduler.slot_async("google", priority=PRIORITY_INTERACTIVE):
+        response = await sim_llm.ainvoke(messages)
+    return content_to_text(response.content)
+
+
+async def stream_reply(messages: list):
+    """Streaming variant of simulate_reply, yielding text deltas."""
+    logger.debug("Streaming Gemini simulation reply")
+    sim_llm = registry.chat_model(temperature=0.8)
+    registry.record("chat_requests")
+    async with scheduler.slot_async("google", priority=PRIORITY_INTERACTIVE):
+        async for chunk in sim_llm.astream(messages):
+            # Chunks may carry a list of content blocks too; normalize each one
+            text = content_to_text(chunk.content)
+            if text:
+                yield text
+
+
+async def chat_event_stream(messages: list, on_complete=None):
+    """
+    SSE body for one chat turn: chat_delta events as tokens arrive, then
+    chat_complete with the full reply (merged with on_complete(content), if given).
+    """
+    chunks = []
+    try:
+        async for delta in stream_reply(messages):
+            chunks.append(delta)
+            yield f"data: {json.dumps({'type': 'chat_delta', 'data': delta})}\n\n"
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        logger.exception(f"Chat stream failed: {e}")
+        yield f"data: {json.dumps({'type': 'error', 'data': str(e)})}\n\n"
+        return
+
+    content = "".join(chunks)
+    data = {"content": content, **(on_complete(content) if on_complete else {})}
+    yield f"data: {json.dumps({'type': 'chat_complete', 'data': data})}\n\n"
+
 
 @app.post("/chat")
-async def chat_simulation(req: ChatRequest):
+async def chat_simulation(req: ChatRequest, request: Request):
     try:
-        print(f"DEBUG: Chat simulation requested for {req.target_name}")
+        logger.debug(f"Chat simulation requested for {req.target_name}")
         groq_api_key = os.getenv("GROQ_API_KEY")
         google_api_key = os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
         
-        # Determine simulation prompt and persona
-        profile = req.profile
-        simulation_prompt = profile.get('simulation_prompt', "Act as the persona described in the psychology profile.")
-        
-        system_prompt = f"""
-        --- SYSTEM INSTRUCTION ---
-        You are simulating the persona below. Your goal is to have a natural, realistic conversation.
-        
-        {simulation_prompt}
-
-        --- PSYCHOLOGICAL BASELINE ---
-        {profile.get('profile_summary', '')}
-        
-        --- CONTEXT ---
-        Message Topic: {req.context}
-        
-        --- INTERACTION GUIDELINES ---
-        1. ACT NATURAL. If the user says "hi", say hi back. Do not be weirdly aggressive unless the persona demands it.
-        2. MATCH ENERGY AND LENGTH. If the user sends a short message/greeting, keep your response short (1-2 sentences). Do not launch into complex topics or "info-dump" unless the user asks.
-        3. Adopt the speech patterns, tone, and vocabulary of the target.
-        4. Do not reveal you are an AI.
-        5. Keep responses valid to the context, but start casually if the user is casual.
-        """
-        
-        messages = [SystemMessage(content=system_prompt)]
-        for msg in req.history:
-            if msg.role == "user":
-                messages.append(HumanMessage(content=msg.content))
-            else:
-                messages.append(HumanMessage(content=f"(You previously said): {msg.content}"))
+        system_prompt = build_persona_prompt(req.profile, req.context)
+        messages = build_chat_messages(system_prompt, req.history)
 
         # Groq API Key is currently INVALID/Expired. Skipping directly to Gemini for speed.
         # if groq_api_key:
         #     try:
         #         print("DEBUG: Using Groq (Llama 3.3) for simulation")
+        #         from langchain_groq import ChatGroq  # deferred: heavy SDK, unused unless enabled
         #         sim_llm = ChatGroq(
         #             model_name="llama-3.3-70b-versatile",
         #             groq_api_key=groq_api_key,
@@ -197,36 +232,120 @@ async def chat_simulation(req: ChatRequest):
         #         print(f"WARN: Groq failed: {e}. Falling back to Gemini.")
         
         if google_api_key:
-            print("DEBUG: Using Gemini for simulation fallback")
-            from langchain_google_genai import ChatGoogleGenerativeAI
-            sim_llm = ChatGoogleGenerativeAI(
-                model="gemini-flash-latest",
-                google_api_key=google_api_key,
-                temperature=0.8
-            )
-            response = sim_llm.invoke(messages)
-            
-            # Helper to ensure we send a String, not a complex object
-            final_content = response.content
-            if isinstance(final_content, list):
-                # If it's a list of blocks (common in newer LangChain versions), join the text parts
-                text_parts = []
-                for block in final_content:
-                    if isinstance(block, dict) and block.get("type") == "text":
-                        text_parts.append(block.get("text", ""))
-                    elif isinstance(block, str):
-                        text_parts.append(block)
-                final_content = "\n".join(text_parts)
-            
-            return {"content": str(final_content)}
+            if wants_event_stream(request):
+                return StreamingResponse(chat_event_stream(messages), media_type="text/event-stream")
+            return {"content": await simulate_reply(messages)}
             
         raise HTTPException(status_code=400, detail="No LLM provider available for chat.")
     except Exception as e:
-        import traceback
-        traceback.print_exc()
-        print(f"ERROR in chat_simulation: {e}")
+        logger.exception(f"Chat simulation failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/chat/sessions", response_model=ChatSessionResponse)
+async def create_chat_session(req: ChatSessionRequest):
+    """Stores the persona prompt server-side; later turns only send the new message."""
+    session = session_store.create(req.target_name, req.context, req.profile, req.history)
+    return {
+        "session_id": session["session_id"],
+        "target_name": session["target_name"],
+        "messages": len(session["history"]),
+    }
+
+
+@app.post("/chat/sessions/{session_id}", response_model=ChatTurnResponse)
+async def chat_session_turn(session_id: str, req: ChatTurnRequest, request: Request):
+    session = session_store.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Chat session not found or expired")
+    if not (os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")):
+        raise HTTPException(status_code=400, detail="No LLM provider available for chat.")
+
+    user_msg = ChatMessage(role="user", content=req.message)
+    messages = build_chat_messages(
+        session["system_prompt"],
+        session_store.history(session) + [user_msg],
+        summary=session["summary"]
+    )
+
+    def record_turn(content: str) -> dict:
+        # Only completed turns enter the history; an aborted stream leaves it untouched
+        session_store.append(session, user_msg, ChatMessage(role="assistant", content=content))
+        return {
+            "session_id": session_id,
+            "messages": len(session["history"]),
+            "summarized_messages": session["summarized_messages"],
+        }
+
+    if wants_event_stream(request):
+        return StreamingResponse(chat_event_stream(messages, record_turn), media_type="text/event-stream")
+
+    try:
+        content = await simulate_reply(messages)
+    except Exception as e:
+        logger.exception(f"Chat session turn failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"content": content, **record_turn(content)}
+
+
+@app.delete("/chat/sessions/{session_id}")
+async def delete_chat_session(session_id: str):
+    session_store.delete(session_id)
+    return {"deleted": session_id}
+
+
+@app.get("/stats")
+async def stats():
+    """Runtime statistics for pooled provider clients and caches."""
+    return {
+        "llm": registry.stats(),
+        "llm_cache": response_cache.stats(),
+        "hedging": hedge_policy.stats(),
+        "resilience": resilience_stats(),
+        "scheduler": scheduler.stats(),
+        "search_cache": get_search_cache().stats(),
+        "jobs": job_store.stats(),
+        "analysis_flights": analysis_flights.stats(),
+        "analysis_executor": analysis_executor.stats(),
+        "chat_sessions": session_store.stats()
+    }
+
+# Point-in-time gauges, sampled on every /metrics scrape
+metrics.gauge(
+    "kyoka_scheduler_in_flight",
+    "Provider calls currently holding a scheduler slot",
+    lambda: [({"provider": name}, s["in_flight"]) for name, s in scheduler.stats().items()]
+)
+metrics.gauge(
+    "kyoka_scheduler_queue_depth",
+    "Provider calls waiting for a scheduler slot",
+    lambda: [({"provider": name}, s["queue_depth"]) for name, s in scheduler.stats().items()]
+)
+metrics.gauge(
+    "kyoka_circuit_breaker_open",
+    "1 while a provider's circuit breaker is not closed",
+    lambda: [({"provider": p.value}, 0 if b.state == b.CLOSED else 1) for p, b in breakers.items()]
+)
+metrics.gauge(
+    "kyoka_analyses",
+    "Pipeline runs holding an executor slot (running) or waiting for one (queued)",
+    lambda: [({"state": state}, analysis_executor.stats()[state]) for state in ("running", "queued")]
+)
+metrics.gauge(
+    "kyoka_jobs",
+    "Retained analysis jobs by status",
+    lambda: [({"status": status}, count) for status, count in job_store.stats()["by_status"].items()]
+)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Prometheus text exposition of stage latencies, pipeline events and scheduler gauges."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+# Production (run.py --prod): serve the built frontend from this app. Mounted last so API routes win.
+if os.getenv("KYOKA_SERVE_FRONTEND", "0").lower() in ("1", "true", "yes"):
+    mount_frontend(app, os.getenv("KYOKA_FRONTEND_DIST"))
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
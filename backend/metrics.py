@@ -0,0 +1,333 @@
+"""
+Metrics & Tracing
+
+Latency spans around every pipeline stage (search queries, LLM attempts,
+fallbacks, parsing, queue waits), exported three ways:
+- Prometheus text format on GET /metrics (histograms + counters, no extra dependency),
+- a per-analysis timing breakdown returned with the final result,
+- optionally OpenTelemetry traces to a local collector (KYOKA_OTEL_ENDPOINT;
+  requires opentelemetry-sdk and opentelemetry-exporter-otlp-proto-http).
+
+Usage:
+    with span("search", query=q) as attrs:
+        ...
+        attrs["cache"] = "hit"
+"""
+
+import os
+import time
+import bisect
+import functools
+import threading
+import logging
+import contextvars
+from enum import Enum
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+# e.g. http://localhost:4318/v1/traces (OTLP over HTTP); unset = no tracing
+OTEL_ENDPOINT = os.getenv("KYOKA_OTEL_ENDPOINT")
+OTEL_SERVICE_NAME = os.getenv("KYOKA_OTEL_SERVICE_NAME", "kyoka-backend")
+
+# Offset from perf_counter to wall-clock nanoseconds, for back-dating OpenTelemetry spans
+_PERF_TO_WALL_NS = time.time_ns() - time.perf_counter_ns()
+
+
+def _label_key(labelnames: Tuple[str, ...], labels: Dict[str, Any]) -> Tuple[str, ...]:
+    return tuple(str(labels.get(name, "")) for name in labelnames)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS
+    ):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            series[bisect.bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), series):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                    labels = _format_labels(self.labelnames, key, 'le="%s"' % le)
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {series[-1]:.6f}")
+                lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Named counters/histograms plus gauge callbacks evaluated at scrape time."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+        self._gauges: List[Tuple[str, str, Callable[[], List[Tuple[Dict[str, Any], float]]]]] = []
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        with self._lock:
+            return self._metrics.setdefault(name, Counter(name, help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        with self._lock:
+            return self._metrics.setdefault(name, Histogram(name, help_text, labelnames, buckets))
+
+    def gauge(self, name: str, help_text: str, collect: Callable[[], List[Tuple[Dict[str, Any], float]]]):
+        """Registers a gauge whose samples [(labels, value)] are computed on every scrape."""
+        with self._lock:
+            self._gauges.append((name, help_text, collect))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        for name, help_text, collect in list(self._gauges):
+            try:
+                samples = collect()
+            except Exception as e:
+                logger.warning(f"Gauge {name} failed: {e}")
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in samples:
+                names = tuple(labels)
+                lines.append(f"{name}{_format_labels(names, _label_key(names, labels))} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+SPAN_SECONDS = metrics.histogram(
+    "kyoka_span_duration_seconds",
+    "Duration of pipeline stages (search, llm.*, compaction, profile, strategy, ...)",
+    ("span", "outcome")
+)
+EVENTS = metrics.counter(
+    "kyoka_events_total",
+    "Pipeline events such as LLM fallbacks, hedges and retries",
+    ("event",)
+)
+
+
+# --- Tracing ------------------------------------------------------------------
+
+_tracer = None
+_tracer_checked = False
+_tracer_lock = threading.Lock()
+
+
+def _get_tracer():
+    """Lazily builds an OTLP tracer when KYOKA_OTEL_ENDPOINT is set and the SDK is installed."""
+    global _tracer, _tracer_checked
+    if _tracer_checked or not OTEL_ENDPOINT:
+        return _tracer
+    with _tracer_lock:
+        if _tracer_checked:
+            return _tracer
+        try:
+            from opentelemetry.sdk.resources import Resource
+            from opentelemetry.sdk.trace import TracerProvider
+            from opentelemetry.sdk.trace.export import BatchSpanProcessor
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        except ImportError as e:
+            logger.warning(f"KYOKA_OTEL_ENDPOINT is set but OpenTelemetry is not installed ({e}). Tracing disabled.")
+        else:
+            provider = TracerProvider(resource=Resource.create({"service.name": OTEL_SERVICE_NAME}))
+            provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter(endpoint=OTEL_ENDPOINT)))
+            _tracer = provider.get_tracer("kyoka.pipeline")
+            logger.info(f"Exporting traces to {OTEL_ENDPOINT}")
+        _tracer_checked = True
+        return _tracer
+
+
+def _scalar(value: Any) -> Any:
+    """JSON- and OTel-safe attribute value: enums by value, anything non-scalar as a string."""
+    if isinstance(value, Enum):
+        value = value.value
+    return value if isinstance(value, (str, bool, int, float)) else str(value)
+
+
+def _otel_attributes(attrs: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: _scalar(v) for k, v in attrs.items() if v is not None}
+
+
+class Timeline:
+    """Spans recorded during one analysis, for the per-analysis timing breakdown."""
+
+    def __init__(self, name: str, **attrs):
+        self.name = name
+        self.started = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._otel_root = None
+        tracer = _get_tracer()
+        if tracer is not None:
+            self._otel_root = tracer.start_span(name, attributes=_otel_attributes(attrs))
+
+    def add(self, name: str, start: float, duration: float, outcome: str, attrs: Dict[str, Any]):
+        entry = {
+            "span": name,
+            "start_ms": round((start - self.started) * 1000, 1),
+            "duration_ms": round(duration * 1000, 1),
+            "outcome": outcome,
+        }
+        # Timelines end up in JSON responses, so attributes are flattened to scalars
+        entry.update({k: _scalar(v) for k, v in attrs.items() if v is not None})
+        with self._lock:
+            self.spans.append(entry)
+
+        tracer = _get_tracer()
+        if tracer is not None and self._otel_root is not None:
+            from opentelemetry import trace
+            start_ns = int(start * 1e9) + _PERF_TO_WALL_NS
+            otel_span = tracer.start_span(
+                name,
+                context=trace.set_span_in_context(self._otel_root),
+                start_time=start_ns,
+                attributes=_otel_attributes({**attrs, "outcome": outcome})
+            )
+            otel_span.end(end_time=start_ns + int(duration * 1e9))
+
+    def finish(self, outcome: str):
+        if self._otel_root is not None:
+            self._otel_root.set_attribute("outcome", outcome)
+            self._otel_root.end()
+
+    def summary(self) -> Dict[str, Any]:
+        """{"total_ms", "stages": {span: {count, total_ms, max_ms}}, "spans": [...]}"""
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s["start_ms"])
+        stages: Dict[str, Dict[str, Any]] = {}
+        for entry in spans:
+            stage = stages.setdefault(entry["span"], {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+            stage["count"] += 1
+            stage["total_ms"] = round(stage["total_ms"] + entry["duration_ms"], 1)
+            stage["max_ms"] = max(stage["max_ms"], entry["duration_ms"])
+        return {
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 1),
+            "stages": stages,
+            "spans": spans,
+        }
+
+
+_current_timeline: contextvars.ContextVar[Optional[Timeline]] = contextvars.ContextVar("kyoka_timeline", default=None)
+
+
+@contextmanager
+def analysis_timeline(name: str = "analysis", **attrs) -> Iterator[Timeline]:
+    """Collects every span recorded in this context (and tasks/threads spawned from it)."""
+    timeline = Timeline(name, **attrs)
+    token = _current_timeline.set(timeline)
+    outcome = "ok"
+    try:
+        yield timeline
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        _current_timeline.reset(token)
+        SPAN_SECONDS.observe(time.perf_counter() - timeline.started, span=name, outcome=outcome)
+        timeline.finish(outcome)
+
+
+@contextmanager
+def span(name: str, **attrs) -> Iterator[Dict[str, Any]]:
+    """
+    Times a block into kyoka_span_duration_seconds and the current analysis
+    timeline. The yielded dict can be updated with extra attributes (setting
+    "outcome" overrides the default ok/error label).
+    Safe inside async generators: it never sets context variables.
+    """
+    start = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield attrs
+    except GeneratorExit:
+        outcome = "closed"
+        raise
+    except BaseException as e:
+        outcome = "cancelled" if type(e).__name__ == "CancelledError" else "error"
+        raise
+    finally:
+        outcome = attrs.pop("outcome", outcome)
+        record_duration(name, time.perf_counter() - start, outcome, start=start, **attrs)
+
+
+def record_duration(name: str, seconds: float, outcome: str = "ok", start: Optional[float] = None, **attrs):
+    """Records a duration measured elsewhere (e.g. a queue wait)."""
+    SPAN_SECONDS.observe(seconds, span=name, outcome=outcome)
+    timeline = _current_timeline.get()
+    if timeline is not None:
+        timeline.add(name, start if start is not None else time.perf_counter() - seconds, seconds, outcome, attrs)
+
+
+def event(name: str, **attrs):
+    """Counts a point-in-time event and marks it on the current timeline."""
+    EVENTS.inc(event=name)
+    timeline = _current_timeline.get()
+    if timeline is not None:
+        timeline.add(name, time.perf_counter(), 0.0, "event", attrs)
+
+
+def in_context(fn: Callable) -> Callable:
+    """Binds fn to a copy of the current context, for work submitted to thread pools."""
+    return functools.partial(contextvars.copy_context().run, fn)
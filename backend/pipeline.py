@@ -0,0 +1,256 @@
+"""
+Analysis Pipeline
+
+The research -> profile -> strategy pipeline shared by the streaming
+endpoint (/analyze/stream) and the job API (/analyze).
+
+Progress is reported through `emit(event)`, a plain callable invoked on
+the event loop thread with SSE-ready dicts ({"type": ..., "data": ...}).
+
+Each stage's output is memoized under exactly the inputs it consumes
+(research: its query plan, profile: the research text, strategy: profile
++ meeting purpose), so changing only the meeting context reruns just the
+LinkedIn search and whatever depends on results that actually changed.
+The strategy is sampled (temperature > 0), so like any sampled LLM output
+it is only memoized with KYOKA_LLM_CACHE_ANY_TEMPERATURE=1.
+A "stage" event ({"stage", "reused"}) reports what was reused.
+
+While a fresh research scan runs, a role-based profile (name + context
+only) is generated alongside it and sent as a "preliminary_profile"
+event; the evidence-based profile supersedes it.
+"""
+
+import os
+import uuid
+import asyncio
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from .agents.researcher import DeepResearchAgent
+from .agents.compactor import ResearchCompactor
+from .agents.profiler import PsychProfiler
+from .agents.strategist import MeetingStrategist
+from .cache import LRUCache, SQLiteStore, TieredCache, make_cache_key
+from .metrics import analysis_timeline, span
+from .log import log_context
+
+logger = logging.getLogger(__name__)
+
+
+# Stage memo. It holds profiles of named people, so it stays in memory unless
+# KYOKA_STAGE_CACHE_PATH opts into a disk tier (like the opt-in LLM cache)
+STAGE_CACHE_TTL = float(os.getenv("KYOKA_STAGE_CACHE_TTL", str(24 * 3600)))
+STAGE_CACHE_MAX_ENTRIES = int(os.getenv("KYOKA_STAGE_CACHE_MAX_ENTRIES", "256"))
+STAGE_CACHE_MAX_BYTES = int(os.getenv("KYOKA_STAGE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+STAGE_CACHE_PATH = os.getenv("KYOKA_STAGE_CACHE_PATH", "")
+
+_stage_cache: Optional[TieredCache] = None
+_stage_cache_lock = threading.Lock()
+
+
+def get_stage_cache() -> TieredCache:
+    """Process-wide memo of research / profile / strategy outputs."""
+    global _stage_cache
+    if _stage_cache is None:
+        with _stage_cache_lock:
+            if _stage_cache is None:
+                disk = None
+                if STAGE_CACHE_PATH and STAGE_CACHE_PATH.lower() != "off":
+                    try:
+                        disk = SQLiteStore(STAGE_CACHE_PATH, ttl=STAGE_CACHE_TTL, max_bytes=STAGE_CACHE_MAX_BYTES)
+                    except Exception as e:
+                        logger.warning(f"Stage disk cache unavailable ({e}). Using memory only.")
+                _stage_cache = TieredCache(
+                    LRUCache(max_entries=STAGE_CACHE_MAX_ENTRIES, ttl=STAGE_CACHE_TTL),
+                    disk
+                )
+    return _stage_cache
+
+
+Emit = Callable[[Dict[str, Any]], None]
+
+
+async def run_analysis(
+    name: str,
+    context: str,
+    emit: Emit,
+    analysis_id: Optional[str] = None,
+    refresh: bool = False
+) -> Dict[str, Any]:
+    """
+    Runs the full pipeline without blocking the event loop and returns the
+    final payload (profile, thought_process, strategy, sources, reused_stages, timings).
+    Every log record emitted along the way is tagged with `analysis_id`.
+    `refresh` recomputes every stage, bypassing the stage memo and the search
+    and LLM response caches (fresh results still replace their entries).
+    """
+    with log_context(analysis_id=analysis_id or uuid.uuid4().hex[:12]), analysis_timeline("analysis") as timeline:
+        result = await _run_stages(name, context, emit, refresh)
+    result["timings"] = timeline.summary()
+    return result
+
+
+async def _run_stages(name: str, context: str, emit: Emit, refresh: bool = False) -> Dict[str, Any]:
+    google_api_key = os.getenv("GOOGLE_API_KEY")
+    tavily_api_key = os.getenv("TAVILY_API_KEY")
+
+    loop = asyncio.get_running_loop()
+    memo = get_stage_cache()
+    reused_stages = []
+
+    def status_callback(msg):
+        # Research reports from worker threads, so hop back onto the loop
+        loop.call_soon_threadsafe(emit, {"type": "status", "data": msg})
+
+    # The memo's SQLite tier does blocking I/O (plus zlib/json), so it runs off the loop
+    async def recall(stage: str, key: str) -> Optional[Any]:
+        value = None if refresh else await asyncio.to_thread(memo.get, key)
+        if value is not None:
+            reused_stages.append(stage)
+        return value
+
+    async def remember(key: str, value: Any):
+        await asyncio.to_thread(memo.set, key, value)
+
+    def report(stage: str, reused: bool, **details):
+        emit({"type": "stage", "data": {"stage": stage, "reused": reused, **details}})
+
+    emit({"type": "status", "data": "Initializing Deep Intelligence Scan..."})
+    researcher = DeepResearchAgent(tavily_api_key=tavily_api_key, refresh=refresh)
+
+    # Research depends only on the queries it would issue
+    research_key = make_cache_key("research", researcher.plan_queries(name, context))
+    research_results = await recall("research", research_key)
+
+    profiler = PsychProfiler(api_key=google_api_key)
+
+    # Role-based inference needs only name and context, so while research runs it
+    # produces a preliminary profile that the evidence-based one later replaces
+    role_key = profiler.stage_key("", name, context)
+
+    async def preliminary_profile() -> Dict[str, Any]:
+        with span("preliminary_profile") as attrs:
+            result = None if refresh else await asyncio.to_thread(memo.get, role_key)
+            attrs["reused"] = result is not None
+            if result is None:
+                result = await profiler.analyze_role_async(name, context, refresh=refresh)
+                if result.get("validated"):
+                    await remember(role_key, result)
+        if result.get("validated"):
+            emit({
+                "type": "preliminary_profile",
+                "data": {"profile": result["profile"], "thought_process": result["thought_process"], "basis": "role"}
+            })
+            emit({"type": "status", "data": "Preliminary role-based profile ready, refining with research..."})
+        return result
+
+    # Reused research is ready at once, so only a fresh scan is worth a preliminary pass
+    preliminary = asyncio.create_task(preliminary_profile()) if research_results is None else None
+    try:
+        with span("research", reused=research_results is not None):
+            if research_results is None:
+                # Tavily is sync, so the fan-out runs on its own bounded thread pool
+                abort = threading.Event()
+                try:
+                    research_results = await asyncio.to_thread(
+                        researcher.run_deep_search,
+                        name=name,
+                        context=context,
+                        status_callback=status_callback,
+                        cancel_event=abort
+                    )
+                except asyncio.CancelledError:
+                    # The worker thread cannot be interrupted, so tell it to stop issuing searches
+                    abort.set()
+                    raise
+                # Incomplete research is not memoized, so failed searches are retried next time
+                if not research_results["failed_queries"]:
+                    await remember(research_key, research_results)
+                escalated = [d["query"] for d in research_results["escalations"] if d["escalated"]]
+                if research_results["escalations"]:
+                    emit({
+                        "type": "status",
+                        "data": f"Deep fetch needed for {len(escalated)} of {len(research_results['escalations'])} searches"
+                    })
+                report(
+                    "research",
+                    False,
+                    queries=len(research_results["queries"]),
+                    cached_queries=research_results["cached_queries"],
+                    escalated_queries=escalated,
+                    latency_saved=research_results["latency_saved"]
+                )
+            else:
+                emit({"type": "status", "data": "Reusing research from an earlier scan..."})
+                report("research", True, queries=len(research_results["queries"]))
+
+        # Compaction is CPU-bound (shingling), keep it off the loop
+        compactor = ResearchCompactor(provider=profiler.primary_provider)
+        with span("compaction"):
+            compacted = await asyncio.to_thread(compactor.compact, research_results["documents"])
+        compaction = compacted["stats"]
+        emit({"type": "compaction", "data": compaction})
+        emit({
+            "type": "status",
+            "data": f"Compacted research: ~{compaction['before_tokens']} -> ~{compaction['after_tokens']} tokens"
+        })
+
+        # Same research text -> same profile, whatever the meeting purpose
+        profile_key = profiler.stage_key(compacted["text"], name, context)
+        # Too little research: the evidence-based prompt would be the role-based one already running
+        adopt_preliminary = preliminary is not None and not profiler.has_research(compacted["text"])
+        analysis_result = None if adopt_preliminary else await recall("profile", profile_key)
+        with span("profile", reused=analysis_result is not None):
+            if adopt_preliminary:
+                emit({"type": "status", "data": "Insufficient research, adopting the role-based profile..."})
+                analysis_result = await preliminary
+            elif analysis_result is None:
+                # LLM stages stream token deltas straight to the client
+                emit({"type": "status", "data": "Constructing Behavioral Neural Matrix..."})
+                async for event in profiler.analyze_psychology_stream(
+                    text_data=compacted["text"],
+                    name=name,
+                    context=context,
+                    refresh=refresh
+                ):
+                    if event["type"] == "profile_result":
+                        analysis_result = event["data"]
+                    else:
+                        emit(event)
+                if analysis_result.get("validated"):
+                    await remember(profile_key, analysis_result)
+            else:
+                emit({"type": "status", "data": "Research unchanged, reusing Behavioral Neural Matrix..."})
+            report("profile", "profile" in reused_stages)
+    finally:
+        # Cancelled before it can emit, so a preliminary profile never follows the real one
+        if preliminary is not None and not preliminary.done():
+            preliminary.cancel()
+
+    strategist = MeetingStrategist(api_key=google_api_key)
+    strategy_key = strategist.stage_key(analysis_result["profile"], context)
+    strategy_doc = await recall("strategy", strategy_key) if strategist.memoizable else None
+    with span("strategy", reused=strategy_doc is not None):
+        if strategy_doc is None:
+            emit({"type": "status", "data": "Generating Strategic Tactical Protocol..."})
+            async for event in strategist.generate_strategy_stream(
+                profile_data=analysis_result["profile"],
+                meeting_purpose=context,
+                refresh=refresh
+            ):
+                if event["type"] == "strategy_result":
+                    strategy_doc = event["data"]
+                    if event.get("complete") and strategist.memoizable:
+                        await remember(strategy_key, strategy_doc)
+                else:
+                    emit(event)
+        report("strategy", "strategy" in reused_stages)
+
+    return {
+        "profile": analysis_result["profile"],
+        "thought_process": analysis_result.get("thought_process", ""),
+        "strategy": strategy_doc,
+        "sources": research_results.get("sources", []),
+        "reused_stages": reused_stages
+    }
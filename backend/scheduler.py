@@ -0,0 +1,246 @@
+"""
+Provider Scheduler
+
+Caps how hard the backend hits each upstream API (DeepSeek, Gemini, Tavily):
+- a token bucket for requests per minute,
+- a maximum number of in-flight calls,
+- a priority queue for everything over either limit, so interactive /chat
+  turns are served before background profile generation.
+
+Works from worker threads (Tavily fan-out, sync LLM calls) and from the
+event loop alike:
+
+    with scheduler.slot("tavily"):
+        ...
+    async with scheduler.slot_async("google", priority=PRIORITY_INTERACTIVE):
+        ...
+"""
+
+import os
+import time
+import heapq
+import asyncio
+import itertools
+import threading
+from contextlib import contextmanager, asynccontextmanager
+from typing import Any, Dict, Iterator, AsyncIterator, Optional
+
+from .metrics import record_duration
+
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+# name -> (max in-flight, requests per minute, burst); rpm 0 = no rate limit
+DEFAULT_LIMITS = {
+    "deepseek": (16, 0, 0),
+    "google": (8, 60, 10),
+    "tavily": (8, 100, 10),
+}
+
+
+def _limits_from_env(name: str, defaults: tuple) -> tuple:
+    prefix = f"KYOKA_{name.upper()}_"
+    max_in_flight, rpm, burst = defaults
+    return (
+        int(os.getenv(prefix + "MAX_IN_FLIGHT", str(max_in_flight))),
+        float(os.getenv(prefix + "RPM", str(rpm))),
+        int(os.getenv(prefix + "BURST", str(burst))),
+    )
+
+
+class _Waiter:
+    __slots__ = ("priority", "enqueued_at", "waited", "granted", "abandoned", "event", "loop", "future")
+
+    def __init__(self, priority: int, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.priority = priority
+        self.enqueued_at = time.monotonic()
+        self.waited = 0.0
+        self.granted = False
+        self.abandoned = False
+        self.loop = loop
+        self.event = None if loop else threading.Event()
+        self.future = loop.create_future() if loop else None
+
+    def wake(self):
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class ProviderLimiter:
+    """Token bucket + in-flight cap for one provider, with a priority wait queue."""
+
+    def __init__(self, name: str, max_in_flight: int, rpm: float = 0, burst: int = 0):
+        self.name = name
+        self.max_in_flight = max(1, max_in_flight)
+        self.rate = rpm / 60.0
+        self.capacity = float(max(1, burst or int(self.rate) or 1))
+        self._tokens = self.capacity
+        self._refilled_at = time.monotonic()
+        self._in_flight = 0
+        self._queue: list = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._counters = {"granted": 0, "queued": 0, "max_queue_depth": 0}
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    def _refill(self, now: float):
+        if self.rate:
+            self._tokens = min(self.capacity, self._tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+    def _dispatch(self) -> Optional[float]:
+        """
+        Grants queued waiters while limits allow (caller holds the lock).
+        Returns seconds until the next token when work is blocked on the rate limit.
+        """
+        now = time.monotonic()
+        self._refill(now)
+        while self._queue:
+            waiter = self._queue[0][2]
+            if waiter.abandoned:
+                heapq.heappop(self._queue)
+                continue
+            if self._in_flight >= self.max_in_flight:
+                return None
+            if self.rate and self._tokens < 1:
+                return (1 - self._tokens) / self.rate
+            heapq.heappop(self._queue)
+            if self.rate:
+                self._tokens -= 1
+            self._in_flight += 1
+            waiter.waited = waited = now - waiter.enqueued_at
+            self._total_wait += waited
+            self._max_wait = max(self._max_wait, waited)
+            self._counters["granted"] += 1
+            waiter.granted = True
+            waiter.wake()
+        return None
+
+    def _enqueue(self, waiter: _Waiter) -> Optional[float]:
+        with self._lock:
+            heapq.heappush(self._queue, (waiter.priority, next(self._seq), waiter))
+            retry_in = self._dispatch()
+            if not waiter.granted:
+                self._counters["queued"] += 1
+                self._counters["max_queue_depth"] = max(self._counters["max_queue_depth"], len(self._queue))
+            return retry_in
+
+    def _abandon(self, waiter: _Waiter):
+        with self._lock:
+            waiter.abandoned = True
+            granted = waiter.granted
+        if granted:
+            self.release()
+
+    def _wait_timeout(self, retry_in: Optional[float]) -> Optional[float]:
+        """
+        How long a queued waiter sleeps before dispatching again itself. A release()
+        that frees a slot while the bucket is empty cannot grant anyone, so with a
+        rate limit nobody waits longer than one token interval without re-checking.
+        """
+        if retry_in is not None:
+            return retry_in
+        return 1 / self.rate if self.rate else None
+
+    def acquire(self, priority: int = PRIORITY_BACKGROUND):
+        """Blocks the calling thread until a slot is granted."""
+        waiter = _Waiter(priority)
+        retry_in = self._enqueue(waiter)
+        try:
+            while not waiter.event.wait(self._wait_timeout(retry_in)):
+                with self._lock:
+                    retry_in = self._dispatch()
+        except BaseException:
+            self._abandon(waiter)
+            raise
+        self._record_wait(waiter)
+
+    async def acquire_async(self, priority: int = PRIORITY_BACKGROUND):
+        """Waits on the event loop (no thread pinned) until a slot is granted."""
+        waiter = _Waiter(priority, asyncio.get_running_loop())
+        retry_in = self._enqueue(waiter)
+        try:
+            while not waiter.granted:
+                try:
+                    await asyncio.wait_for(asyncio.shield(waiter.future), self._wait_timeout(retry_in))
+                except asyncio.TimeoutError:
+                    with self._lock:
+                        retry_in = self._dispatch()
+        except BaseException:
+            self._abandon(waiter)
+            raise
+        self._record_wait(waiter)
+
+    def _record_wait(self, waiter: _Waiter):
+        # Only calls that actually queued show up as a queue span
+        if waiter.waited > 0.001:
+            record_duration(f"queue.{self.name}", waiter.waited, priority=waiter.priority)
+
+    def release(self):
+        with self._lock:
+            self._in_flight -= 1
+            self._dispatch()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._refill(time.monotonic())
+            granted = self._counters["granted"]
+            return {
+                "in_flight": self._in_flight,
+                "max_in_flight": self.max_in_flight,
+                "rpm": round(self.rate * 60, 2),
+                "tokens": round(self._tokens, 2) if self.rate else None,
+                "queue_depth": sum(1 for _, _, waiter in self._queue if not waiter.abandoned),
+                "avg_wait_ms": round(self._total_wait / granted * 1000, 2) if granted else 0.0,
+                "max_wait_ms": round(self._max_wait * 1000, 2),
+                **self._counters,
+            }
+
+
+class ProviderScheduler:
+    """Registry of per-provider limiters, configured from DEFAULT_LIMITS / env."""
+
+    def __init__(self, limits: Optional[Dict[str, tuple]] = None):
+        self._limiters = {
+            name: ProviderLimiter(name, *_limits_from_env(name, value))
+            for name, value in (limits or DEFAULT_LIMITS).items()
+        }
+
+    def limiter(self, name: str) -> ProviderLimiter:
+        return self._limiters[name]
+
+    def configure(self, name: str, max_in_flight: int, rpm: float = 0, burst: int = 0):
+        """Replaces a provider's limits (calls already holding a slot keep it)."""
+        self._limiters[name] = ProviderLimiter(name, max_in_flight, rpm, burst)
+
+    @contextmanager
+    def slot(self, name: str, priority: int = PRIORITY_BACKGROUND) -> Iterator[None]:
+        limiter = self._limiters[name]
+        limiter.acquire(priority)
+        try:
+            yield
+        finally:
+            limiter.release()
+
+    @asynccontextmanager
+    async def slot_async(self, name: str, priority: int = PRIORITY_BACKGROUND) -> AsyncIterator[None]:
+        limiter = self._limiters[name]
+        await limiter.acquire_async(priority)
+        try:
+            yield
+        finally:
+            limiter.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {name: limiter.stats() for name, limiter in self._limiters.items()}
+
+
+scheduler = ProviderScheduler()
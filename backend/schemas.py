@@ -4,6 +4,7 @@ from typing import List, Optional, Dict, Any
 class ProfileRequest(BaseModel):
     name: str
     context: str
+    refresh: bool = False
 
 class ChatMessage(BaseModel):
     role: str
@@ -15,8 +16,37 @@ class ChatRequest(BaseModel):
     profile: Dict[str, Any]
     history: List[ChatMessage]
 
+class ChatSessionRequest(BaseModel):
+    target_name: str
+    context: str
+    profile: Dict[str, Any]
+    history: List[ChatMessage] = []  # Optional seed, e.g. to resume after the session expired
+
+class ChatSessionResponse(BaseModel):
+    session_id: str
+    target_name: str
+    messages: int
+
+class ChatTurnRequest(BaseModel):
+    message: str
+
+class ChatTurnResponse(BaseModel):
+    session_id: str
+    content: str
+    messages: int
+    summarized_messages: int
+
 class ProfileResponse(BaseModel):
     profile: Dict[str, Any]
     thought_process: str
     strategy: str
     sources: List[str]
+    reused_stages: List[str] = []
+    timings: Optional[Dict[str, Any]] = None
+
+class AnalysisJobResponse(BaseModel):
+    job_id: str
+    status: str
+    progress: Optional[str] = None
+    result: Optional[ProfileResponse] = None
+    error: Optional[str] = None
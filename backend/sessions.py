@@ -0,0 +1,159 @@
+"""
+Chat Sessions
+
+Server-side state for the /chat simulator. A session keeps the compiled
+persona prompt and the running history, so each turn only sends the new
+message. Once the history grows past a token threshold, older turns are
+folded into a rolling summary in the background and only the most recent
+messages are replayed to the model.
+"""
+
+import os
+import time
+import uuid
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+
+from .cache import LRUCache, SQLiteStore, TieredCache
+from .chat import build_persona_prompt, build_summary_prompt
+from .schemas import ChatMessage
+from .llm_provider import get_llm_response_async, LLMProvider
+from .agents.compactor import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+
+SESSION_TTL = float(os.getenv("KYOKA_CHAT_SESSION_TTL", str(6 * 3600)))
+MAX_SESSIONS = int(os.getenv("KYOKA_CHAT_MAX_SESSIONS", "1000"))
+# Optional disk spill so sessions survive memory eviction and restarts ("off" = memory only)
+SESSION_PATH = os.getenv("KYOKA_CHAT_SESSION_PATH", "off")
+
+# Compact once the replayed history exceeds this many tokens, keeping the last few messages verbatim
+HISTORY_TOKEN_THRESHOLD = int(os.getenv("KYOKA_CHAT_HISTORY_TOKENS", "3000"))
+KEEP_RECENT_MESSAGES = int(os.getenv("KYOKA_CHAT_KEEP_MESSAGES", "6"))
+
+
+class ChatSessionStore:
+    def __init__(
+        self,
+        ttl: float = SESSION_TTL,
+        max_sessions: int = MAX_SESSIONS,
+        path: Optional[str] = SESSION_PATH,
+        token_threshold: int = HISTORY_TOKEN_THRESHOLD,
+        keep_recent: int = KEEP_RECENT_MESSAGES
+    ):
+        disk = None
+        if path and path.lower() != "off":
+            try:
+                disk = SQLiteStore(path, ttl=ttl)
+            except Exception as e:
+                logger.warning(f"Chat session disk store unavailable ({e}). Using memory only.")
+        self._cache = TieredCache(LRUCache(max_entries=max_sessions, ttl=ttl), disk)
+        self.token_threshold = token_threshold
+        self.keep_recent = keep_recent
+        self._compacting: Dict[str, asyncio.Task] = {}
+        self.created = 0
+        self.turns = 0
+        self.compactions = 0
+        self.compaction_failures = 0
+
+    def create(
+        self,
+        target_name: str,
+        context: str,
+        profile: Dict[str, Any],
+        history: Optional[List[ChatMessage]] = None
+    ) -> Dict[str, Any]:
+        """Compiles the persona prompt once and stores a new session (optionally seeded with history)."""
+        now = time.time()
+        session = {
+            "session_id": uuid.uuid4().hex,
+            "target_name": target_name,
+            "context": context,
+            "system_prompt": build_persona_prompt(profile, context),
+            "summary": "",
+            "history": [{"role": msg.role, "content": msg.content} for msg in history or []],
+            "summarized_messages": 0,
+            "created_at": now,
+            "updated_at": now,
+        }
+        self._cache.set(session["session_id"], session)
+        self.created += 1
+        return session
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        return self._cache.get(session_id)
+
+    def delete(self, session_id: str):
+        task = self._compacting.pop(session_id, None)
+        if task:
+            task.cancel()
+        self._cache.delete(session_id)
+
+    def history(self, session: Dict[str, Any]) -> List[ChatMessage]:
+        return [ChatMessage(**msg) for msg in session["history"]]
+
+    def append(self, session: Dict[str, Any], *messages: ChatMessage):
+        """Records messages and schedules compaction when the history gets too long."""
+        session["history"].extend({"role": msg.role, "content": msg.content} for msg in messages)
+        session["updated_at"] = time.time()
+        self.turns += 1
+        self._cache.set(session["session_id"], session)
+
+        if self.needs_compaction(session) and session["session_id"] not in self._compacting:
+            task = asyncio.create_task(self.compact(session["session_id"]))
+            self._compacting[session["session_id"]] = task
+            task.add_done_callback(lambda _: self._compacting.pop(session["session_id"], None))
+
+    def needs_compaction(self, session: Dict[str, Any]) -> bool:
+        if len(session["history"]) <= self.keep_recent:
+            return False
+        chars = sum(len(msg["content"]) for msg in session["history"])
+        return estimate_tokens(chars) > self.token_threshold
+
+    async def compact(self, session_id: str):
+        """
+        Folds everything but the last `keep_recent` messages into the rolling
+        summary. Turns that arrive meanwhile are kept; on failure the full
+        history is simply retained.
+        """
+        session = self.get(session_id)
+        if not session:
+            return
+        folded = session["history"][:-self.keep_recent]
+        try:
+            summary = await get_llm_response_async(
+                prompt=build_summary_prompt(session["summary"], [ChatMessage(**msg) for msg in folded]),
+                provider=LLMProvider.GOOGLE,
+                temperature=0.0,
+                fallback=False
+            )
+        except Exception as e:
+            self.compaction_failures += 1
+            logger.warning(f"Chat history compaction failed for {session_id}: {e}")
+            return
+
+        # Re-read: new turns may have been appended while the summary was generated
+        session = self.get(session_id)
+        if not session or session["history"][:len(folded)] != folded:
+            return
+        session["summary"] = summary.strip()
+        session["history"] = session["history"][len(folded):]
+        session["summarized_messages"] += len(folded)
+        self._cache.set(session_id, session)
+        self.compactions += 1
+        logger.info(f"Compacted {len(folded)} chat messages into summary for {session_id}.")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "created": self.created,
+            "turns": self.turns,
+            "compactions": self.compactions,
+            "compaction_failures": self.compaction_failures,
+            "compacting": len(self._compacting),
+            "store": self._cache.stats(),
+        }
+
+
+session_store = ChatSessionStore()
@@ -0,0 +1,185 @@
+"""
+Static Frontend Serving
+
+Production mode (`run.py --prod`) serves the built frontend (frontend/dist)
+from the same process tree as the API:
+- precompressed `.br` / `.gz` siblings are sent when the client accepts them
+  (generated once by `precompress()`, no per-request compression),
+- hashed files under /assets get `immutable` cache headers, everything else
+  (index.html) is revalidated via ETag / Last-Modified,
+- the `/api` prefix the frontend uses (stripped by the Vite proxy in
+  development) is stripped here too.
+
+Brotli output requires the optional `brotli` package; gzip always works.
+
+    python -m backend.static frontend/dist    # precompress a build
+"""
+
+import os
+import sys
+import gzip
+import logging
+import mimetypes
+from typing import List, Optional
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_DIST = os.path.join(os.path.dirname(__file__), "..", "frontend", "dist")
+COMPRESSIBLE_EXTENSIONS = (".html", ".js", ".mjs", ".css", ".json", ".svg", ".txt", ".map", ".xml", ".wasm")
+MIN_COMPRESS_BYTES = 1024
+
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE = "no-cache"
+
+# (Accept-Encoding token, Content-Encoding, file suffix), in order of preference
+ENCODINGS = (("br", "br", ".br"), ("gzip", "gzip", ".gz"))
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def _accepted_encodings(request_headers: Headers) -> List[str]:
+    accepted = []
+    for part in request_headers.get("accept-encoding", "").split(","):
+        token, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.append(token.strip().lower())
+    return accepted
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles that prefers precompressed siblings and sets cache headers."""
+
+    def __init__(self, *args, immutable_prefix: str = "assets/", **kwargs):
+        super().__init__(*args, **kwargs)
+        self.immutable_prefix = immutable_prefix
+
+    def file_response(
+        self,
+        full_path,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        request_headers = Headers(scope=scope)
+        full_path = str(full_path)
+        media_type = mimetypes.guess_type(full_path)[0] or "text/plain"
+
+        response = None
+        if full_path.endswith(COMPRESSIBLE_EXTENSIONS):
+            accepted = _accepted_encodings(request_headers)
+            for token, content_encoding, suffix in ENCODINGS:
+                if token not in accepted:
+                    continue
+                try:
+                    compressed_stat = os.stat(full_path + suffix)
+                except OSError:
+                    continue
+                if compressed_stat.st_mtime < stat_result.st_mtime:
+                    continue  # stale sibling from an older build
+                response = FileResponse(
+                    full_path + suffix,
+                    status_code=status_code,
+                    stat_result=compressed_stat,
+                    media_type=media_type,
+                    headers={"Content-Encoding": content_encoding},
+                )
+                break
+            if response is None:
+                response = FileResponse(full_path, status_code=status_code, stat_result=stat_result, media_type=media_type)
+            response.headers["Vary"] = "Accept-Encoding"
+        else:
+            response = FileResponse(full_path, status_code=status_code, stat_result=stat_result, media_type=media_type)
+
+        relative = os.path.relpath(full_path, str(self.directory)).replace(os.sep, "/")
+        response.headers["Cache-Control"] = IMMUTABLE_CACHE if relative.startswith(self.immutable_prefix) else REVALIDATE_CACHE
+
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+class StripPrefixMiddleware:
+    """Rewrites `/api/...` to `/...`, matching the Vite dev proxy."""
+
+    def __init__(self, app: ASGIApp, prefix: str = "/api"):
+        self.app = app
+        self.prefix = prefix.rstrip("/")
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] == "http":
+            path = scope["path"]
+            if path == self.prefix or path.startswith(self.prefix + "/"):
+                scope = dict(scope)
+                scope["path"] = path[len(self.prefix):] or "/"
+                if scope.get("raw_path"):
+                    scope["raw_path"] = scope["raw_path"][len(self.prefix):] or b"/"
+        await self.app(scope, receive, send)
+
+
+def _write_if_smaller(source: str, suffix: str, data: bytes, original_size: int) -> bool:
+    if len(data) >= original_size:
+        return False
+    temp_path = f"{source}{suffix}.tmp{os.getpid()}"
+    with open(temp_path, "wb") as f:
+        f.write(data)
+    os.replace(temp_path, source + suffix)
+    return True
+
+
+def precompress(directory: str = DEFAULT_DIST, min_bytes: int = MIN_COMPRESS_BYTES) -> int:
+    """
+    Writes `.gz` (and `.br` when brotli is installed) next to every compressible
+    file that is missing or has stale siblings. Returns the number of files written.
+    """
+    written = 0
+    for root, _, files in os.walk(directory):
+        for filename in files:
+            if not filename.endswith(COMPRESSIBLE_EXTENSIONS):
+                continue
+            source = os.path.join(root, filename)
+            stat_result = os.stat(source)
+            if stat_result.st_size < min_bytes:
+                continue
+
+            targets = [(".gz", lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+            if brotli is not None:
+                targets.append((".br", lambda data: brotli.compress(data, quality=11)))
+
+            data = None
+            for suffix, compress in targets:
+                try:
+                    if os.stat(source + suffix).st_mtime >= stat_result.st_mtime:
+                        continue
+                except OSError:
+                    pass
+                if data is None:
+                    with open(source, "rb") as f:
+                        data = f.read()
+                written += _write_if_smaller(source, suffix, compress(data), stat_result.st_size)
+
+    return written
+
+
+def mount_frontend(app, directory: Optional[str] = None):
+    """Serves the built frontend at / (after every API route, which keep precedence)."""
+    directory = os.path.abspath(directory or DEFAULT_DIST)
+    if not os.path.isfile(os.path.join(directory, "index.html")):
+        logger.warning(f"Frontend build not found at {directory}; run `npm run build` in frontend/.")
+        return
+    app.mount("/", PrecompressedStaticFiles(directory=directory, html=True), name="frontend")
+    logger.info(f"Serving frontend from {directory}")
+
+
+if __name__ == "__main__":
+    target = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_DIST
+    print(f"Precompressed {precompress(target)} file(s) in {target}{'' if brotli else ' (gzip only; install brotli for .br)'}")
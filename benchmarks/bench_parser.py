@@ -0,0 +1,101 @@
+"""
+Response parser benchmark.
+
+Times parse_llm_response / extract_json on synthetic LLM responses from
+25 KB to 800 KB (think block + prose noise + large JSON profile) and
+compares against the previous character-concatenation implementation.
+The new parser's time per KB should stay flat as size grows.
+
+Run from the repo root:
+    python benchmarks/bench_parser.py
+"""
+
+import os
+import re
+import sys
+import json
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from backend.llm_provider import parse_llm_response, extract_json  # noqa: E402
+
+
+SIZES_KB = [25, 50, 100, 200, 400, 800]
+
+
+def legacy_extract_json(text):
+    """The pre-rewrite extract_json, kept here only as a baseline."""
+    start_idx = text.find('{')
+    if start_idx == -1:
+        return {}
+    brace_count = 0
+    json_str = ""
+    for i in range(start_idx, len(text)):
+        char = text[i]
+        if char == '{':
+            brace_count += 1
+        elif char == '}':
+            brace_count -= 1
+        json_str += char
+        if brace_count == 0:
+            try:
+                return json.loads(json_str.strip())
+            except json.JSONDecodeError:
+                pass
+    json_match = re.search(r'```(?:json)?\s*(\{.*?\})\s*```', text, re.DOTALL)
+    if json_match:
+        return json.loads(json_match.group(1))
+    return {}
+
+
+def make_response(target_kb):
+    """Builds a realistic-looking response of roughly target_kb kilobytes."""
+    sentence = "Target favours {precision} over speed and says \"ship it\" when cornered. "
+    think = "<think>" + sentence * 40 + "</think>\n"
+    triggers = []
+    profile = {
+        "thought_process": "",
+        "profile_summary": "Meticulous operator.",
+        "disc_scores": {"dominance": 60, "influence": 40, "steadiness": 50, "conscientiousness": 90},
+        "archetype": "The Operator",
+        "psychological_triggers": triggers,
+        "negotiation_strategy": {"do": ["Be precise"], "dont": ["Waste time"], "leverage_point": "Efficiency"},
+        "social_links": [{"platform": "GitHub", "url": "https://github.com/example"}],
+        "simulation_prompt": "Speak tersely.",
+    }
+    base = len(think) + len(json.dumps(profile))
+    remaining = max(0, target_kb * 1024 - base)
+    # Half of the payload in a long string full of braces/quotes, half in list items
+    profile["thought_process"] = (sentence * (remaining // (2 * len(sentence)) + 1))
+    item = "Escalates when {scope} is vague; quotes \"the spec\" verbatim"
+    triggers.extend([item] * (remaining // (2 * (len(item) + 4)) + 1))
+    return think + "```json\n" + json.dumps(profile) + "\n```"
+
+
+def best_of(fn, text, repeats):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    print(f"{'size':>8} {'parse_llm_response':>20} {'extract_json':>14} {'legacy':>12} {'us/KB (new)':>12}")
+    for kb in SIZES_KB:
+        text = make_response(kb)
+        actual_kb = len(text) / 1024
+        assert parse_llm_response(text)[1]["archetype"] == "The Operator"
+        new = best_of(parse_llm_response, text, repeats=5)
+        extract = best_of(extract_json, text, repeats=5)
+        legacy = best_of(legacy_extract_json, text, repeats=1)
+        print(
+            f"{actual_kb:>6.0f}KB {new * 1000:>18.2f}ms {extract * 1000:>12.2f}ms "
+            f"{legacy * 1000:>10.2f}ms {new * 1e6 / actual_kb:>12.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Cold-start import check.
+
+Imports backend.main in a fresh interpreter under `-X importtime` and fails
+(exit code 1) if
+- any provider SDK that should be imported lazily shows up at import time, or
+- the cumulative import time of backend.main (best of a few runs) exceeds
+  the budget (KYOKA_IMPORT_BUDGET_MS, default 1000).
+
+Run from the repo root:
+    python benchmarks/check_import_time.py
+
+tests/test_import_time.py runs the same check as part of the test suite.
+"""
+
+import os
+import sys
+import subprocess
+
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+TARGET = "backend.main"
+RUNS = 3
+BUDGET_MS = float(os.getenv("KYOKA_IMPORT_BUDGET_MS", "1000"))
+
+# Deferred until first use or the lifespan warm-up; importing them eagerly is a regression
+LAZY_MODULES = ("langchain_groq", "langchain_core", "langchain_google_genai", "google.generativeai", "openai", "tavily")
+
+
+def profile_import():
+    """Returns {module: (self_us, cumulative_us)} for one cold import of TARGET."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {TARGET}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        env={**os.environ, "KYOKA_LOG_LEVEL": "ERROR"}
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {TARGET} failed:\n{result.stderr}")
+
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        if not self_us.strip().isdigit():
+            continue  # header row
+        timings[name.strip()] = (int(self_us), int(cumulative_us))
+    return timings
+
+
+def best_run(runs: int = RUNS):
+    """The fastest of `runs` cold imports (the least noisy measurement)."""
+    return min((profile_import() for _ in range(runs)), key=lambda timings: timings[TARGET][1])
+
+
+def find_failures(timings, budget_ms: float = BUDGET_MS):
+    """Eagerly imported SDKs and a blown time budget, as messages (empty = pass)."""
+    total_ms = timings[TARGET][1] / 1000
+    failures = []
+    eager = sorted(
+        name for name in timings
+        if any(name == lazy or name.startswith(lazy + ".") for lazy in LAZY_MODULES)
+    )
+    if eager:
+        failures.append(f"SDK modules imported eagerly: {', '.join(eager[:10])}")
+    if total_ms > budget_ms:
+        failures.append(f"import {TARGET} took {total_ms:.0f}ms (budget {budget_ms:.0f}ms)")
+    return failures
+
+
+def main():
+    try:
+        best = best_run()
+    except RuntimeError as e:
+        sys.exit(str(e))
+    total_ms = best[TARGET][1] / 1000
+
+    print(f"{'cumulative':>12} {'self':>10}  module")
+    for name, (self_us, cumulative_us) in sorted(best.items(), key=lambda item: -item[1][1])[:15]:
+        print(f"{cumulative_us / 1000:>10.1f}ms {self_us / 1000:>8.1f}ms  {name}")
+
+    failures = find_failures(best)
+    print(f"\nimport {TARGET}: {total_ms:.0f}ms (best of {RUNS}, budget {BUDGET_MS:.0f}ms)")
+    if failures:
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+"""
+Offline micro-benchmark suite for the pipeline's CPU hot paths.
+
+Every benchmark runs against recorded fixtures in benchmarks/fixtures with
+providers stubbed out, so no API keys or network access are needed.
+
+Usage (from the repo root):
+    python -m benchmarks                       # run and print timings
+    python -m benchmarks --save                # record benchmarks/baseline.json
+    python -m benchmarks --compare             # fail (exit 1) on >25% regressions
+    python -m benchmarks -k parser --threshold 0.5
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tracemalloc
+import statistics
+import contextlib
+from typing import Callable, Dict, List
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+BENCHMARKS: Dict[str, Callable[[], Callable[[], object]]] = {}
+
+
+def benchmark(name: str):
+    """Registers a setup function that returns the zero-argument callable to time."""
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+def load_fixture(filename: str):
+    path = os.path.join(FIXTURES_DIR, filename)
+    with open(path, encoding="utf-8") as f:
+        return json.load(f) if filename.endswith(".json") else f.read()
+
+
+def chunked(text: str, size: int = 4) -> List[str]:
+    """Splits text into token-sized pieces, like a streamed LLM response."""
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+class FixtureTavilyClient:
+    """Stands in for TavilyClient, answering from recorded search results."""
+
+    def __init__(self, recorded: Dict[str, list]):
+        self.recorded = recorded
+
+    def search(self, query: str, **kwargs):
+        return {"results": self.recorded.get(query, [])}
+
+
+# --- Parser -----------------------------------------------------------------
+
+@benchmark("parser.extract_json")
+def bench_extract_json():
+    from backend.llm_provider import extract_json
+    text = load_fixture("profile_response.txt")
+    return lambda: extract_json(text)
+
+
+@benchmark("parser.extract_think_block")
+def bench_extract_think_block():
+    from backend.llm_provider import extract_think_block
+    text = load_fixture("profile_response.txt")
+    return lambda: extract_think_block(text)
+
+
+@benchmark("parser.parse_llm_response")
+def bench_parse_llm_response():
+    from backend.llm_provider import parse_llm_response
+    text = load_fixture("profile_response.txt")
+    return lambda: parse_llm_response(text)
+
+
+@benchmark("parser.incremental_json_stream")
+def bench_incremental_json():
+    from backend.llm_provider import IncrementalJSONParser
+    chunks = chunked(load_fixture("profile_response.txt"))
+
+    def run():
+        parser = IncrementalJSONParser()
+        for chunk in chunks:
+            parser.feed(chunk)
+        return parser.fields
+    return run
+
+
+# --- Research aggregation -----------------------------------------------------
+
+def _fixture_researcher():
+    from backend.agents.researcher import DeepResearchAgent
+    from backend.scheduler import scheduler
+    # Fixture searches never reach Tavily, so its rate limit would only add sleeps
+    scheduler.configure("tavily", max_in_flight=64)
+    recorded = load_fixture("tavily_results.json")
+    agent = DeepResearchAgent(tavily_api_key="offline-benchmark", use_cache=False)
+    agent.tavily_client = FixtureTavilyClient(recorded["queries"])
+    return agent, recorded["name"], recorded["context"]
+
+
+@benchmark("research.run_deep_search")
+def bench_run_deep_search():
+    agent, name, context = _fixture_researcher()
+    return lambda: agent.run_deep_search(name=name, context=context)
+
+
+@benchmark("research.compact")
+def bench_compact():
+    from backend.agents.compactor import ResearchCompactor
+    agent, name, context = _fixture_researcher()
+    documents = agent.run_deep_search(name=name, context=context)["documents"]
+    compactor = ResearchCompactor()
+    return lambda: compactor.compact(documents)
+
+
+# --- Prompt construction ------------------------------------------------------
+
+@benchmark("prompt.profiler")
+def bench_profiler_prompt():
+    from backend.agents.profiler import PsychProfiler
+    agent, name, context = _fixture_researcher()
+    text = agent.run_deep_search(name=name, context=context)["text"]
+    profiler = PsychProfiler()
+    return lambda: profiler.build_prompt(text, name, context)
+
+
+@benchmark("prompt.strategist")
+def bench_strategist_prompt():
+    from backend.agents.strategist import MeetingStrategist
+    chat = load_fixture("chat_request.json")
+    strategist = MeetingStrategist()
+    return lambda: strategist.build_prompt(chat["profile"], chat["context"])
+
+
+# --- SSE serialization --------------------------------------------------------
+
+@benchmark("sse.analysis_generator")
+def bench_analysis_generator():
+    from backend import main
+    profile_chunks = chunked(load_fixture("profile_response.txt"))
+    strategy_chunks = chunked(load_fixture("strategy_response.txt"))
+    chat = load_fixture("chat_request.json")
+
+    async def fake_run_analysis(name, context, emit, **options):
+        # Same event mix as a real run, with the providers replaced by fixtures
+        emit({"type": "status", "data": "Initializing Deep Intelligence Scan..."})
+        for chunk in profile_chunks:
+            emit({"type": "profile_delta", "data": chunk})
+        for chunk in strategy_chunks:
+            emit({"type": "strategy_delta", "data": chunk})
+        return {"profile": chat["profile"], "thought_process": "", "strategy": "", "sources": []}
+
+    main.run_analysis = fake_run_analysis
+    loop = asyncio.new_event_loop()
+
+    async def consume():
+        count = 0
+        # Same path as GET /analyze/stream: admit the flight, then serialize its events
+        flight = main.start_analysis(chat["target_name"], chat["context"], False)
+        async for _ in main.flight_events(flight):
+            count += 1
+        return count
+
+    return lambda: loop.run_until_complete(consume())
+
+
+# --- Chat -------------------------------------------------------------------
+
+@benchmark("chat.message_assembly")
+def bench_chat_messages():
+    from backend.chat import build_persona_prompt, build_chat_messages
+    from backend.schemas import ChatRequest
+    req = ChatRequest(**load_fixture("chat_request.json"))
+
+    def run():
+        system_prompt = build_persona_prompt(req.profile, req.context)
+        return build_chat_messages(system_prompt, req.history)
+    return run
+
+
+# --- Runner -----------------------------------------------------------------
+
+def measure(fn: Callable[[], object], repeats: int = 5, min_time: float = 0.2) -> Dict[str, float]:
+    """Times fn (auto-scaled loop count, best/median of `repeats`) and its peak allocation."""
+    fn()  # warm-up (imports, caches, lazy clients)
+
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or loops >= 1_000_000:
+            break
+        loops *= 10 if elapsed < min_time / 10 else 2
+
+    samples = [elapsed / loops]
+    for _ in range(repeats - 1):
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        samples.append((time.perf_counter() - start) / loops)
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "best_us": min(samples) * 1e6,
+        "median_us": statistics.median(samples) * 1e6,
+        "peak_kib": peak / 1024,
+        "loops": loops,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Kyoka offline micro-benchmarks")
+    parser.add_argument("-k", "--filter", default="", help="only run benchmarks whose name contains this")
+    parser.add_argument("--save", nargs="?", const=DEFAULT_BASELINE, help="write results as the baseline")
+    parser.add_argument("--compare", nargs="?", const=DEFAULT_BASELINE, help="compare against a baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown ratio (default 0.25)")
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+
+    results = {}
+    regressions = []
+    print(f"{'benchmark':<32} {'best':>12} {'median':>12} {'peak mem':>12} {'vs baseline':>12}")
+    for name, setup in BENCHMARKS.items():
+        if args.filter not in name:
+            continue
+        # The code under test logs progress to stdout; keep the report readable
+        with contextlib.redirect_stdout(io.StringIO()):
+            fn = setup()
+            result = measure(fn, repeats=args.repeats)
+        results[name] = result
+
+        delta = ""
+        if name in baseline:
+            ratio = result["median_us"] / baseline[name]["median_us"] - 1
+            delta = f"{ratio:+.1%}"
+            if ratio > args.threshold:
+                regressions.append(name)
+                delta += " !"
+        print(
+            f"{name:<32} {result['best_us']:>10.1f}us {result['median_us']:>10.1f}us "
+            f"{result['peak_kib']:>9.1f}KiB {delta:>12}"
+        )
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({"python": sys.version.split()[0], "results": results}, f, indent=2)
+        print(f"\nBaseline written to {args.save}")
+
+    if regressions:
+        print(f"\nRegressions over {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
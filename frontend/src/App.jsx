@@ -15,6 +15,7 @@ function App() {
   const [sources, setSources] = useState([]);
   const [targetName, setTargetName] = useState('');
   const [meetingContext, setMeetingContext] = useState('');
+  const [isPreliminary, setIsPreliminary] = useState(false);
 
   // Scroll to top when results are loaded
   React.useEffect(() => {
@@ -29,6 +30,8 @@ function App() {
     setTargetName(name);
     setMeetingContext(context);
     setProfileData(null);
+    setIsPreliminary(false);
+    setStrategyDoc('');
 
     // Simulation of streaming for now or standard fetch structure, keeping consistent with logic
     // We will assume existing logic works, just replacing UI wrapper
@@ -41,12 +44,24 @@ function App() {
         const payload = JSON.parse(event.data);
         if (payload.type === 'status') {
           setLogs(prev => [...prev.slice(-4), payload.data]); // Keep only last few logs
+        } else if (payload.type === 'preliminary_profile') {
+          // Role-based estimate shown while research runs; replaced by the final profile
+          setProfileData(payload.data.profile);
+          setThoughtProcess(payload.data.thought_process);
+          setIsPreliminary(true);
+        } else if (payload.type === 'profile_field') {
+          setLogs(prev => [...prev.slice(-4), `Resolved: ${payload.data.key.replace(/_/g, ' ')}`]);
+        } else if (payload.type === 'strategy_delta') {
+          setStrategyDoc(prev => prev + payload.data);
+        } else if (payload.type === 'strategy_reset') {
+          setStrategyDoc('');
         } else if (payload.type === 'final') {
           const data = payload.data;
           setProfileData(data.profile);
           setStrategyDoc(data.strategy);
           setThoughtProcess(data.thought_process);
           setSources(data.sources || []);
+          setIsPreliminary(false);
           eventSource.close();
           setLoading(false);
         } else if (payload.type === 'error') {
@@ -97,7 +112,9 @@ function App() {
           <div className="flex flex-col md:flex-row items-end justify-between border-b border-charcoal-900/10 pb-8">
             <div>
               <h2 className="text-4xl font-serif text-charcoal-900 mb-2">{targetName}</h2>
-              <p className="text-xs uppercase tracking-[0.2em] text-charcoal-900/50">Comprehensive Behavioral Dossier</p>
+              <p className="text-xs uppercase tracking-[0.2em] text-charcoal-900/50">
+                {isPreliminary ? 'Preliminary Role-Based Dossier — Refining With Research' : 'Comprehensive Behavioral Dossier'}
+              </p>
             </div>
             <button
               onClick={() => setProfileData(null)}
@@ -1,13 +1,15 @@
 import React, { useState, useEffect, useRef } from 'react';
 import { Send, User, MessageSquare, Loader2, Sparkles, Terminal } from 'lucide-react';
-import { chatSimulation } from '../lib/api';
+import { createChatSession, streamChatMessage } from '../lib/api';
 import { twMerge } from 'tailwind-merge';
 
 const ChatSimulator = ({ targetName, context, profile }) => {
     const [messages, setMessages] = useState([]);
     const [input, setInput] = useState('');
     const [loading, setLoading] = useState(false);
+    const [streaming, setStreaming] = useState(false);
     const messagesEndRef = useRef(null);
+    const sessionRef = useRef(null);
 
     const scrollToBottom = () => {
         messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
@@ -17,6 +19,27 @@ const ChatSimulator = ({ targetName, context, profile }) => {
         scrollToBottom();
     }, [messages]);
 
+    // A new target/profile means a new persona, so start a fresh session
+    useEffect(() => {
+        sessionRef.current = null;
+    }, [targetName, context, profile]);
+
+    const sendTurn = async (text, history, onDelta) => {
+        if (!sessionRef.current) {
+            const session = await createChatSession(targetName, context, profile, history);
+            sessionRef.current = session.session_id;
+        }
+        try {
+            return await streamChatMessage(sessionRef.current, text, onDelta);
+        } catch (error) {
+            if (error.status !== 404) throw error;
+            // Session expired server-side: re-seed a new one with what we have locally
+            const session = await createChatSession(targetName, context, profile, history);
+            sessionRef.current = session.session_id;
+            return await streamChatMessage(sessionRef.current, text, onDelta);
+        }
+    };
+
     const handleSend = async (e) => {
         e.preventDefault();
         if (!input.trim() || loading) return;
@@ -28,13 +51,23 @@ const ChatSimulator = ({ targetName, context, profile }) => {
         setInput('');
         setLoading(true);
 
+        // Tokens are appended to the reply bubble as they arrive
+        let reply = '';
+        const onDelta = (delta) => {
+            reply += delta;
+            setStreaming(true);
+            setMessages([...newHistory, { role: 'assistant', content: reply }]);
+        };
+
         try {
-            const result = await chatSimulation(targetName, context, profile, newHistory);
+            const result = await sendTurn(userMsg.content, messages, onDelta);
             setMessages([...newHistory, { role: 'assistant', content: result.content }]);
         } catch (error) {
             console.error("Chat error:", error);
+            setMessages(newHistory); // Drop a partially streamed reply
         } finally {
             setLoading(false);
+            setStreaming(false);
         }
     };
 
@@ -85,7 +118,7 @@ const ChatSimulator = ({ targetName, context, profile }) => {
                         </div>
                     </div>
                 ))}
-                {loading && (
+                {loading && !streaming && (
                     <div className="flex justify-start">
                         <div className="bg-white border border-charcoal-900/5 px-6 py-3 flex items-center gap-3 rounded-full shadow-sm">
                             <Loader2 className="w-3 h-3 animate-spin text-charcoal-900" />
@@ -7,9 +7,18 @@ const api = axios.create({
   },
 });
 
+// Submits an analysis job, then long-polls until it finishes
 export const analyzeProfile = async (name, context) => {
-  const response = await api.post('/analyze', { name, context });
-  return response.data;
+  const { data: job } = await api.post('/analyze', { name, context });
+  let status = job;
+  while (status.status === 'queued' || status.status === 'running') {
+    const response = await api.get(`/analyze/${job.job_id}`, { params: { wait: 25 } });
+    status = response.data;
+  }
+  if (status.status === 'failed') {
+    throw new Error(status.error || 'Analysis failed');
+  }
+  return status.result;
 };
 
 export const chatSimulation = async (target_name, context, profile, history) => {
@@ -22,4 +31,55 @@ export const chatSimulation = async (target_name, context, profile, history) =>
   return response.data;
 };
 
+// Server-side chat sessions: the persona prompt and history live on the backend,
+// so each turn only sends the new message
+export const createChatSession = async (target_name, context, profile, history = []) => {
+  const response = await api.post('/chat/sessions', {
+    target_name,
+    context,
+    profile,
+    history
+  });
+  return response.data;
+};
+
+export const sendChatMessage = async (sessionId, message) => {
+  const response = await api.post(`/chat/sessions/${sessionId}`, { message });
+  return response.data;
+};
+
+// Streams one session turn over SSE; onDelta receives text as it is generated.
+// Resolves with the chat_complete payload ({ content, messages, ... }).
+export const streamChatMessage = async (sessionId, message, onDelta) => {
+  const response = await fetch(`${api.defaults.baseURL}/chat/sessions/${sessionId}`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', Accept: 'text/event-stream' },
+    body: JSON.stringify({ message }),
+  });
+  if (!response.ok) {
+    const error = new Error(`Chat request failed (${response.status})`);
+    error.status = response.status;
+    throw error;
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    const events = buffer.split('\n\n');
+    buffer = events.pop();
+    for (const event of events) {
+      if (!event.startsWith('data: ')) continue;
+      const payload = JSON.parse(event.slice(6));
+      if (payload.type === 'chat_delta') onDelta(payload.data);
+      else if (payload.type === 'chat_complete') return payload.data;
+      else if (payload.type === 'error') throw new Error(payload.data);
+    }
+  }
+  throw new Error('Chat stream ended unexpectedly');
+};
+
 export default api;
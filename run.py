@@ -3,6 +3,7 @@ import subprocess
 import sys
 import time
 import signal
+import argparse
 
 def get_python_executable():
     """Detects and returns the best python executable (venv or system)."""
@@ -18,13 +19,20 @@ def get_python_executable():
             return exec_path
     return sys.executable
 
-def run_command(command, cwd=None, env=None):
-    """Runs a command and returns the process."""
+def run_command(command, cwd=None, env=None, relay=True):
+    """
+    Runs a command and returns the process.
+    With relay=False the child writes straight to this terminal instead of
+    through a pipe that has to be re-printed line by line.
+    """
     # Merge provided env with system env
     process_env = os.environ.copy()
     if env:
         process_env.update(env)
 
+    if not relay:
+        return subprocess.Popen(command, shell=True, cwd=cwd, env=process_env)
+
     return subprocess.Popen(
         command,
         shell=True,
@@ -39,7 +47,94 @@ def run_command(command, cwd=None, env=None):
         errors='replace'
     )
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Start the backend and frontend dev servers.")
+    parser.add_argument(
+        "--direct-logs",
+        action="store_true",
+        help="let both processes write to this terminal directly instead of relaying their output with [BACKEND]/[FRONTEND] labels"
+    )
+    parser.add_argument(
+        "--log-format",
+        choices=["text", "json"],
+        help="backend log format (sets KYOKA_LOG_FORMAT)"
+    )
+    parser.add_argument(
+        "--prod",
+        action="store_true",
+        help="production mode: build the frontend and serve it plus the API from one process tree, without the reloader"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="number of backend workers in --prod mode (default: 1; jobs, chat sessions and admission limits are per worker)"
+    )
+    parser.add_argument("--port", type=int, default=8000, help="port for --prod mode (default: 8000)")
+    parser.add_argument("--skip-build", action="store_true", help="--prod: serve the existing frontend/dist as is")
+    return parser.parse_args()
+
+def has_module(python_exec, module):
+    return subprocess.run([python_exec, "-c", f"import {module}"], capture_output=True).returncode == 0
+
+def run_prod(args, python_exec, frontend_dir):
+    """
+    One process tree serving everything: the built frontend and the API.
+    Uses gunicorn with a preloaded app (shared copy-on-write across workers)
+    where available, otherwise plain uvicorn workers.
+    """
+    dist_dir = os.path.join(frontend_dir, "dist")
+    if not args.skip_build:
+        print("Building Frontend...")
+        try:
+            subprocess.check_call("npm run build", shell=True, cwd=frontend_dir)
+        except Exception as e:
+            print(f"Frontend build failed: {e}")
+            sys.exit(1)
+    if not os.path.exists(os.path.join(dist_dir, "index.html")):
+        print(f"No frontend build found in {dist_dir}. Run without --skip-build.")
+        sys.exit(1)
+
+    print("Precompressing Frontend Assets...")
+    subprocess.check_call([python_exec, "-m", "backend.static", dist_dir])
+
+    workers = max(1, args.workers)
+    backend_env = {
+        "PYTHONIOENCODING": "utf-8",
+        "KYOKA_SERVE_FRONTEND": "1",
+        "KYOKA_FRONTEND_DIST": dist_dir,
+        "KYOKA_WORKERS": str(workers),
+        "KYOKA_BIND": f"0.0.0.0:{args.port}",
+        "KYOKA_WARM_UP": "eager",
+    }
+    if args.log_format:
+        backend_env["KYOKA_LOG_FORMAT"] = args.log_format
+
+    if sys.platform != "win32" and has_module(python_exec, "gunicorn"):
+        command = f"{python_exec} -m gunicorn backend.main:app -c backend/gunicorn_conf.py"
+    else:
+        print("gunicorn not available: starting uvicorn workers (no preload, memory is not shared).")
+        command = f"{python_exec} -m uvicorn backend.main:app --host 0.0.0.0 --port {args.port} --workers {workers}"
+
+    print(f"Starting Production Server ({workers} worker{'s' if workers > 1 else ''}, Port {args.port})...")
+    print(f"App: http://localhost:{args.port}")
+    if workers > 1:
+        # Jobs, chat sessions, analysis flights and executor admission are all in-process
+        print("WARNING: with several workers, polling GET /analyze/{id} and chat sessions only work behind a")
+        print("sticky load balancer, and analysis concurrency limits apply per worker.")
+    print()
+    server_proc = run_command(command, env=backend_env, relay=False)
+    try:
+        server_proc.wait()
+    except KeyboardInterrupt:
+        print("\nShutting down AI-Profiler...")
+        server_proc.terminate()
+        server_proc.wait()
+    print("Goodbye!")
+
 def main():
+    args = parse_args()
+    relay = not args.direct_logs
     print("Initializing The Mentalist PRO...")
     
     python_exec = get_python_executable()
@@ -65,20 +160,26 @@ def main():
             print(f"Failed to install frontend dependencies: {e}")
             sys.exit(1)
 
+    if args.prod:
+        return run_prod(args, python_exec, frontend_dir)
+
     # 3. Start Processes
     processes = []
     try:
         print("Starting FastAPI Backend (Port 8000)...")
         # Force UTF-8 encoding for backend to handle emojis/unicode correctly on Windows
         backend_env = {"PYTHONIOENCODING": "utf-8"}
+        if args.log_format:
+            backend_env["KYOKA_LOG_FORMAT"] = args.log_format
         backend_proc = run_command(
             f"{python_exec} -m uvicorn backend.main:app --host 0.0.0.0 --port 8000 --reload", 
-            env=backend_env
+            env=backend_env,
+            relay=relay
         )
         processes.append(backend_proc)
 
         print("Starting Vite Frontend (Port 5173)...")
-        frontend_proc = run_command("npm run dev", cwd=frontend_dir)
+        frontend_proc = run_command("npm run dev", cwd=frontend_dir, relay=relay)
         processes.append(frontend_proc)
 
         print("\nAll systems active!")
@@ -94,9 +195,10 @@ def main():
                 if line:
                     print(f"[{label}] {line.strip()}")
 
-        # Start threads to stream output
-        threading.Thread(target=stream_output, args=(backend_proc, "BACKEND"), daemon=True).start()
-        threading.Thread(target=stream_output, args=(frontend_proc, "FRONTEND"), daemon=True).start()
+        # Start threads to stream output (not needed when the children write directly)
+        if relay:
+            threading.Thread(target=stream_output, args=(backend_proc, "BACKEND"), daemon=True).start()
+            threading.Thread(target=stream_output, args=(frontend_proc, "FRONTEND"), daemon=True).start()
 
         while True:
             time.sleep(1)
@@ -0,0 +1,111 @@
+import os
+import time
+
+import pytest
+
+from backend.cache import LRUCache, SQLiteStore, TieredCache
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SQLiteStore(str(tmp_path / "cache.sqlite3"), max_bytes=1024 * 1024)
+
+
+def test_lru_entries_expire_after_ttl():
+    cache = LRUCache(ttl=0.05)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=10)
+    assert cache.get("a") == 1
+    time.sleep(0.06)
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+    assert len(cache) == 1
+
+
+def test_lru_evicts_least_recently_used_by_count():
+    cache = LRUCache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.evictions == 1
+
+
+def test_lru_evicts_by_size():
+    cache = LRUCache(max_entries=100, max_bytes=10, sizeof=len)
+    cache.set("a", "x" * 4)
+    cache.set("b", "y" * 4)
+    cache.set("c", "z" * 4)
+    assert cache.get("a") is None
+    assert cache.bytes == 8
+    # A single oversized value is still kept
+    cache.set("d", "w" * 50)
+    assert cache.get("d") == "w" * 50 and len(cache) == 1
+
+
+def test_sqlite_entries_expire_after_ttl(store):
+    store.set("a", {"v": 1}, ttl=0.05)
+    store.set("b", [1, 2])
+    assert store.get("a") == {"v": 1}
+    time.sleep(0.06)
+    assert store.get("a") is None
+    assert store.get("b") == [1, 2]
+
+
+def test_sqlite_reads_do_not_write(store):
+    store.set("a", "value")
+    changes = store._conn.total_changes
+    for _ in range(3):
+        assert store.get("a") == "value"
+    assert store._conn.total_changes == changes
+
+
+def test_sqlite_evicts_least_recently_read(store):
+    value = os.urandom(600).hex()
+    store.set("a", value)
+    # Room for two entries of this (compressed) size, not three
+    store.max_bytes = store.stats()["bytes"] * 2.5
+    time.sleep(0.01)
+    store.set("b", value)
+    time.sleep(0.01)
+    # Reading "a" makes "b" the least recently accessed once the read is flushed
+    assert store.get("a") == value
+    store.set("c", value)
+    assert store.get("b") is None
+    assert store.get("a") == value and store.get("c") == value
+    assert store.evictions == 1
+
+
+def test_tiered_cache_promotes_disk_hits(store):
+    cache = TieredCache(LRUCache(), store)
+    store.set("k", {"from": "disk"})
+    assert cache.memory.get("k") is None
+    assert cache.get("k") == {"from": "disk"}
+    assert cache.memory.get("k") == {"from": "disk"}
+    # Served from memory now, without another disk lookup
+    assert cache.get("k") == {"from": "disk"}
+    assert store.hits == 1
+
+
+def test_tiered_cache_writes_and_deletes_both_tiers(store):
+    cache = TieredCache(LRUCache(), store)
+    cache.set("k", 1)
+    assert store.get("k") == 1
+    cache.delete("k")
+    assert cache.get("k") is None and store.get("k") is None
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork()")
+def test_sqlite_store_reopens_after_fork(store):
+    store.set("parent", 1)
+    pid = os.fork()
+    if pid == 0:
+        # Child: must get a fresh connection that still sees (and writes) the same file
+        ok = store._conn is not store._inherited_conn and store.get("parent") == 1
+        store.set("child", 2)
+        os._exit(0 if ok else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.WEXITSTATUS(status) == 0
+    assert store.get("child") == 2
@@ -0,0 +1,53 @@
+import asyncio
+
+import pytest
+
+from backend.executor import AnalysisExecutor, AnalysisRejected
+
+
+def test_reserve_rejects_beyond_running_plus_queued():
+    executor = AnalysisExecutor(max_concurrent=2, max_queued=1)
+    for _ in range(3):
+        executor.reserve()
+    with pytest.raises(AnalysisRejected) as rejected:
+        executor.reserve()
+    assert rejected.value.retry_after >= 1
+    assert executor.stats()["admitted"] == 3
+    assert executor.stats()["rejected"] == 1
+
+
+def test_release_frees_a_place():
+    executor = AnalysisExecutor(max_concurrent=1, max_queued=0)
+    executor.reserve()
+    with pytest.raises(AnalysisRejected):
+        executor.reserve()
+    executor.release()
+    executor.reserve()
+    assert executor.queued == 1
+
+
+def test_retry_after_scales_with_queue_waves():
+    executor = AnalysisExecutor(max_concurrent=2, max_queued=8)
+    executor._durations.extend([10.0, 20.0, 30.0])
+    assert executor.retry_after() == 10  # median run x (0 queued + 1) / 2 slots
+    for _ in range(4):
+        executor.reserve()
+    assert executor.retry_after() == 50  # 20s x (4 queued + 1) / 2 slots
+
+
+def test_slots_run_at_most_max_concurrent_in_arrival_order():
+    executor = AnalysisExecutor(max_concurrent=1, max_queued=4)
+    order = []
+
+    async def run(label):
+        async with executor.slot():
+            order.append(label)
+            assert executor.stats()["running"] == 1
+            await asyncio.sleep(0.01)
+
+    async def main():
+        await asyncio.gather(*(run(label) for label in "abc"))
+
+    asyncio.run(main())
+    assert order == ["a", "b", "c"]
+    assert executor.stats()["running"] == 0
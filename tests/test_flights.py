@@ -0,0 +1,190 @@
+import asyncio
+
+import pytest
+
+from backend import flights
+from backend.executor import AnalysisExecutor, AnalysisRejected
+from backend.flights import AnalysisFlights
+
+
+@pytest.fixture
+def short_grace(monkeypatch):
+    monkeypatch.setattr(flights, "ABANDON_GRACE_SECONDS", 0.05)
+
+
+def blocking_runner(started, cancelled):
+    async def runner(emit):
+        emit({"type": "status", "data": "working"})
+        started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+        return {}
+    return runner
+
+
+async def first_event(flight):
+    events = flight.subscribe()
+    item = await events.__anext__()
+    await events.aclose()
+    return item
+
+
+def test_new_flights_are_rejected_when_the_executor_is_full():
+    async def main():
+        pool = AnalysisFlights(AnalysisExecutor(max_concurrent=1, max_queued=0))
+        started = asyncio.Event()
+        flight = pool.join("Ada", "chat", blocking_runner(started, []))
+        with pytest.raises(AnalysisRejected):
+            pool.join("Grace", "chat", blocking_runner(asyncio.Event(), []))
+        # Nothing is registered for the rejected request
+        assert pool.stats()["in_flight"] == 1
+        assert pool.stats()["started"] == 1
+        flight._task.cancel()
+
+    asyncio.run(main())
+
+
+def test_abandoned_flight_is_cancelled_after_the_grace_period(short_grace):
+    async def main():
+        pool = AnalysisFlights(AnalysisExecutor(max_concurrent=1, max_queued=0))
+        started, cancelled = asyncio.Event(), []
+        flight = pool.join("Ada", "chat", blocking_runner(started, cancelled))
+        assert (await first_event(flight))["type"] == "status"
+        with pytest.raises(asyncio.CancelledError):
+            await asyncio.wait_for(flight._task, 1)
+        assert cancelled == [True]
+        assert flight.events[-1] == {"type": "error", "data": "Analysis cancelled."}
+        assert pool.stats() == {"in_flight": 0, "subscribers": 0, "started": 1, "coalesced": 0, "cancelled": 1}
+        # Its executor place was released
+        pool.join("Grace", "chat", blocking_runner(asyncio.Event(), []))._task.cancel()
+
+    asyncio.run(main())
+
+
+def test_flight_nobody_subscribes_to_is_cancelled(short_grace):
+    async def main():
+        pool = AnalysisFlights(AnalysisExecutor(max_concurrent=1, max_queued=0))
+        cancelled = []
+        flight = pool.join("Ada", "chat", blocking_runner(asyncio.Event(), cancelled))
+        with pytest.raises(asyncio.CancelledError):
+            await asyncio.wait_for(flight._task, 1)
+        assert cancelled == [True]
+        assert pool.cancelled == 1
+
+    asyncio.run(main())
+
+
+def test_reconnecting_within_the_grace_period_keeps_the_run(short_grace):
+    async def main():
+        pool = AnalysisFlights(AnalysisExecutor(max_concurrent=1, max_queued=0))
+        release = asyncio.Event()
+
+        async def runner(emit):
+            emit({"type": "status", "data": "working"})
+            await release.wait()
+            return {"ok": True}
+
+        flight = pool.join("Ada", "chat", runner)
+        await first_event(flight)
+        # Back before the grace period runs out
+        rejoined = pool.join("Ada", "chat", runner)
+        assert rejoined is flight
+        events = flight.subscribe()
+        assert (await events.__anext__())["type"] == "status"
+        await asyncio.sleep(0.1)
+        release.set()
+        assert (await events.__anext__()) == {"type": "final", "data": {"ok": True}}
+        assert pool.cancelled == 0
+
+    asyncio.run(main())
+
+
+def test_late_joiner_gets_the_replay_then_live_events():
+    async def main():
+        pool = AnalysisFlights(AnalysisExecutor(max_concurrent=2, max_queued=0))
+        step = asyncio.Event()
+        calls = []
+
+        async def runner(emit):
+            calls.append(True)
+            emit({"type": "status", "data": "one"})
+            await step.wait()
+            emit({"type": "status", "data": "two"})
+            return {"ok": True}
+
+        flight = pool.join("Ada Lovelace", "Hiring chat", runner)
+        early = flight.subscribe()
+        assert (await early.__anext__())["data"] == "one"
+
+        # Same analysis up to case and spacing: joins instead of starting a run
+        late_flight = pool.join("  ada lovelace ", "hiring  CHAT", runner)
+        assert late_flight is flight
+        late = flight.subscribe()
+        assert (await late.__anext__())["data"] == "one"
+
+        step.set()
+        expected = [{"type": "status", "data": "two"}, {"type": "final", "data": {"ok": True}}]
+        assert [item async for item in early] == expected
+        assert [item async for item in late] == expected
+        assert len(calls) == 1
+        assert pool.stats()["coalesced"] == 1
+
+        # A subscriber arriving after the end still gets the full run
+        assert [item["type"] async for item in flight.subscribe()] == ["status", "status", "final"]
+
+    asyncio.run(main())
+
+
+def test_refresh_starts_a_separate_flight():
+    async def main():
+        pool = AnalysisFlights(AnalysisExecutor(max_concurrent=2, max_queued=0))
+        started = asyncio.Event()
+        cached = pool.join("Ada", "chat", blocking_runner(started, []), refresh=False)
+        fresh = pool.join("Ada", "chat", blocking_runner(asyncio.Event(), []), refresh=True)
+        assert fresh is not cached
+        assert pool.stats()["started"] == 2
+        assert pool.join("Ada", "chat", blocking_runner(asyncio.Event(), []), refresh=True) is fresh
+        for flight in (cached, fresh):
+            flight._task.cancel()
+
+    asyncio.run(main())
+
+
+def test_finished_flight_releases_its_capacity():
+    async def main():
+        executor = AnalysisExecutor(max_concurrent=1, max_queued=0)
+        pool = AnalysisFlights(executor)
+
+        async def runner(emit):
+            return {"ok": True}
+
+        first = pool.join("Ada", "chat", runner)
+        assert [item["type"] async for item in first.subscribe()] == ["final"]
+        await first._task
+        await asyncio.sleep(0)  # the release runs as the task's done callback
+        assert executor.stats()["running"] == 0
+        assert executor.stats()["queued"] == 0
+        assert pool.stats()["in_flight"] == 0
+
+        # The slot is free again, and the same analysis starts a new run rather than rejoining
+        second = pool.join("Ada", "chat", runner)
+        assert second is not first
+        assert [item async for item in second.subscribe()] == [{"type": "final", "data": {"ok": True}}]
+
+    asyncio.run(main())
+
+
+def test_runner_errors_reach_every_subscriber():
+    async def main():
+        pool = AnalysisFlights(AnalysisExecutor(max_concurrent=1, max_queued=0))
+
+        async def runner(emit):
+            raise RuntimeError("search failed")
+
+        flight = pool.join("Ada", "chat", runner)
+        assert [item async for item in flight.subscribe()] == [{"type": "error", "data": "search failed"}]
+
+    asyncio.run(main())
@@ -0,0 +1,118 @@
+import asyncio
+
+import pytest
+
+from backend import llm_provider
+from backend.llm_provider import LLMProvider, _hedged_response_async, _hedged_stream
+
+DEEPSEEK, GOOGLE = LLMProvider.DEEPSEEK, LLMProvider.GOOGLE
+
+
+@pytest.fixture(autouse=True)
+def short_hedge_delay(monkeypatch):
+    monkeypatch.setattr(llm_provider.hedge_policy, "fixed_delay", 0.05)
+
+
+def stub_calls(monkeypatch, behaviour):
+    """behaviour: provider -> (seconds, text or exception). Records started/cancelled calls."""
+    log = {"started": [], "cancelled": []}
+
+    async def call(provider, *args):
+        log["started"].append(provider)
+        delay, outcome = behaviour[provider]
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            log["cancelled"].append(provider)
+            raise
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    monkeypatch.setattr(llm_provider, "_call_provider_async", call)
+    return log
+
+
+def stub_streams(monkeypatch, behaviour):
+    """behaviour: provider -> (first token delay, chunks). Records opened/closed streams."""
+    log = {"opened": [], "closed": []}
+
+    async def stream(provider, *args):
+        log["opened"].append(provider)
+        delay, chunks = behaviour[provider]
+        try:
+            await asyncio.sleep(delay)
+            for chunk in chunks:
+                yield chunk
+                await asyncio.sleep(0)
+        finally:
+            log["closed"].append(provider)
+
+    monkeypatch.setattr(llm_provider, "_open_stream", stream)
+    return log
+
+
+def hedged_call(validate=None):
+    return asyncio.run(_hedged_response_async("prompt", None, 0.0, False, validate))
+
+
+async def relay():
+    return [delta async for delta in _hedged_stream("prompt", None, 0.0, False)]
+
+
+def test_fast_primary_wins_without_hedging(monkeypatch):
+    log = stub_calls(monkeypatch, {DEEPSEEK: (0, "ds"), GOOGLE: (0, "g")})
+    assert hedged_call() == (DEEPSEEK, "ds")
+    assert log["started"] == [DEEPSEEK]
+
+
+def test_slow_primary_is_hedged_and_cancelled(monkeypatch):
+    log = stub_calls(monkeypatch, {DEEPSEEK: (1, "ds"), GOOGLE: (0, "g")})
+    assert hedged_call() == (GOOGLE, "g")
+    assert log["started"] == [DEEPSEEK, GOOGLE]
+    assert log["cancelled"] == [DEEPSEEK]
+
+
+def test_rejected_response_falls_back(monkeypatch):
+    log = stub_calls(monkeypatch, {DEEPSEEK: (0, "not json"), GOOGLE: (0, "{}")})
+    assert hedged_call(validate=lambda text: text.startswith("{")) == (GOOGLE, "{}")
+    assert log["started"] == [DEEPSEEK, GOOGLE]
+
+
+def test_both_failing_raises_the_last_error(monkeypatch):
+    stub_calls(monkeypatch, {DEEPSEEK: (0, TimeoutError("ds")), GOOGLE: (0, TimeoutError("g"))})
+    with pytest.raises(TimeoutError, match="g"):
+        hedged_call()
+
+
+def test_stream_relays_primary_when_it_starts_in_time(monkeypatch):
+    log = stub_streams(monkeypatch, {DEEPSEEK: (0, ["a", "b"]), GOOGLE: (0, ["x"])})
+    assert asyncio.run(relay()) == ["a", "b"]
+    assert log["opened"] == [DEEPSEEK]
+    assert log["closed"] == [DEEPSEEK]
+
+
+def test_losing_stream_is_closed(monkeypatch):
+    log = stub_streams(monkeypatch, {DEEPSEEK: (1, ["slow"]), GOOGLE: (0, ["x", "y"])})
+    assert asyncio.run(relay()) == ["x", "y"]
+    assert log["opened"] == [DEEPSEEK, GOOGLE]
+    # The loser is closed as soon as the winner is picked, before the relay ends
+    assert log["closed"] == [DEEPSEEK, GOOGLE]
+
+
+def test_empty_primary_stream_falls_back(monkeypatch):
+    log = stub_streams(monkeypatch, {DEEPSEEK: (0, []), GOOGLE: (0, ["x"])})
+    assert asyncio.run(relay()) == ["x"]
+    assert log["opened"] == [DEEPSEEK, GOOGLE]
+
+
+def test_consumer_leaving_early_closes_every_stream(monkeypatch):
+    log = stub_streams(monkeypatch, {DEEPSEEK: (1, ["slow"]), GOOGLE: (0, ["x", "y", "z"])})
+
+    async def main():
+        stream = _hedged_stream("prompt", None, 0.0, False)
+        assert await stream.__anext__() == "x"
+        await stream.aclose()
+
+    asyncio.run(main())
+    assert sorted(log["closed"], key=lambda provider: provider.value) == [DEEPSEEK, GOOGLE]
@@ -0,0 +1,9 @@
+from benchmarks.check_import_time import TARGET, best_run, find_failures
+
+
+def test_backend_import_stays_lazy_and_within_budget():
+    # Same -X importtime check as `python benchmarks/check_import_time.py`
+    # (budget: KYOKA_IMPORT_BUDGET_MS, default 1000)
+    timings = best_run()
+    assert TARGET in timings
+    assert find_failures(timings) == []
@@ -0,0 +1,35 @@
+import os
+
+from backend.llm_provider import IncrementalJSONParser
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "..", "benchmarks", "fixtures")
+
+
+def feed_chunked(text, size):
+    parser = IncrementalJSONParser()
+    fields = []
+    for i in range(0, len(text), size):
+        fields.extend(parser.feed(text[i:i + size]))
+    return parser, fields
+
+
+def test_profile_fixture_streams_fields_past_think_block():
+    with open(os.path.join(FIXTURES, "profile_response.txt"), encoding="utf-8") as f:
+        text = f.read()
+    for size in (1, 4, 97):
+        parser, fields = feed_chunked(text, size)
+        keys = [key for key, _ in fields]
+        assert parser.done
+        assert "profile_summary" in keys and "disc_scores" in keys
+        assert set(keys) == set(parser.fields)
+
+
+def test_braces_in_prose_are_skipped():
+    parser, fields = feed_chunked('Covers {scope} and { x }.\n{"a": 1, "b": {"c": [1, 2]}}', 3)
+    assert fields == [("a", 1), ("b", {"c": [1, 2]})]
+    assert parser.done
+
+
+def test_object_inside_think_block_is_ignored():
+    parser, fields = feed_chunked('<think>draft {"a": 0}</think>\n{"a": "final"}', 2)
+    assert fields == [("a", "final")]
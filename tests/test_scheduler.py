@@ -0,0 +1,132 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from backend.scheduler import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_INTERACTIVE,
+    ProviderLimiter,
+    ProviderScheduler,
+)
+
+
+def test_token_bucket_limits_request_rate():
+    # 600 rpm = one token every 0.1s, burst of one
+    limiter = ProviderLimiter("test", max_in_flight=10, rpm=600, burst=1)
+    started = time.monotonic()
+    for _ in range(4):
+        limiter.acquire()
+        limiter.release()
+    assert time.monotonic() - started >= 0.25
+    assert limiter.stats()["granted"] == 4
+
+
+def test_queued_waiters_are_served_by_priority():
+    limiter = ProviderLimiter("test", max_in_flight=1)
+    order = []
+
+    async def call(label, priority):
+        await limiter.acquire_async(priority)
+        order.append(label)
+        limiter.release()
+
+    async def main():
+        await limiter.acquire_async()
+        tasks = [
+            asyncio.create_task(call("background", PRIORITY_BACKGROUND)),
+            asyncio.create_task(call("interactive", PRIORITY_INTERACTIVE)),
+        ]
+        await asyncio.sleep(0.01)
+        assert limiter.stats()["queue_depth"] == 2
+        limiter.release()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    assert order == ["interactive", "background"]
+
+
+def test_in_flight_cap_holds_across_threads_and_loop():
+    scheduler = ProviderScheduler({"test": (2, 0, 0)})
+    lock = threading.Lock()
+    running = 0
+    peak = 0
+
+    def enter():
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+
+    def leave():
+        nonlocal running
+        with lock:
+            running -= 1
+
+    async def call():
+        async with scheduler.slot_async("test"):
+            enter()
+            await asyncio.sleep(0.01)
+            leave()
+
+    def blocking_call():
+        with scheduler.slot("test"):
+            enter()
+            time.sleep(0.01)
+            leave()
+
+    async def main():
+        await asyncio.gather(*(call() for _ in range(6)), *(asyncio.to_thread(blocking_call) for _ in range(3)))
+
+    asyncio.run(main())
+    stats = scheduler.limiter("test").stats()
+    assert peak == 2
+    assert stats["in_flight"] == 0
+    assert stats["granted"] == 9
+
+
+def test_cancelled_calls_give_their_slot_back():
+    scheduler = ProviderScheduler({"test": (1, 0, 0)})
+    limiter = scheduler.limiter("test")
+
+    async def hold(entered):
+        async with scheduler.slot_async("test"):
+            entered.set()
+            await asyncio.sleep(10)
+
+    async def main():
+        entered = asyncio.Event()
+        holder = asyncio.create_task(hold(entered))
+        await entered.wait()
+        # Queued behind the holder, then cancelled before it is granted
+        waiter = asyncio.create_task(limiter.acquire_async())
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        holder.cancel()
+        for task in (waiter, holder):
+            with pytest.raises(asyncio.CancelledError):
+                await task
+        assert limiter.stats()["in_flight"] == 0
+        await asyncio.wait_for(limiter.acquire_async(), 1)
+        limiter.release()
+
+    asyncio.run(main())
+    assert limiter.stats()["in_flight"] == 0
+    assert limiter.stats()["queue_depth"] == 0
+
+
+def test_release_with_an_empty_bucket_does_not_stall_waiters():
+    # The slot frees up while no token is left: the waiter must re-check once one accrues
+    limiter = ProviderLimiter("test", max_in_flight=1, rpm=600, burst=1)
+
+    async def main():
+        await limiter.acquire_async()
+        waiter = asyncio.create_task(limiter.acquire_async())
+        await asyncio.sleep(0.01)
+        limiter.release()
+        await asyncio.wait_for(waiter, 1)
+        limiter.release()
+
+    asyncio.run(main())
+    assert limiter.stats()["in_flight"] == 0